@@ -94,6 +94,14 @@ def create_app():
         except Exception as e:
             print(f"Warning: Firebase Admin failed to initialize: {e}")
 
+    # Prefetch Google's token signing certs so auth never blocks on them
+    from app.services.auth_cache import token_verifier
+    token_verifier.start()
+
+    # Batch notification writes (flushed at request end or in the background)
+    from app.services.notification_writer import notification_writer
+    notification_writer.init_app(app)
+
     @app.route('/health')
     @limiter.exempt
     def health_check():
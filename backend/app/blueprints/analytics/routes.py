@@ -1,6 +1,7 @@
 from flask import jsonify, g
 from firebase_admin import firestore
 from app.middleware import login_required, require_role
+from app.services.user_cache import get_user_doc
 from . import analytics_bp
 
 db = firestore.client()
@@ -44,8 +45,8 @@ def get_host_analytics():
     try:
         uid = g.user['uid']
         # Check if they are actually a host first
-        user_doc = db.collection('users').document(uid).get()
-        if not user_doc.exists or not user_doc.to_dict().get('isVerifiedHost'):
+        user_doc = get_user_doc(uid)
+        if not user_doc or not user_doc.get('isVerifiedHost'):
              return jsonify({'error': 'Unauthorized, not a verified host'}), 403
 
         events = db.collection('events').where(filter=firestore.FieldFilter('hostId', '==', uid)).stream()
@@ -70,10 +71,10 @@ def get_host_analytics():
                 active_events_count += 1
                 
             sold = int(data.get('tickets_sold', 0))
-            # Also legacy fallback for free events that track via participants array
-            parts = len(data.get('participants', []))
+            # Free events only track attendance, not tickets
+            attendees = int(data.get('attendeeCount', 0))
             
-            total_tickets_sold += max(sold, parts)
+            total_tickets_sold += max(sold, attendees)
             
             if data.get('is_paid'):
                 price = float(data.get('ticket_price', 0))
@@ -87,3 +88,23 @@ def get_host_analytics():
         
     except Exception as e:
          return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/scheduler', methods=['GET'])
+@login_required
+@require_role('admin')
+def get_scheduler_status():
+    """Current scheduler leader and recent runs of each background job."""
+    from app.services.distributed_scheduler import distributed_scheduler
+    try:
+        return jsonify(distributed_scheduler.status()), 200
+    except Exception as e:
+        print(f"Error fetching scheduler status: {e}")
+        return jsonify({'error': 'Failed to fetch scheduler status'}), 500
+
+@analytics_bp.route('/email', methods=['GET'])
+@login_required
+@require_role('admin')
+def get_email_stats():
+    """Queue depth, outcomes and delivery latency of this worker's email pool."""
+    from app.services.email_service import EmailService
+    return jsonify(EmailService.stats()), 200
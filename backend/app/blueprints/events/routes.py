@@ -4,6 +4,16 @@ from google.cloud.firestore import FieldFilter
 from app.middleware import login_required, validate_request
 from app.schemas import EventCreate, EventUpdate, CommentCreate
 from app.utils import format_doc
+from app.services.user_cache import get_user_profile, get_user_profiles
+from app.services.search_index import index_event, search_events, INDEXED_FIELDS
+from app.services.response_cache import response_cache
+from app.services.fanout import queue_wishlist_fanout
+from app.services.reminders import schedule_reminder
+from app.services.digest import coalesce
+from app.services.event_cancellation import start_cancellation, resume_cancellation, cancellation_status, CANCELLING
+from app.services import sharded_counters, memberships
+from app.services.projection import parse_projection, field_mask, select, project, ProjectionError, EVENT_VIEWS
+from app.services.query_planner import plan_events_query, date_range, in_date_range, parse_float, MAX_SCAN
 from app import limiter
 from . import events_bp
 from datetime import datetime
@@ -16,8 +26,6 @@ events_ref = db.collection('events')
 @validate_request(EventCreate)
 def create_event():
     uid = g.user['uid']
-    user_doc = db.collection('users').document(uid).get()
-    
     data = g.validated_data
 
     event_data = {
@@ -32,7 +40,6 @@ def create_event():
         'price': data.get('price', 0),
         'date': data['date'],
         'maxParticipants': data['maxParticipants'],
-        'participants': [],
         'attendeeCount': 0,
         'eventType': data.get('eventType', 'solo'),
         'maxTicketsPerUser': data.get('maxTicketsPerUser') or (4 if data.get('eventType', 'solo') == 'solo' else 10),
@@ -49,54 +56,27 @@ def create_event():
     _, doc_ref = events_ref.add(event_data)
     # Add ID to the response
     event_data['id'] = doc_ref.id
-    
-    # Notify Wishlisters (Async/Background ideally, but inline for MVP)
+
     try:
-        # ... existing notification logic ...
-        # (omitted for brevity in replacement, but should preserve if not replacing whole block)
-        # Actually I need to be careful not to delete logic.
-        # Let's replace just the event_data construction block first.
-        pass
-    except: pass # Logic handled in next chunk or separate
-
-    # Re-writing the notification logic to be safe since I consumed the lines
+        sharded_counters.init_shards(doc_ref, event_data)
+    except Exception as e:
+        # Created lazily on the first join instead
+        print(f"Failed to create counter shards for event {doc_ref.id}: {e}")
     try:
-         # 1. Wishlisted Host
-        host_wishlists = db.collection_group('wishlist').where(filter=FieldFilter('type', '==', 'host')).where(filter=FieldFilter('targetId', '==', uid)).stream()
-        
-        # 2. Wishlisted Venue
-        venue_wishlists = db.collection_group('wishlist').where(filter=FieldFilter('type', '==', 'place')).where(filter=FieldFilter('targetId', '==', data['venue'])).stream()
-        
-        notified_users = set()
-        
-        def send_notif(w_doc, msg_type):
-            recipient_id = w_doc.reference.parent.parent.id
-            if recipient_id == uid: return
-            if recipient_id in notified_users: return
-            
-            user_name = g.user.get('name', 'A Host')
-            msg = ""
-            if msg_type == 'host':
-                msg = f"{user_name} hosted a new event: {data['title']}"
-            else:
-                msg = f"New event at {data['venue']}: {data['title']}"
-                
-            create_notification(
-                recipient_id=recipient_id,
-                title='Wishlist Update',
-                message=msg,
-                type='wishlist_alert',
-                related_event_id=doc_ref.id
-            )
-            notified_users.add(recipient_id)
-
-        for w in host_wishlists:
-            send_notif(w, 'host')
-            
-        for w in venue_wishlists:
-            send_notif(w, 'place')
+        index_event(doc_ref.id, event_data)
     except Exception as e:
-        print(f"Failed to send wishlist notifications: {e}")
+        print(f"Failed to index event {doc_ref.id}: {e}")
+    try:
+        schedule_reminder(doc_ref.id, event_data)
+    except Exception as e:
+        print(f"Failed to schedule reminder for event {doc_ref.id}: {e}")
+    response_cache.invalidate('events')
+    
+    # Notify Wishlisters in the background (see services/fanout.py)
+    try:
+        queue_wishlist_fanout(doc_ref.id, uid, g.user.get('name', 'A Host'), data['venue'], data['title'])
+    except Exception as e:
+        print(f"Failed to queue wishlist notifications: {e}")
 
     return jsonify({'message': 'Event created', 'eventId': doc_ref.id}), 201
 
@@ -106,104 +86,143 @@ def create_event():
 
 
 
+def _passes_filters(d, dates, max_price):
+    """Python-side date/price filters for whatever the planner couldn't push down."""
+    if dates and not in_date_range(d.get('date'), dates):
+        return False
+    if max_price is not None:
+        try:
+            if float(d.get('ticket_price') or 0) > max_price:
+                return False
+        except (TypeError, ValueError): pass
+    return True
+
 @events_bp.route('', methods=['GET'])
+@response_cache.cached('events')
 def list_events():
     city = request.args.get('city')
     hobby = request.args.get('hobby')
     q = request.args.get('q')
     date_filter = request.args.get('date_filter')
     is_paid = request.args.get('is_paid')
-    max_price = request.args.get('max_price')
+    max_price = parse_float(request.args.get('max_price'))
     sort_by = request.args.get('sort_by', 'date')
     sort_dir = request.args.get('sort_dir', 'asc')
     
     limit = min(int(request.args.get('limit', 20)), 50)
     last_doc_id = request.args.get('last_doc_id')
-    
-    query = events_ref
-    
-    # 1. Equality Filters
-    if city:
-        query = query.where(filter=FieldFilter('city', '==', city))
-    if hobby:
-        query = query.where(filter=FieldFilter('hobby', '==', hobby))
-        
+
+    try:
+        fields = parse_projection(request.args, EVENT_VIEWS)
+    except ProjectionError as e:
+        return jsonify({'error': str(e)}), 400
+
+    is_paid_bool = None
     if is_paid is not None and is_paid != '':
         is_paid_bool = str(is_paid).lower() == 'true'
-        query = query.where(filter=FieldFilter('is_paid', '==', is_paid_bool))
 
-    # 2. Sorting
-    direction = firestore.Query.ASCENDING if sort_dir == 'asc' else firestore.Query.DESCENDING
-    if sort_by == 'price':
-        query = query.order_by('ticket_price', direction=direction)
-    elif sort_by == 'popularity':
-        query = query.order_by('attendeeCount', direction=direction)
-    else:
-        # Default date
-        query = query.order_by('date', direction=direction)
-        
-    # Order by document ID for stable cursor pagination
-    from google.cloud.firestore_v1.field_path import FieldPath
-    query = query.order_by(FieldPath.document_id(), direction=direction)
+    dates = date_range(date_filter)
+
+    # General Search (q) goes through the inverted index instead of a scan
+    if q:
+        return _search_events(q, city, hobby, is_paid_bool, dates, max_price,
+                              sort_by, sort_dir, limit, last_doc_id, fields)
+
+    # Push equality + whichever range filters the sort order allows into Firestore
+    query, plan = plan_events_query(
+        events_ref, city=city, hobby=hobby, is_paid=is_paid_bool, dates=dates,
+        max_price=max_price, sort_by=sort_by,
+        direction='ASCENDING' if sort_dir == 'asc' else 'DESCENDING'
+    )
 
     if last_doc_id:
         last_doc = events_ref.document(last_doc_id).get()
         if last_doc.exists:
             query = query.start_after(last_doc)
-            
-    # Use generator to find matches
-    docs = query.stream()
-    
-    from datetime import datetime
-    now_iso = datetime.utcnow().isoformat()
-    today_date = datetime.utcnow().date().isoformat()
+
+    residual_dates = dates if 'date' in plan.residual else None
+    residual_price = max_price if 'max_price' in plan.residual else None
+
+    # Fully indexed plans read exactly limit + 1 docs; otherwise cap the scan
+    scan_limit = limit + 1 if plan.bounded else MAX_SCAN
+
+    # Fields the Python-side checks below need are read even if not returned
+    query = select(query, fields, extra=('status',) + (('date', 'ticket_price') if plan.residual else ()))
     
     events = []
+    scanned = 0
+    last_scanned_id = None
     
-    for doc in docs:
+    for doc in query.limit(scan_limit).stream():
         if len(events) >= limit + 1:
             break
+        scanned += 1
+        last_scanned_id = doc.id
             
         d = doc.to_dict()
-        d['id'] = doc.id
         
-        # Date Filter
-        doc_date = d.get('date', '')
-        if date_filter == 'upcoming':
-            if doc_date < now_iso: continue
-        elif date_filter == 'past':
-            if doc_date >= now_iso: continue
-        elif date_filter == 'today':
-            if not doc_date.startswith(today_date): continue
-        elif date_filter and len(date_filter) == 10:
-            if not doc_date.startswith(date_filter): continue
-            
-        # Price Filter
-        if max_price:
-            try:
-                if float(d.get('ticket_price', 0)) > float(max_price):
-                    continue
-            except: pass
-            
-        # General Search (q)
-        if q:
-            term = q.lower()
-            title = str(d.get('title') or '')
-            desc = str(d.get('description') or '')
-            hobb = str(d.get('hobby') or '')
-            
-            searchable_text = (title + ' ' + desc + ' ' + hobb).lower()
-            if term not in searchable_text:
-                continue
+        # Cancelled events stay until their refund job deletes them
+        if d.get('status') == CANCELLING:
+            continue
+        if not _passes_filters(d, residual_dates, residual_price):
+            continue
         
-        events.append(format_doc(d))
+        events.append(format_doc(project(doc.id, d, fields)))
     
     has_more = len(events) > limit
     if has_more:
         events = events[:limit]
-    
-    last_id = events[-1]['id'] if events else None
-        
+        last_id = events[-1]['id']
+    elif not plan.bounded and scanned >= scan_limit:
+        # Scan budget ran out before the page filled — resume after the last doc read
+        has_more = True
+        last_id = last_scanned_id
+    else:
+        last_id = events[-1]['id'] if events else None
+
+    response = jsonify({'data': events, 'hasMore': has_more, 'lastDocId': last_id})
+    response.headers['X-Query-Plan'] = plan.describe()
+    return response, 200
+
+def _search_events(q, city, hobby, is_paid_bool, dates, max_price,
+                   sort_by, sort_dir, limit, last_doc_id, fields=None):
+    """
+    Ranked search: filters run on the index postings, then only the page of
+    matching events is read with a single get_all.
+    """
+    def predicate(meta):
+        if city and meta.get('city') != city: return False
+        if hobby and meta.get('hobby') != hobby: return False
+        if is_paid_bool is not None and bool(meta.get('is_paid')) != is_paid_bool: return False
+        return _passes_filters(meta, dates, max_price)
+
+    # Ties in relevance fall back to the requested sort (popularity isn't indexed)
+    if sort_by == 'price':
+        sort_key = lambda meta: float(meta.get('ticket_price') or 0)
+    else:
+        sort_key = lambda meta: str(meta.get('date') or '')
+
+    ids, has_more, last_id = search_events(
+        q, predicate=predicate, sort_key=sort_key, reverse=(sort_dir != 'asc'),
+        limit=limit, last_doc_id=last_doc_id
+    )
+
+    snaps = {}
+    if ids:
+        for snap in db.get_all([events_ref.document(i) for i in ids], field_paths=field_mask(fields, extra=('status',))):
+            if snap.exists:
+                snaps[snap.id] = snap
+
+    events = []
+    for event_id in ids:
+        snap = snaps.get(event_id)
+        if snap is None:
+            continue
+        d = snap.to_dict()
+        if d.get('status') == CANCELLING:
+            continue
+        events.append(format_doc(project(snap.id, d, fields)))
+
     return jsonify({'data': events, 'hasMore': has_more, 'lastDocId': last_id}), 200
 
 @events_bp.route('/<event_id>', methods=['GET'])
@@ -213,36 +232,34 @@ def get_event(event_id):
         return jsonify({'error': 'Event not found'}), 404
     data = doc.to_dict()
     data['id'] = doc.id
+    # Live counts from the shards; the event doc copy is only reconciled periodically
+    data.update(sharded_counters.get_counts(doc.id, data))
     
     # Fetch Host Details
     host_id = data.get('hostId')
     if host_id:
-        host_doc = db.collection('users').document(host_id).get()
-        if host_doc.exists:
-            host_data = host_doc.to_dict()
-            data['hostName'] = host_data.get('displayName', 'Unknown Host')
+        host_data = get_user_profile(host_id)
+        if host_data:
+            data['hostName'] = host_data.get('displayName') or 'Unknown Host'
             data['hostPhoto'] = host_data.get('photoURL', None)
             
     return jsonify(format_doc(data)), 200
 
-@firestore.transactional
-def join_transaction(transaction, event_ref, uid, guests):
-    snapshot = event_ref.get(transaction=transaction)
-    if not snapshot.exists:
-        return {'error': 'Event not found', 'code': 404}
-    
-    data = snapshot.to_dict()
-    participants = data.get('participants', [])
-    attendee_count = data.get('attendeeCount', len(participants)) # Fallback for old events
-    max_p = data.get('maxParticipants', 0)
+class AlreadyJoined(Exception):
+    pass
+
+
+def join_transaction(event_ref, data, uid, guests):
+    """
+    Books spots on the event. The capacity check and the booking write happen
+    in one transaction against a single counter shard, so concurrent joins
+    don't contend on the event document (see services/sharded_counters.py).
+    """
     event_type = data.get('eventType', 'solo')
     
     # Calculate spots needed
     spots_needed = 1 + len(guests)
     
-    if uid in participants:
-         return {'error': 'Already joined', 'code': 400}
-         
     # NEW: Max Tickets Per User
     # Default to 4 (Solo legacy) or 10 (Group logic) if missing
     default_max = 4 if event_type == 'solo' else 10
@@ -253,11 +270,8 @@ def join_transaction(transaction, event_ref, uid, guests):
     
     # Group events: No specific booking limit, just capacity check
 
-    if attendee_count + spots_needed > max_p:
-        return {'error': 'Not enough spots available', 'code': 400}
-    
     # Create Booking Doc in Subcollection
-    booking_ref = event_ref.collection('bookings').document(uid)
+    booking_ref = memberships.booking_ref(event_ref, uid)
     booking_data = {
         'userId': uid,
         'guestCount': len(guests),
@@ -265,13 +279,19 @@ def join_transaction(transaction, event_ref, uid, guests):
         'totalSpots': spots_needed,
         'createdAt': firestore.SERVER_TIMESTAMP
     }
-    transaction.set(booking_ref, booking_data)
 
-    # Update Event
-    transaction.update(event_ref, {
-        'participants': firestore.ArrayUnion([uid]),
-        'attendeeCount': attendee_count + spots_needed
-    })
+    def write_booking(transaction):
+        if booking_ref.get(transaction=transaction).exists:
+            raise AlreadyJoined()
+        transaction.set(booking_ref, booking_data)
+        memberships.add_member(db, transaction, event_ref.id, uid, data)
+
+    try:
+        sharded_counters.reserve(event_ref, data, {'attendeeCount': spots_needed}, write=write_booking)
+    except AlreadyJoined:
+        return {'error': 'Already joined', 'code': 400}
+    except sharded_counters.CapacityError:
+        return {'error': 'Not enough spots available', 'code': 400}
     return {'message': 'Joined successfully', 'code': 200}
 
 @events_bp.route('/<event_id>/join', methods=['POST'])
@@ -288,9 +308,17 @@ def join_event(event_id):
 
     event_ref = events_ref.document(event_id)
     
-    transaction = db.transaction()
     try:
-        result = join_transaction(transaction, event_ref, uid, guests)
+        evt_doc = event_ref.get()
+        if not evt_doc.exists:
+            return jsonify({'error': 'Event not found'}), 404
+        evt = evt_doc.to_dict()
+        if evt.get('status') == CANCELLING:
+            return jsonify({'error': 'This event has been cancelled'}), 400
+        result = join_transaction(event_ref, evt, uid, guests)
+        if result.get('code') == 200:
+            # attendeeCount changed (popularity sort, cards)
+            response_cache.invalidate('events')
         
         # Generate Free Ticket Document if payment is missing
         if result.get('code') == 200:
@@ -312,18 +340,19 @@ def join_event(event_id):
         
         # Notify Host if successful
         if result.get('code') == 200:
-            evt = event_ref.get().to_dict()
-            if evt and evt.get('hostId') != uid:
+            if evt.get('hostId') != uid:
                 msg = f"{user_name} joined {evt.get('title')}"
                 if guests:
                     msg += f" with {len(guests)} guests"
                     
-                create_notification(
+                coalesce(
                     recipient_id=evt.get('hostId'),
                     title='New Attendee',
                     message=msg,
                     type='event_joined',
-                    related_event_id=event_id
+                    related_event_id=event_id,
+                    actor=user_name,
+                    event_title=evt.get('title')
                 )
                 
         return jsonify(result), result.get('code', 200)
@@ -339,37 +368,26 @@ def leave_event(event_id):
     event_ref = events_ref.document(event_id)
     
     try:
-        # Get booking first to know how many spots to free
-        booking_ref = event_ref.collection('bookings').document(uid)
-        booking_doc = booking_ref.get()
-        spots_to_free = 1 # Default if no booking doc (legacy)
-        
-        if booking_doc.exists:
-            spots_to_free = booking_doc.to_dict().get('totalSpots', 1)
-            
         evt_doc = event_ref.get()
         if evt_doc.exists:
             evt = evt_doc.to_dict()
-            
-            # Atomic Decrement
-            # We can use increment(-amount) but let's be careful with 0.
-            # Ideally transaction, but straightforward update is okay for leave if not highly concurrent on same doc
-            
-            event_ref.update({
-                'participants': firestore.ArrayRemove([uid]),
-                'attendeeCount': firestore.Increment(-spots_to_free)
-            })
-            
-            # Delete booking
-            booking_ref.delete()
+
+            # Deletes the booking; the spots it held go back to the counter shards
+            spots_to_free = memberships.leave(event_ref, uid)
+            if spots_to_free is None:
+                return jsonify({'error': 'You have not joined this event'}), 400
+            sharded_counters.release(event_ref, evt, {'attendeeCount': spots_to_free})
+            response_cache.invalidate('events')
             
             if evt.get('hostId') != uid:
-                create_notification(
+                coalesce(
                     recipient_id=evt.get('hostId'),
                     title='Attendee Left',
                     message=f"{user_name} left {evt.get('title')}",
                     type='event_left',
-                    related_event_id=event_id
+                    related_event_id=event_id,
+                    actor=user_name,
+                    event_title=evt.get('title')
                 )
             
             return jsonify({'message': 'Left event'}), 200
@@ -393,18 +411,33 @@ def update_event(event_id):
     data = doc.to_dict()
     if data.get('hostId') != uid:
         return jsonify({'error': 'Unauthorized. Only the host can edit this event.'}), 403
+    if data.get('status') == CANCELLING:
+        return jsonify({'error': 'This event is being cancelled'}), 409
         
     update_data = g.validated_data
     update_data['updatedAt'] = firestore.SERVER_TIMESTAMP
     
-    # Optional: Logic to handle maxParticipants reduction vs current attendees
-    current_attendees = data.get('attendeeCount', 0)
-    if 'maxParticipants' in update_data:
-        new_max = int(update_data['maxParticipants'])
-        if new_max < current_attendees:
-            return jsonify({'error': f'Cannot reduce max participants below current attendee count ({current_attendees})'}), 400
+    # Re-split capacity across the counter shards; refuses to go below current counts
+    if 'maxParticipants' in update_data or 'max_tickets' in update_data:
+        try:
+            sharded_counters.resize(event_ref, {**data, **update_data})
+        except sharded_counters.CapacityError as e:
+            return jsonify({'error': str(e)}), 400
             
     event_ref.update(update_data)
+    response_cache.invalidate('events')
+
+    if any(f in update_data for f in INDEXED_FIELDS):
+        try:
+            index_event(event_id, {**data, **update_data})
+        except Exception as e:
+            print(f"Failed to re-index event {event_id}: {e}")
+
+    if 'date' in update_data or 'title' in update_data:
+        try:
+            schedule_reminder(event_id, {**data, **update_data}, previous_date=data.get('date'))
+        except Exception as e:
+            print(f"Failed to reschedule reminder for event {event_id}: {e}")
     
     return jsonify({'message': 'Event updated successfully'}), 200
 
@@ -422,77 +455,27 @@ def delete_event(event_id):
     if data.get('hostId') != uid:
         return jsonify({'error': 'Unauthorized. Only the host can delete this event.'}), 403
 
-    # Auto-refund active tickets for paid events
-    if data.get('is_paid'):
-        try:
-            active_tickets = db.collection('tickets')\
-                .where('event_id', '==', event_id)\
-                .where('status', '==', 'active')\
-                .stream()
-            
-            import time as _time
-            from app.services.email_service import EmailService
-
-            for ticket_doc in active_tickets:
-                td = ticket_doc.to_dict()
-                ticket_holder = td.get('user_id')
-
-                # Mark ticket as refunded
-                ticket_doc.reference.update({
-                    'status': 'refunded',
-                    'refunded_at': int(_time.time()),
-                    'refund_reason': 'event_cancelled'
-                })
+    if data.get('status') == CANCELLING:
+        # Requeues a cascade that ran out of attempts; otherwise it's still running
+        job_id, restarted = resume_cancellation(event_ref, data)
+        message = 'Event cancellation restarted' if restarted else 'Event is already being cancelled'
+        return jsonify({'message': message, 'jobId': job_id, 'status': CANCELLING}), 202
 
-                # Mark payment order as refunded if exists
-                order_id = td.get('order_id')
-                if order_id and order_id not in ('none', ''):
-                    order_ref = db.collection('payment_orders').document(order_id)
-                    order_doc_snap = order_ref.get()
-                    if order_doc_snap.exists and order_doc_snap.to_dict().get('status') == 'paid':
-                        order_ref.update({
-                            'status': 'refunded',
-                            'refunded_at': int(_time.time()),
-                            'refund_reason': 'event_cancelled'
-                        })
-
-                # Notify ticket holder
-                if ticket_holder:
-                    create_notification(
-                        recipient_id=ticket_holder,
-                        title='Event Cancelled — Refund Issued',
-                        message=f'"{data.get("title")}" has been cancelled. Your ticket has been refunded.',
-                        type='refund',
-                        related_event_id=event_id
-                    )
-
-                    # Send refund email
-                    holder_doc = db.collection('users').document(ticket_holder).get()
-                    if holder_doc.exists:
-                        order_data = {}
-                        if order_id and order_id not in ('none', ''):
-                            od = db.collection('payment_orders').document(order_id).get()
-                            if od.exists:
-                                order_data = od.to_dict()
-
-                        EmailService.send_email(
-                            to_email=holder_doc.to_dict().get('email'),
-                            subject="Event Cancelled — Refund Processed",
-                            template_name="refund_processed",
-                            context={
-                                "user_name": holder_doc.to_dict().get('displayName') or 'User',
-                                "event_name": data.get('title', 'Event'),
-                                "amount": f"{order_data.get('currency', 'INR')} {order_data.get('amount', 0)}",
-                                "payment_id": td.get('payment_id', 'N/A')
-                            }
-                        )
-        except Exception as e:
-            print(f"Auto-refund error during event cancellation: {e}")
-            # Continue with deletion even if refund notifications fail
+    # Refunds, notifications and the delete itself run as a background job
+    # (services/event_cancellation.py); poll /<event_id>/cancellation for progress
+    job_id = start_cancellation(event_ref, data, uid)
+    response_cache.invalidate('events')
 
-    event_ref.delete()
-    
-    return jsonify({'message': 'Event deleted successfully'}), 200
+    return jsonify({'message': 'Event cancellation started', 'jobId': job_id, 'status': CANCELLING}), 202
+
+@events_bp.route('/<event_id>/cancellation', methods=['GET'])
+@login_required
+def get_cancellation(event_id):
+    """Progress of the background cascade started by delete_event."""
+    status = cancellation_status(event_id)
+    if status is None or status.pop('requestedBy') != g.user['uid']:
+        return jsonify({'error': 'No cancellation found for this event'}), 404
+    return jsonify(status), 200
 
 @events_bp.route('/<event_id>/comments', methods=['GET'])
 def list_comments(event_id):
@@ -537,11 +520,10 @@ def add_comment(event_id):
     data = g.validated_data
     text = data['text']
         
-    user_doc = db.collection('users').document(uid).get()
+    ud = get_user_profile(uid)
     display_name = 'Unknown User'
     photo_url = None
-    if user_doc.exists:
-        ud = user_doc.to_dict()
+    if ud:
         display_name = ud.get('displayName') or 'User'
         photo_url = ud.get('photoURL')
         # Update user_name for notification
@@ -563,12 +545,14 @@ def add_comment(event_id):
     if event_doc.exists:
         evt = event_doc.to_dict()
         if evt.get('hostId') != uid: # Don't notify self
-             create_notification(
+             coalesce(
                 recipient_id=evt.get('hostId'),
                 title='New Comment',
                 message=f"{user_name} commented on {evt.get('title')}",
                 type='new_comment',
-                related_event_id=event_id
+                related_event_id=event_id,
+                actor=user_name,
+                event_title=evt.get('title')
             )
     
     return jsonify({'message': 'Comment added', 'commentId': doc_ref.id}), 201
@@ -607,39 +591,40 @@ from app.blueprints.notifications.routes import create_notification
 
 @events_bp.route('/<event_id>/participants', methods=['GET'])
 def list_participants(event_id):
-    event_doc = events_ref.document(event_id).get()
-    if not event_doc.exists:
+    # Bigger default page than other lists: names only, hydrated in one get_all
+    limit = min(int(request.args.get('limit', 50)), 100)
+    last_doc_id = request.args.get('last_doc_id')
+
+    event_ref = events_ref.document(event_id)
+    if not event_ref.get(field_paths=['hostId']).exists:
         return jsonify({'error': 'Event not found'}), 404
-    
-    data = event_doc.to_dict()
-    participant_uids = data.get('participants', [])
-    
-    if not participant_uids:
-        return jsonify([]), 200
-        
-    # Fetch user details
-    # Firestore 'in' query supports max 10, but this is array of IDs.
-    # Better to do a GetAll if possible, or loop if small.
-    # For MVP, loop is fine, or db.get_all(refs).
-    
-    users_ref = db.collection('users')
-    # Create refs
-    # refs = [users_ref.document(uid) for uid in participant_uids] 
-    # docs = db.get_all(refs) # Not always available in standard python admin sdk easily without looking up syntax
-    
-    # Simple loop for now (optimize later for scale)
+
+    # One page of the bookings subcollection; cursor is the last uid shown
+    page_uids, has_more = memberships.member_page(event_ref, limit, last_doc_id)
+
+    profiles = get_user_profiles(page_uids)
     participants = []
-    for uid in participant_uids:
-        udoc = users_ref.document(uid).get()
-        if udoc.exists:
-            udata = udoc.to_dict()
+    for uid in page_uids:
+        udata = profiles.get(uid)
+        if udata:
             participants.append({
                 'uid': uid,
                 'displayName': udata.get('displayName') or 'User',
                 'photoURL': udata.get('photoURL')
             })
+
+    last_id = page_uids[-1] if page_uids else None
             
-    return jsonify(participants), 200
+    return jsonify({'data': participants, 'hasMore': has_more, 'lastDocId': last_id}), 200
+
+@events_bp.route('/<event_id>/membership', methods=['GET'])
+@login_required
+def get_membership(event_id):
+    """Whether the current user has joined the event (and for how many spots)."""
+    booking = memberships.booking_ref(events_ref.document(event_id), g.user['uid']).get()
+    if not booking.exists:
+        return jsonify({'joined': False, 'totalSpots': 0}), 200
+    return jsonify({'joined': True, 'totalSpots': booking.to_dict().get('totalSpots', 1)}), 200
 
 @events_bp.route('/<event_id>/participants/<user_id>', methods=['DELETE'])
 @login_required
@@ -657,9 +642,11 @@ def remove_participant(event_id, user_id):
     if data.get('hostId') != uid:
         return jsonify({'error': 'Only the host can remove participants'}), 403
         
-    event_ref.update({
-        'participants': firestore.ArrayRemove([user_id])
-    })
+    spots = memberships.leave(event_ref, user_id)
+    if spots is None:
+        return jsonify({'error': 'User has not joined this event'}), 404
+    sharded_counters.release(event_ref, data, {'attendeeCount': spots})
+    response_cache.invalidate('events')
     
     # Notify the removed user? (Maybe later)
     
@@ -1,19 +1,19 @@
 from flask import request, jsonify, g
 from firebase_admin import firestore
 from google.cloud.firestore import FieldFilter
-from app.middleware import login_required
+from google.cloud.firestore_v1.field_path import FieldPath
+from app.middleware import login_required, require_role
+from app.services.bulk_update import bulk_update, BATCH_SIZE as BULK_BATCH_SIZE
+from app.services.notification_writer import notification_writer, counter_ref, get_unread_count as unread_count
 from app.utils import format_doc
 from . import notifications_bp
 
 db = firestore.client()
 users_ref = db.collection('users')
 
-# Helper function to create notification (Internal use)
-def create_notification(recipient_id, title, message, type, related_event_id=None):
-    if not recipient_id:
-        return
-        
-    notification_data = {
+def build_notification(recipient_id, title, message, type, related_event_id=None):
+    """The notification document shape, shared by single and batched writers."""
+    return {
         'recipientId': recipient_id,
         'title': title,
         'message': message,
@@ -22,14 +22,15 @@ def create_notification(recipient_id, title, message, type, related_event_id=Non
         'read': False,
         'createdAt': firestore.SERVER_TIMESTAMP
     }
-    
-    # Add to 'notifications' subcollection of the user or a root collection?
-    # Root collection 'notifications' + where(recipientId) is better for querying all notifications for a user easily index-wise, 
-    # but subcollection `users/{uid}/notifications` is cleaner for permissions.
-    # Let's use root collection for simplicity in querying if we ever need cross-user stats, 
-    # but strictly filtering by recipientId.
-    
-    db.collection('notifications').add(notification_data)
+
+# Helper function to create notification (Internal use)
+def create_notification(recipient_id, title, message, type, related_event_id=None):
+    if not recipient_id:
+        return
+    # Root collection 'notifications', filtered by recipientId.
+    # Writes are batched (per request, per `batch()` block or in the background);
+    # see services/notification_writer.py.
+    notification_writer.add(build_notification(recipient_id, title, message, type, related_event_id))
 
 @notifications_bp.route('', methods=['GET'])
 @login_required
@@ -38,12 +39,15 @@ def get_notifications():
     limit = min(int(request.args.get('limit', 20)), 50)
     last_doc_id = request.args.get('last_doc_id')
     
+    # Newest first; document ID breaks ties so the keyset cursor is stable
     query = db.collection('notifications')\
-            .where(filter=FieldFilter('recipientId', '==', uid))
+            .where(filter=FieldFilter('recipientId', '==', uid))\
+            .order_by('createdAt', direction=firestore.Query.DESCENDING)\
+            .order_by(FieldPath.document_id(), direction=firestore.Query.DESCENDING)
     
     if last_doc_id:
         last_doc = db.collection('notifications').document(last_doc_id).get()
-        if last_doc.exists:
+        if last_doc.exists and last_doc.to_dict().get('recipientId') == uid:
             query = query.start_after(last_doc)
     
     docs = query.limit(limit + 1).stream()
@@ -54,9 +58,6 @@ def get_notifications():
         d['id'] = doc.id
         notifications.append(format_doc(d))
     
-    # Sort in memory (newest first)
-    notifications.sort(key=lambda x: str(x.get('createdAt') or ''), reverse=True)
-    
     has_more = len(notifications) > limit
     if has_more:
         notifications = notifications[:limit]
@@ -65,41 +66,75 @@ def get_notifications():
     
     return jsonify({'data': notifications, 'hasMore': has_more, 'lastDocId': last_id}), 200
 
+@notifications_bp.route('/unread-count', methods=['GET'])
+@login_required
+def get_unread_count():
+    # One document read; polled by the notification bell
+    uid = g.user['uid']
+    return jsonify({'unread': unread_count(db, uid)}), 200
+
+@firestore.transactional
+def _mark_read_in_transaction(transaction, ref, uid):
+    snap = ref.get(transaction=transaction)
+    if not snap.exists:
+        return 404
+    d = snap.to_dict()
+    if d.get('recipientId') != uid:
+        return 403
+    if not d.get('read'):
+        transaction.update(ref, {'read': True})
+        transaction.set(counter_ref(db, uid), {'unread': firestore.Increment(-1)}, merge=True)
+    return 200
+
 @notifications_bp.route('/<notification_id>/read', methods=['PUT'])
 @login_required
 def mark_read(notification_id):
     uid = g.user['uid']
     
     ref = db.collection('notifications').document(notification_id)
-    doc = ref.get()
+    code = _mark_read_in_transaction(db.transaction(), ref, uid)
     
-    if not doc.exists:
+    if code == 404:
         return jsonify({'error': 'Notification not found'}), 404
         
-    if doc.to_dict().get('recipientId') != uid:
+    if code == 403:
         return jsonify({'error': 'Unauthorized'}), 403
         
-    ref.update({'read': True})
     return jsonify({'message': 'Marked as read'}), 200
 
 @notifications_bp.route('/read-all', methods=['PUT'])
 @login_required
 def mark_all_read():
     uid = g.user['uid']
+    # Large backlogs are done in 500-write batches; if the request-time budget
+    # runs out the response carries a token to continue from
+    token = request.args.get('token') or (request.get_json(silent=True) or {}).get('token')
     
-    # Batch update?
-    batch = db.batch()
-    docs = db.collection('notifications')\
+    query = db.collection('notifications')\
             .where(filter=FieldFilter('recipientId', '==', uid))\
-            .where(filter=FieldFilter('read', '==', False))\
-            .stream()
-            
-    count = 0
-    for doc in docs:
-        batch.update(doc.reference, {'read': True})
-        count += 1
+            .where(filter=FieldFilter('read', '==', False))
+    
+    def decrement_unread(batch, snaps):
+        # Counter moves in the same batch as the flags it counts
+        batch.set(counter_ref(db, uid), {'unread': firestore.Increment(-len(snaps))}, merge=True)
+    
+    try:
+        result = bulk_update(query, {'read': True}, op=f"read-all:{uid}", token=token,
+                             chunk_size=BULK_BATCH_SIZE - 1, on_chunk=decrement_unread, db=db)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if result.error is not None and result.updated == 0:
+        return jsonify({'error': 'Failed to mark notifications as read'}), 500
         
-    if count > 0:
-        batch.commit()
+    if not result.done:
+        return jsonify(dict(result.to_dict(), message=f'Marked {result.updated} notifications as read so far')), 202
         
-    return jsonify({'message': f'Marked {count} notifications as read'}), 200
+    return jsonify(dict(result.to_dict(), message=f'Marked {result.updated} notifications as read')), 200
+
+@notifications_bp.route('/writer-stats', methods=['GET'])
+@login_required
+@require_role('admin')
+def get_writer_stats():
+    """Queue depth / flush latency of this worker's notification writer."""
+    return jsonify(notification_writer.stats()), 200
@@ -7,6 +7,8 @@ from firebase_admin import firestore
 from . import payments_bp
 from app.middleware import login_required, require_role, validate_request
 from app.schemas import PaymentInit, PaymentVerify, RefundRequest
+from app.services.user_cache import get_user_doc
+from app.services import sharded_counters, memberships, qr_render, ticket_tokens, checkins
 
 db = firestore.client()
 
@@ -24,12 +26,13 @@ else:
 
 
 # ---------------------------------------------------------------------------
-# Helper: Issue ticket + increment tickets_sold atomically
+# Helper: Issue ticket + reserve a tickets_sold slot atomically
 # ---------------------------------------------------------------------------
 def _issue_ticket_for_order(order_data, payment_id, uid):
     """
-    Creates a ticket document and atomically increments tickets_sold on the
-    event.  Returns the ticket_id on success, or raises on capacity overflow.
+    Creates a ticket document and atomically takes a tickets_sold slot from
+    one of the event's counter shards.  Returns the ticket_id on success, or
+    raises on capacity overflow.
 
     This is called from both /verify and /webhook to ensure idempotency — if
     the order already has a linked_ticket_id we skip re-creation.
@@ -38,19 +41,19 @@ def _issue_ticket_for_order(order_data, payment_id, uid):
     event_ref = db.collection('events').document(event_id)
 
     ticket_id = f"tkt_{uuid.uuid4().hex}"
+    issued_at = int(time.time())
 
-    @firestore.transactional
-    def _txn(transaction):
-        event_snap = event_ref.get(transaction=transaction)
-        if not event_snap.exists:
-            raise ValueError("Event not found")
+    event_snap = event_ref.get()
+    if not event_snap.exists:
+        raise ValueError("Event not found")
+    evt = event_snap.to_dict()
+    if evt.get('status') == 'cancelling':
+        raise ValueError("Event has been cancelled")
 
-        evt = event_snap.to_dict()
-        sold = int(evt.get('tickets_sold', 0))
-        max_t = evt.get('max_tickets') or evt.get('maxParticipants', 0)
+    booking_ref = memberships.booking_ref(event_ref, uid)
 
-        if max_t and sold >= int(max_t):
-            raise ValueError("Event is sold out — no tickets available")
+    def _write_ticket(transaction):
+        booking_exists = booking_ref.get(transaction=transaction).exists
 
         # Create ticket inside transaction scope for atomicity
         ticket_ref = db.collection('tickets').document(ticket_id)
@@ -61,23 +64,33 @@ def _issue_ticket_for_order(order_data, payment_id, uid):
             'payment_id': payment_id,
             'order_id': order_data.get('order_id', ''),
             'status': 'active',
-            'created_at': int(time.time()),
+            'created_at': issued_at,
             'is_mock': USE_MOCK
         })
+        # Each ticket is a spot on the holder's booking
+        if booking_exists:
+            transaction.update(booking_ref, {'totalSpots': firestore.Increment(1)})
+        else:
+            transaction.set(booking_ref, {
+                'userId': uid,
+                'guestCount': 0,
+                'guests': [],
+                'totalSpots': 1,
+                'createdAt': firestore.SERVER_TIMESTAMP
+            })
+            memberships.add_member(db, transaction, event_id, uid, evt)
 
-        # Compute new values explicitly (Increment sentinels don't work in transactions)
-        current_participants = evt.get('participants', [])
-        new_participants = list(set(current_participants + [uid]))
-        current_attendee_count = int(evt.get('attendeeCount', len(current_participants)))
-
-        transaction.update(event_ref, {
-            'tickets_sold': sold + 1,
-            'participants': new_participants,
-            'attendeeCount': current_attendee_count + 1
-        })
-
-    transaction = db.transaction()
-    _txn(transaction)
+    # Only tickets_sold is capped here; attendeeCount just follows along
+    try:
+        sharded_counters.reserve(event_ref, evt, {'tickets_sold': 1, 'attendeeCount': 1},
+                                 check=('tickets_sold',), write=_write_ticket)
+    except sharded_counters.CapacityError:
+        raise ValueError("Event is sold out — no tickets available")
+    # Holders usually open the ticket right after paying; the ticket is issued either way
+    try:
+        qr_render.prerender(ticket_tokens.sign(ticket_id, event_id, uid, issued_at))
+    except RuntimeError as e:
+        print(f"Ticket QR pre-render skipped: {e}")
     return ticket_id
 
 
@@ -194,7 +207,7 @@ def verify_payment():
             if razorpay_signature != f"mock_sig_{razorpay_order_id}":
                 return jsonify({'error': 'Invalid mock signature'}), 400
 
-        # Issue ticket atomically (increments tickets_sold inside transaction)
+        # Issue ticket atomically (takes a tickets_sold slot inside the transaction)
         ticket_id = _issue_ticket_for_order(order_data, razorpay_payment_id, uid)
 
         # Mark order as paid
@@ -328,8 +341,8 @@ def refund_payment(payment_id):
         event_id = order_data.get('event_id')
         event_doc = db.collection('events').document(event_id).get()
 
-        user_doc = db.collection('users').document(uid).get()
-        user_role = user_doc.to_dict().get('role', 'user') if user_doc.exists else 'user'
+        user_doc = get_user_doc(uid)
+        user_role = user_doc.get('role', 'user') if user_doc else 'user'
         is_host = event_doc.exists and event_doc.to_dict().get('hostId') == uid
         is_admin = user_role == 'admin'
 
@@ -356,13 +369,15 @@ def refund_payment(payment_id):
             ticket_ref = db.collection('tickets').document(ticket_id)
             ticket_doc = ticket_ref.get()
             if ticket_doc.exists and ticket_doc.to_dict().get('status') != 'refunded':
-                ticket_ref.update({'status': 'refunded', 'refunded_at': int(time.time())})
+                # The check-in marker turns the ticket away at signed-token scans
+                batch = db.batch()
+                batch.update(ticket_ref, {'status': 'refunded', 'refunded_at': int(time.time())})
+                checkins.record_refund(db, batch, ticket_id, event_id, ticket_doc.to_dict().get('user_id'))
+                batch.commit()
 
-                # Decrement tickets_sold atomically
+                # Give the ticket back to the counter shards
                 if event_doc.exists:
-                    db.collection('events').document(event_id).update({
-                        'tickets_sold': firestore.Increment(-1)
-                    })
+                    sharded_counters.release(event_doc.reference, event_doc.to_dict(), {'tickets_sold': 1})
 
         # Notify the ticket holder
         ticket_holder_uid = order_data.get('user_id')
@@ -379,14 +394,14 @@ def refund_payment(payment_id):
 
             # Send refund email
             from app.services.email_service import EmailService
-            holder_doc = db.collection('users').document(ticket_holder_uid).get()
-            if holder_doc.exists:
+            holder = get_user_doc(ticket_holder_uid)
+            if holder:
                 EmailService.send_email(
-                    to_email=holder_doc.to_dict().get('email'),
+                    to_email=holder.get('email'),
                     subject="Refund Processed - Huddle",
                     template_name="refund_processed",
                     context={
-                        "user_name": holder_doc.to_dict().get('displayName') or 'User',
+                        "user_name": holder.get('displayName') or 'User',
                         "event_name": event_title,
                         "amount": f"{order_data.get('currency', 'INR')} {order_data.get('amount', 0)}",
                         "payment_id": payment_id
@@ -408,14 +423,14 @@ def _send_payment_email(uid, order_data):
     try:
         from app.services.email_service import EmailService
         event_doc = db.collection('events').document(order_data['event_id']).get()
-        user_doc = db.collection('users').document(uid).get()
-        if event_doc.exists and user_doc.exists:
+        user = get_user_doc(uid)
+        if event_doc.exists and user:
             EmailService.send_email(
-                to_email=user_doc.to_dict().get('email'),
+                to_email=user.get('email'),
                 subject="Payment Receipt - Huddle",
                 template_name="payment_success",
                 context={
-                    "user_name": user_doc.to_dict().get('displayName') or 'User',
+                    "user_name": user.get('displayName') or 'User',
                     "event_name": event_doc.to_dict().get('title', 'Event'),
                     "amount": f"{order_data.get('currency', 'INR')} {order_data.get('amount', 0)}",
                     "transaction_id": order_data.get('payment_id', 'N/A')
@@ -1,9 +1,11 @@
-import io
-import qrcode
-from flask import send_file, jsonify, request, g
+import time
+from flask import make_response, jsonify, request, g, Response, stream_with_context
 from firebase_admin import firestore
 from . import tickets_bp
 from app.middleware import login_required, validate_request
+from app.schemas import TicketScan, CheckinSync
+from app.services import qr_render, ticket_tokens, checkins, checkin_manifest
+from app.services.event_cancellation import CANCELLING
 
 db = firestore.client()
 
@@ -73,7 +75,15 @@ def get_ticket(ticket_id):
 # but making it login_required is safer.
 @login_required
 def generate_ticket_qr(ticket_id):
+    """
+    The ticket's QR code. ?format=png (default) or svg. Renders are cached by
+    content, so the response carries a strong ETag and is immutable.
+    """
     uid = g.user['uid']
+
+    fmt = request.args.get('format', qr_render.DEFAULT_FORMAT)
+    if fmt not in qr_render.FORMATS:
+        return jsonify({'error': f"Unsupported format. Use one of: {', '.join(qr_render.FORMATS)}"}), 400
     
     # Verify ownership
     doc_ref = db.collection('tickets').document(ticket_id)
@@ -81,27 +91,20 @@ def generate_ticket_qr(ticket_id):
     
     if not doc.exists or doc.to_dict().get('user_id') != uid:
         return jsonify({'error': 'Unauthorized or Not Found'}), 403
-        
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    
-    # We will embed a verification URL or JSON string. 
-    # For phase 1, we just embed the ticket ID.
-    qr.add_data(f"ticket:{ticket_id}")
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Send as image via BytesIO
-    img_io = io.BytesIO()
-    img.save(img_io, 'PNG')
-    img_io.seek(0)
-    
-    return send_file(img_io, mimetype='image/png')
+
+    # A signed token, so scanners can verify the ticket without a lookup
+    payload = ticket_tokens.token_for(ticket_id, doc.to_dict())
+    etag = qr_render.cache_key(payload, fmt)
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        data, etag = qr_render.get_qr(payload, fmt)
+        response = make_response(data, 200)
+        response.mimetype = qr_render.FORMATS[fmt]
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = qr_render.CACHE_CONTROL
+    return response
 
 
 @tickets_bp.route('/<ticket_id>/checkin', methods=['POST'])
@@ -143,12 +146,119 @@ def checkin_ticket(ticket_id):
     if status != 'active':
         return jsonify({'error': f'Ticket is in "{status}" state and cannot be checked in'}), 400
 
-    # Mark as used
-    import time
-    doc_ref.update({
+    # Mark as used (the marker keeps signed-token scans in step)
+    batch = db.batch()
+    batch.update(doc_ref, {
         'status': 'used',
         'checked_in_at': int(time.time()),
         'checked_in_by': uid
     })
+    checkins.record_checkin(db, batch, ticket_id, event_id, td.get('user_id'), uid)
+    batch.commit()
 
     return jsonify({'message': 'Ticket checked in successfully', 'ticket_id': ticket_id}), 200
+
+
+SCAN_REJECTIONS = {
+    checkins.USED: 'Ticket has already been checked in',
+    checkins.REFUNDED: 'Ticket has been refunded and is no longer valid',
+    'missing': 'Ticket no longer exists',
+}
+
+
+@tickets_bp.route('/scan', methods=['POST'])
+@login_required
+@validate_request(TicketScan)
+def scan_ticket():
+    """
+    Check in by scanning a ticket's QR code at the door.
+    The token is verified without reading the database: forged codes and
+    tickets for another event are rejected immediately. Checking in reads
+    the ticket once and only succeeds while it is still active.
+    """
+    uid = g.user['uid']
+    data = g.validated_data
+
+    try:
+        claims = ticket_tokens.verify(data['token'], event_id=data['event_id'])
+    except ticket_tokens.TokenError as e:
+        return jsonify({'error': str(e), 'reason': e.reason}), 400
+
+    denied = _host_gate(claims.event_id, uid)
+    if denied:
+        return denied
+
+    rejected = checkins.check_in(claims, uid)
+    if rejected:
+        message = SCAN_REJECTIONS.get(rejected, f'Ticket is in "{rejected}" state and cannot be checked in')
+        return jsonify({'error': message, 'reason': rejected}), 400
+
+    return jsonify({
+        'message': 'Ticket checked in successfully',
+        'ticket_id': claims.ticket_id,
+        'holder': claims.holder,
+    }), 200
+
+
+def _host_gate(event_id, uid):
+    """An error response unless `uid` hosts the (not cancelled) event."""
+    gate = checkins.event_gate(event_id)
+    if gate is None:
+        return jsonify({'error': 'Event not found'}), 404
+    host_id, status = gate
+    if host_id != uid:
+        return jsonify({'error': 'Only the event host can check in tickets'}), 403
+    if status == CANCELLING:
+        return jsonify({'error': 'Event has been cancelled'}), 400
+    return None
+
+
+@tickets_bp.route('/events/<event_id>/manifest', methods=['GET'])
+@login_required
+def get_checkin_manifest(event_id):
+    """
+    Streams the event's tickets for offline scanning (NDJSON).
+    ?since=<version> returns only what changed after an earlier manifest.
+    """
+    denied = _host_gate(event_id, g.user['uid'])
+    if denied:
+        return denied
+
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({'error': 'since must be a manifest version'}), 400
+
+    response = Response(stream_with_context(checkin_manifest.manifest_lines(event_id, since)),
+                        mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@tickets_bp.route('/events/<event_id>/sync', methods=['POST'])
+@login_required
+@validate_request(CheckinSync)
+def sync_checkins(event_id):
+    """
+    Uploads check-ins scanned offline. Applied in one transaction; scans that
+    cannot apply (double scans, refunded, wrong event) come back as conflicts.
+    """
+    uid = g.user['uid']
+    denied = _host_gate(event_id, uid)
+    if denied:
+        return denied
+
+    data = g.validated_data
+    try:
+        applied, conflicts = checkin_manifest.sync_checkins(event_id, data['checkins'], uid, data.get('device_id'))
+    except Exception as e:
+        print(f"Check-in sync failed for event {event_id}: {e}")
+        return jsonify({'error': 'Sync failed, retry the batch'}), 500
+
+    return jsonify({
+        'applied': applied,
+        'conflicts': conflicts,
+        'version': int(time.time()),
+    }), 200
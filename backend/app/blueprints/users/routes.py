@@ -9,6 +9,9 @@ from . import users_bp
 from datetime import datetime
 from app.blueprints.notifications.routes import create_notification
 from app.services.email_service import EmailService
+from app.services.user_cache import get_user_doc, invalidate_user
+from app.services.memberships import joined_events
+from app.services.projection import parse_projection, field_mask, select, project, ProjectionError, EVENT_VIEWS
 
 db = firestore.client()
 users_ref = db.collection('users')
@@ -55,6 +58,7 @@ def sync_user():
     else:
         # Existing User - update basic info if provided, but don't overwrite role unless admin
         user_doc_ref.update(user_data)
+        invalidate_user(uid)
         return jsonify({'message': 'User synced', 'user': format_doc(user_doc.to_dict())}), 200
 
 @users_bp.route('/<uid>', methods=['GET'])
@@ -64,11 +68,11 @@ def get_user(uid):
     # For MVP, assuming public profiles are okay? Or strict privacy?
     # Context says "Community-first", so likely public profiles.
     
-    doc = users_ref.document(uid).get()
-    if not doc.exists:
+    data = get_user_doc(uid)
+    if data is None:
         return jsonify({'error': 'User not found'}), 404
         
-    return jsonify(format_doc(doc.to_dict())), 200
+    return jsonify(format_doc(data)), 200
 
 @users_bp.route('/me', methods=['GET'])
 @login_required
@@ -86,30 +90,32 @@ def update_current_user():
 @login_required
 def get_hosted_events():
     uid = g.user['uid']
+    try:
+        fields = parse_projection(request.args, EVENT_VIEWS)
+    except ProjectionError as e:
+        return jsonify({'error': str(e)}), 400
+
     # Query events where hostId == uid
     events_ref = db.collection('events')
-    docs = events_ref.where(filter=FieldFilter('hostId', '==', uid)).stream()
+    query = select(events_ref.where(filter=FieldFilter('hostId', '==', uid)), fields)
     
     events = []
-    for doc in docs:
-        d = doc.to_dict()
-        d['id'] = doc.id
-        events.append(format_doc(d))
+    for doc in query.stream():
+        events.append(format_doc(project(doc.id, doc.to_dict(), fields)))
     return jsonify(events), 200
 
 @users_bp.route('/me/events/joined', methods=['GET'])
 @login_required
 def get_joined_events():
     uid = g.user['uid']
-    # Query events where participants array contains uid
-    events_ref = db.collection('events')
-    docs = events_ref.where(filter=FieldFilter('participants', 'array_contains', uid)).stream()
-    
-    events = []
-    for doc in docs:
-        d = doc.to_dict()
-        d['id'] = doc.id
-        events.append(format_doc(d))
+    try:
+        fields = parse_projection(request.args, EVENT_VIEWS)
+    except ProjectionError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Membership index: users/{uid}/joined_events (see services/memberships.py)
+    events = [format_doc(project(d.pop('id'), d, fields))
+              for d in joined_events(uid, field_paths=field_mask(fields))]
     return jsonify(events), 200
 
 @users_bp.route('/<uid>', methods=['PUT'])
@@ -123,6 +129,7 @@ def update_user(uid):
     update_data['updatedAt'] = firestore.SERVER_TIMESTAMP
     
     users_ref.document(uid).set(update_data, merge=True)
+    invalidate_user(uid)
     
     return jsonify({'message': 'Profile updated', 'updates': format_doc(update_data)}), 200
 
@@ -145,6 +152,7 @@ def subscribe_user():
         update_data['host_plan'] = plan_name
         
     users_ref.document(uid).set(update_data, merge=True)
+    invalidate_user(uid)
     
     return jsonify({'message': f'{plan_type.capitalize()} plan updated', 'plan': plan_name, 'type': plan_type}), 200
 
@@ -170,6 +178,7 @@ def request_verification():
         update_data['verificationDocument'] = doc_url
 
     users_ref.document(uid).set(update_data, merge=True)
+    invalidate_user(uid)
     
     return jsonify({'message': f'{ver_type.capitalize()} verification requested'}), 200
 
@@ -195,12 +204,12 @@ def approve_host(uid):
         notification_msg = 'Your account has been verified as a host.'
 
     users_ref.document(uid).set(update_data, merge=True)
+    invalidate_user(uid)
     
     create_notification(uid, 'Verification Approved', notification_msg, 'system')
     
-    user_doc = users_ref.document(uid).get()
-    if user_doc.exists:
-        u_data = user_doc.to_dict()
+    u_data = get_user_doc(uid)
+    if u_data:
         EmailService.send_email(
             to_email=u_data.get('email'),
             subject="Your Huddle account has been verified!",
@@ -232,12 +241,12 @@ def reject_host(uid):
         notification_msg = 'Your request to become a host has been rejected. Please update your documents and try again.'
 
     users_ref.document(uid).set(update_data, merge=True)
+    invalidate_user(uid)
     
     create_notification(uid, 'Verification Rejected', notification_msg, 'system')
     
-    user_doc = users_ref.document(uid).get()
-    if user_doc.exists:
-        u_data = user_doc.to_dict()
+    u_data = get_user_doc(uid)
+    if u_data:
         EmailService.send_email(
             to_email=u_data.get('email'),
             subject="Huddle Verification Update",
@@ -4,6 +4,13 @@ from google.cloud.firestore import FieldFilter
 from . import venues_bp
 from app.middleware import login_required, validate_request
 from app.schemas import VenueCreate, VenueUpdate, BookingRequest
+from app.services.user_cache import get_user_doc
+from app.services.query_planner import plan_venues_query, parse_float, parse_int
+from app.services.venue_index import venue_index
+from app.services.response_cache import response_cache
+from app.services.projection import parse_projection, field_mask, select, project, ProjectionError, VENUE_VIEWS
+from app.services.cascade_delete import queue_cascade_delete, deletion_status, open_venue_requests
+from app.scheduler import payment_deadline
 from app import limiter
 import uuid
 import datetime
@@ -19,8 +26,7 @@ def create_venue():
         uid = g.user['uid']
         
         # Check User Plan limits
-        user_doc = db.collection('users').document(uid).get()
-        user_data = user_doc.to_dict() if user_doc.exists else {}
+        user_data = get_user_doc(uid) or {}
         plan = user_data.get('venue_plan', 'basic')
         
         # Count existing venues
@@ -53,6 +59,8 @@ def create_venue():
         }
 
         db.collection('venues').document(venue_id).set(venue_data)
+        venue_index.invalidate()
+        response_cache.invalidate('venues')
         
         return jsonify(venue_data), 201
 
@@ -60,91 +68,70 @@ def create_venue():
         return jsonify({"error": str(e)}), 500
 
 @venues_bp.route('', methods=['GET'])
+@response_cache.cached('venues')
 def get_venues():
     try:
         city = request.args.get('city')
-        min_capacity = request.args.get('min_capacity')
-        min_price = request.args.get('min_price')
-        max_price = request.args.get('max_price')
+        min_capacity = parse_int(request.args.get('min_capacity'))
+        min_price = parse_float(request.args.get('min_price'))
+        max_price = parse_float(request.args.get('max_price'))
         q = request.args.get('q')
         sort_by = request.args.get('sort_by', 'created_at')
         sort_dir = request.args.get('sort_dir', 'desc')
         
         limit = min(int(request.args.get('limit', 20)), 50)
         last_doc_id = request.args.get('last_doc_id')
+
+        try:
+            fields = parse_projection(request.args, VENUE_VIEWS)
+        except ProjectionError as e:
+            return jsonify({"error": str(e)}), 400
         
         venues_ref = db.collection('venues')
-        query = venues_ref
-        
-        # 1. Equality Filters
-        if city:
-            query = query.where(filter=FieldFilter('city', '==', city))
-            
-        # 2. Sorting
-        direction = firestore.Query.ASCENDING if sort_dir == 'asc' else firestore.Query.DESCENDING
-        if sort_by == 'price':
-            query = query.order_by('price_per_hour', direction=direction)
-        elif sort_by == 'capacity':
-            query = query.order_by('capacity', direction=direction)
+
+        query, plan = plan_venues_query(
+            venues_ref, city=city, min_capacity=min_capacity, min_price=min_price,
+            max_price=max_price, q=q, sort_by=sort_by,
+            direction='ASCENDING' if sort_dir == 'asc' else 'DESCENDING'
+        )
+
+        if plan.bounded:
+            # Everything pushed down: read exactly one page (+1 to detect more)
+            if last_doc_id:
+                last_doc = venues_ref.document(last_doc_id).get()
+                if last_doc.exists:
+                    query = query.start_after(last_doc)
+
+            query = select(query, fields)
+            venues = [project(doc.id, doc.to_dict(), fields) for doc in query.limit(limit + 1).stream()]
+            has_more = len(venues) > limit
+            if has_more:
+                venues = venues[:limit]
         else:
-            query = query.order_by('created_at', direction=direction)
-            
-        # Tie breaker
-        from google.cloud.firestore_v1.field_path import FieldPath
-        query = query.order_by(FieldPath.document_id(), direction=direction)
-        
-        if last_doc_id:
-            last_doc = venues_ref.document(last_doc_id).get()
-            if last_doc.exists:
-                query = query.start_after(last_doc)
-        
-        # Stream without limit in DB so we can filter in Python
-        docs = query.stream()
-        venues = []
-        
-        for doc in docs:
-            if len(venues) >= limit + 1:
-                break
-                
-            d = doc.to_dict()
-            
-            # Python-side filtering
-            if min_capacity:
-                try:
-                    if int(d.get('capacity', 0)) < int(min_capacity):
-                        continue
-                except: pass
-                
-            if min_price:
-                try:
-                    if float(d.get('price_per_hour', 0)) < float(min_price):
-                        continue
-                except: pass
-                
-            if max_price:
-                try:
-                    if float(d.get('price_per_hour', 0)) > float(max_price):
-                        continue
-                except: pass
-                
-            # Text Search
-            if q:
-                term = q.lower()
-                name = str(d.get('name') or '')
-                loc = str(d.get('location') or '')
-                searchable = (name + ' ' + loc).lower()
-                if term not in searchable:
-                    continue
-            
-            venues.append(d)
-        
-        has_more = len(venues) > limit
-        if has_more:
-            venues = venues[:limit]
+            # Colliding inequalities / text search: answer from the in-memory index
+            ranked = venue_index.query(
+                city=city, min_capacity=min_capacity, min_price=min_price,
+                max_price=max_price, q=q, order_field=plan.order_field,
+                descending=(sort_dir != 'asc')
+            )
+            start = 0
+            if last_doc_id and last_doc_id in ranked:
+                start = ranked.index(last_doc_id) + 1
+            page_ids = ranked[start:start + limit]
+            has_more = start + limit < len(ranked)
+
+            snaps = {}
+            if page_ids:
+                for snap in db.get_all([venues_ref.document(i) for i in page_ids], field_paths=field_mask(fields)):
+                    if snap.exists:
+                        snaps[snap.id] = project(snap.id, snap.to_dict(), fields)
+            venues = [snaps[i] for i in page_ids if i in snaps]
         
         last_id = venues[-1]['id'] if venues else None
         
-        return jsonify({'data': venues, 'hasMore': has_more, 'lastDocId': last_id}), 200
+        response = jsonify({'data': venues, 'hasMore': has_more, 'lastDocId': last_id})
+        response.headers['X-Query-Plan'] = plan.describe() + ('' if plan.bounded else ';index=memory')
+        return response, 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -153,11 +140,16 @@ def get_venues():
 def get_my_venues():
     try:
         uid = g.user['uid']
+        try:
+            fields = parse_projection(request.args, VENUE_VIEWS)
+        except ProjectionError as e:
+            return jsonify({"error": str(e)}), 400
+
         venues_ref = db.collection('venues')
-        docs = venues_ref.where(filter=FieldFilter('owner_id', '==', uid)).stream()
+        query = select(venues_ref.where(filter=FieldFilter('owner_id', '==', uid)), fields)
         venues = []
-        for doc in docs:
-            venues.append(doc.to_dict())
+        for doc in query.stream():
+            venues.append(project(doc.id, doc.to_dict(), fields))
         return jsonify(venues), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -228,11 +220,15 @@ def update_venue(venue_id):
         update_data = g.validated_data
 
         venue_ref.update(update_data)
+        venue_index.invalidate()
+        response_cache.invalidate('venues')
         
         return jsonify({"message": "Venue updated", "id": venue_id}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+OPEN_REQUESTS_SHOWN = 20
+
 @venues_bp.route('/<venue_id>', methods=['DELETE'])
 @login_required
 def delete_venue(venue_id):
@@ -247,11 +243,32 @@ def delete_venue(venue_id):
         if venue_doc.to_dict().get('owner_id') != uid:
              return jsonify({"error": "Unauthorized"}), 403
 
+        # Other users' bookings (possibly paid) must be settled first
+        open_requests = open_venue_requests(venue_id, db, limit=OPEN_REQUESTS_SHOWN)
+        if open_requests:
+            return jsonify({
+                "error": "Venue has open booking requests. Reject or cancel them before deleting it.",
+                "openRequests": open_requests
+            }), 409
+
+        # The venue disappears now; its closed booking requests are removed in the background
         venue_ref.delete()
-        return jsonify({"message": "Venue deleted"}), 200
+        venue_index.invalidate()
+        response_cache.invalidate('venues')
+        job_id = queue_cascade_delete('venue', venue_id, requested_by=uid)
+        return jsonify({"message": "Venue deleted", "jobId": job_id}), 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@venues_bp.route('/<venue_id>/deletion', methods=['GET'])
+@login_required
+def get_venue_deletion(venue_id):
+    """Progress of the background cleanup started by delete_venue."""
+    status = deletion_status('venue', venue_id)
+    if status is None or status.pop('requestedBy') != g.user['uid']:
+        return jsonify({"error": "No deletion found for this venue"}), 404
+    return jsonify(status), 200
+
 # ---------------------------------------------------------------------------
 # Booking State Machine
 # ---------------------------------------------------------------------------
@@ -363,13 +380,18 @@ def approve_booking(request_id):
         
         new_status = 'payment_pending' if total_price > 0 else 'confirmed'
 
-        req_ref.update({
+        approved_at = datetime.datetime.utcnow()
+        approval = {
             'status': new_status,
-            'approved_at': datetime.datetime.utcnow().isoformat(),
+            'approved_at': approved_at.isoformat(),
             'approved_by': uid,
             'total_price': total_price,
             'duration_hours': duration_hours
-        })
+        }
+        if new_status == 'payment_pending':
+            # Indexed by the unpaid-booking sweeper (scheduler.py)
+            approval['payment_deadline'] = payment_deadline(approved_at)
+        req_ref.update(approval)
 
         _add_transition_history(req_ref, current_status, new_status, uid)
         
@@ -385,14 +407,14 @@ def approve_booking(request_id):
 
         # Email Dispatch
         from app.services.email_service import EmailService
-        user_doc = db.collection('users').document(req_data['requester_id']).get()
-        if user_doc.exists:
+        user_doc = get_user_doc(req_data['requester_id'])
+        if user_doc:
             EmailService.send_email(
-                to_email=user_doc.to_dict().get('email'),
+                to_email=user_doc.get('email'),
                 subject="Venue Booking Approved",
                 template_name="booking_approved",
                 context={
-                    "user_name": user_doc.to_dict().get('displayName') or 'User',
+                    "user_name": user_doc.get('displayName') or 'User',
                     "venue_name": venue_doc.to_dict().get('name'),
                     "date": req_data.get('date'),
                     "start_time": req_data.get('start_time'),
@@ -534,14 +556,14 @@ def verify_payment(request_id):
         
         # Email Dispatch (Receipt)
         from app.services.email_service import EmailService
-        user_doc = db.collection('users').document(uid).get()
-        if user_doc.exists:
+        user_doc = get_user_doc(uid)
+        if user_doc:
             EmailService.send_email(
-                to_email=user_doc.to_dict().get('email'),
+                to_email=user_doc.get('email'),
                 subject="Venue Booking Payment Receipt",
                 template_name="payment_receipt",
                 context={
-                    "user_name": user_doc.to_dict().get('displayName') or 'User',
+                    "user_name": user_doc.get('displayName') or 'User',
                     "event_title": f"Venue Booking: {venue_doc.to_dict().get('name')}",
                     "amount": req_data.get('total_price'),
                     "transaction_id": data.get('razorpay_payment_id', 'MOCK')
@@ -606,14 +628,14 @@ def reject_booking(request_id):
         
         # Email
         from app.services.email_service import EmailService
-        user_doc = db.collection('users').document(req_data['requester_id']).get()
-        if user_doc.exists:
+        user_doc = get_user_doc(req_data['requester_id'])
+        if user_doc:
             EmailService.send_email(
-                to_email=user_doc.to_dict().get('email'),
+                to_email=user_doc.get('email'),
                 subject="Venue Booking Rejected",
                 template_name="booking_rejected",
                 context={
-                    "user_name": user_doc.to_dict().get('displayName') or 'User',
+                    "user_name": user_doc.get('displayName') or 'User',
                     "venue_name": venue_doc.to_dict().get('name'),
                     "date": req_data.get('date'),
                     "reason": reason
@@ -1,7 +1,8 @@
 from functools import wraps
 from flask import request, jsonify, g
-from firebase_admin import auth, firestore
 from pydantic import ValidationError
+from app.services.auth_cache import verify_id_token
+from app.services.user_cache import get_user_doc
 
 
 def login_required(f):
@@ -14,7 +15,8 @@ def login_required(f):
         try:
             # Expected format: "Bearer <token>"
             token = auth_header.split(" ")[1]
-            decoded_token = auth.verify_id_token(token)
+            # Cached + offline verification (see services/auth_cache.py)
+            decoded_token = verify_id_token(token)
             g.user = decoded_token  # Store user info in flask global context
         except IndexError:
             return jsonify({'error': 'Invalid token format. Bearer <token> expected'}), 401
@@ -48,11 +50,10 @@ def require_role(*allowed_roles):
 
             # Re-use cached user doc if already fetched in this request
             if not getattr(g, 'user_doc', None):
-                db = firestore.client()
-                user_doc = db.collection('users').document(uid).get()
-                if not user_doc.exists:
+                user_doc = get_user_doc(uid)
+                if user_doc is None:
                     return jsonify({'error': 'User profile not found'}), 404
-                g.user_doc = user_doc.to_dict()
+                g.user_doc = user_doc
 
             user_role = g.user_doc.get('role', 'user')
 
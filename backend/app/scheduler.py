@@ -1,92 +1,201 @@
 from flask_apscheduler import APScheduler
 import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
 from firebase_admin import firestore
+from google.cloud.firestore import FieldFilter
+from app.services.jobs import recover_jobs
+from app.services.distributed_scheduler import distributed_scheduler
+from app.services.reminders import send_event_reminders
+from app.services.digest import flush_digests
+from app.services.sharded_counters import reconcile_counters
 
 scheduler = APScheduler()
 
-def cancel_unpaid_bookings():
+# Bookings must be paid within this window after approval
+PAYMENT_WINDOW_HOURS = 24
+SWEEP_PAGE_SIZE = 300
+# Each booking costs two writes (status + history entry)
+SWEEP_CHUNK_SIZE = 100
+SWEEP_WORKERS = 4
+# Failures kept in the run report (the count is always exact)
+MAX_REPORTED_FAILURES = 50
+
+REQUIRED_INDEXES = [
+    {'collectionGroup': 'venue_requests', 'queryScope': 'COLLECTION', 'fields': [
+        {'fieldPath': 'status', 'order': 'ASCENDING'},
+        {'fieldPath': 'payment_deadline', 'order': 'ASCENDING'},
+    ]},
+]
+
+
+def payment_deadline(approved_at):
+    """ISO deadline stored on payment_pending bookings at approval time."""
+    return (approved_at + datetime.timedelta(hours=PAYMENT_WINDOW_HOURS)).isoformat()
+
+
+def _load_venues(db, venue_ids, cache):
+    """Fills `cache` with name/owner of venues not seen yet in this sweep."""
+    missing = [vid for vid in set(venue_ids) if vid and vid not in cache]
+    for i in range(0, len(missing), 100):
+        refs = [db.collection('venues').document(vid) for vid in missing[i:i + 100]]
+        for snap in db.get_all(refs, field_paths=['name', 'owner_id']):
+            cache[snap.id] = snap.to_dict() if snap.exists else None
+    for vid in missing:
+        cache.setdefault(vid, None)
+
+
+def _cancel_chunk(db, snaps, venues, now):
     """
-    Background job that runs every hour.
-    Finds all bookings in 'payment_pending' state where 'approved_at' is older than 24 hours.
-    Transitions them to 'cancelled' and notifies the requester.
+    Cancels one chunk of expired bookings in a single batch. Each update is
+    conditioned on the booking not having changed since it was read, so a
+    payment confirmed mid-sweep wins; if that trips the batch, the chunk is
+    retried one booking at a time. Returns (cancelled, failures).
     """
+    from app.blueprints.notifications.routes import create_notification
+    from app.services.notification_writer import notification_writer
+
+    reason = f"Payment timeout ({PAYMENT_WINDOW_HOURS} hours exceeded)"
+
+    def stage(batch, snap):
+        batch.update(snap.reference, {
+            'status': 'cancelled',
+            'rejection_reason': reason,  # reuse this field for notes
+            'cancelled_at': now.isoformat(),
+            'cancelled_by': 'system'
+        }, option=db.write_option(last_update_time=snap.update_time))
+        # Audit trail
+        batch.set(snap.reference.collection('status_history').document(), {
+            'from': 'payment_pending',
+            'to': 'cancelled',
+            'actor': 'system',
+            'reason': reason,
+            'timestamp': now.isoformat()
+        })
+
+    batch = db.batch()
+    for snap in snaps:
+        stage(batch, snap)
     try:
-        db = firestore.client()
-        now = datetime.datetime.utcnow()
-        cutoff_time = now - datetime.timedelta(hours=24)
-        cutoff_iso = cutoff_time.isoformat()
-
-        # Query bookings pending payment
-        docs = db.collection('venue_requests')\
-            .where('status', '==', 'payment_pending')\
-            .stream()
-
-        cancelled_count = 0
-        from app.blueprints.notifications.routes import create_notification
-
-        for doc in docs:
-            d = doc.to_dict()
-            approved_at_iso = d.get('approved_at')
-            if not approved_at_iso:
-                continue
-                
-            if approved_at_iso < cutoff_iso:
-                # Cancel this booking
-                req_ref = db.collection('venue_requests').document(doc.id)
-                reason = "Payment timeout (24 hours exceeded)"
-                
-                req_ref.update({
-                    'status': 'cancelled',
-                    'rejection_reason': reason,  # reuse this field for notes
-                    'cancelled_at': now.isoformat(),
-                    'cancelled_by': 'system'
-                })
-
-                # Audit trail
-                req_ref.collection('status_history').add({
-                    'from': 'payment_pending',
-                    'to': 'cancelled',
-                    'actor': 'system',
-                    'reason': reason,
-                    'timestamp': now.isoformat()
-                })
-
-                # Notify Requester
-                venue_doc = db.collection('venues').document(d.get('venue_id', '')).get()
-                venue_name = venue_doc.to_dict().get('name', 'Venue') if venue_doc.exists else 'Venue'
+        batch.commit()
+        cancelled, failures = list(snaps), []
+    except Exception:
+        cancelled, failures = [], []
+        for snap in snaps:
+            single = db.batch()
+            stage(single, snap)
+            try:
+                single.commit()
+                cancelled.append(snap)
+            except Exception as e:
+                failures.append({'id': snap.id, 'error': str(e)})
+
+    # One batched write for every notification this chunk sends
+    with notification_writer.batch():
+        for snap in cancelled:
+            d = snap.to_dict()
+            venue = venues.get(d.get('venue_id'))
+            venue_name = venue.get('name', 'Venue') if venue else 'Venue'
 
+            # Notify Requester
+            create_notification(
+                recipient_id=d.get('requester_id'),
+                title='Booking Cancelled - Payment Timeout',
+                message=f'Your booking for "{venue_name}" was cancelled because payment was not completed within {PAYMENT_WINDOW_HOURS} hours.',
+                type='booking_timeout',
+                related_event_id=None
+            )
+
+            # Notify Owner
+            if venue:
                 create_notification(
-                    recipient_id=d.get('requester_id'),
+                    recipient_id=venue.get('owner_id'),
                     title='Booking Cancelled - Payment Timeout',
-                    message=f'Your booking for "{venue_name}" was cancelled because payment was not completed within 24 hours.',
+                    message=f'The booking by {d.get("requester_email")} for "{venue_name}" was cancelled due to payment timeout.',
                     type='booking_timeout',
                     related_event_id=None
                 )
-                
-                # Notify Owner
-                if venue_doc.exists:
-                     create_notification(
-                        recipient_id=venue_doc.to_dict().get('owner_id'),
-                        title='Booking Cancelled - Payment Timeout',
-                        message=f'The booking by {d.get("requester_email")} for "{venue_name}" was cancelled due to payment timeout.',
-                        type='booking_timeout',
-                        related_event_id=None
-                    )
-
-                cancelled_count += 1
-
-        if cancelled_count > 0:
-            print(f"[Scheduler] Auto-cancelled {cancelled_count} unpaid venue bookings.")
+
+    return len(cancelled), failures
+
+
+def cancel_unpaid_bookings():
+    """
+    Background job that runs every hour.
+    Finds 'payment_pending' bookings whose payment_deadline has passed (one
+    indexed range query, so the cost follows the number of expired bookings),
+    cancels them in parallel batches and notifies requester and owner.
+    Returns a run report.
+    """
+    started = time.monotonic()
+    report = {'job': 'cancel_unpaid_bookings', 'scanned': 0, 'cancelled': 0, 'failed': 0, 'failures': []}
+    try:
+        db = firestore.client()
+        now = datetime.datetime.utcnow()
+
+        query = db.collection('venue_requests')\
+            .where(filter=FieldFilter('status', '==', 'payment_pending'))\
+            .where(filter=FieldFilter('payment_deadline', '<', now.isoformat()))\
+            .order_by('payment_deadline')\
+            .limit(SWEEP_PAGE_SIZE)
+
+        venues = {}  # venue lookups shared by the whole sweep
+        last = None
+        with ThreadPoolExecutor(max_workers=SWEEP_WORKERS) as pool:
+            while True:
+                page = list((query.start_after(last) if last else query).stream())
+                if not page:
+                    break
+                report['scanned'] += len(page)
+                _load_venues(db, [snap.to_dict().get('venue_id') for snap in page], venues)
+
+                futures = [
+                    pool.submit(_cancel_chunk, db, page[i:i + SWEEP_CHUNK_SIZE], venues, now)
+                    for i in range(0, len(page), SWEEP_CHUNK_SIZE)
+                ]
+                for future in futures:
+                    try:
+                        cancelled, failures = future.result()
+                    except Exception as e:
+                        cancelled, failures = 0, [{'id': None, 'error': str(e)}]
+                    report['cancelled'] += cancelled
+                    report['failures'].extend(failures)
+
+                if len(page) < SWEEP_PAGE_SIZE:
+                    break
+                last = page[-1]
 
     except Exception as e:
         print(f"[Scheduler Error] cancel_unpaid_bookings: {e}")
+        report['failures'].append({'id': None, 'error': str(e)})
+
+    report['failed'] = len(report['failures'])
+    del report['failures'][MAX_REPORTED_FAILURES:]
+    report['duration_ms'] = round((time.monotonic() - started) * 1000, 1)
+    if report['scanned'] or report['failed']:
+        print(f"[Scheduler] Auto-cancelled {report['cancelled']} unpaid venue bookings "
+              f"({report['failed']} failed) in {report['duration_ms']}ms.")
+    return report
 
 
 def init_scheduler(app):
-    """Integrates APScheduler with Flask app"""
+    """
+    Integrates APScheduler with Flask app.
+    Every worker runs the timers; only the elected leader runs the jobs
+    (see services/distributed_scheduler.py).
+    """
     # Run every hour
-    scheduler.add_job(id='cancel_unpaid_bookings_job', func=cancel_unpaid_bookings, trigger='interval', hours=1)
-    
+    distributed_scheduler.add_job('cancel_unpaid_bookings', cancel_unpaid_bookings, interval_seconds=3600)
+    # Pick up background jobs left behind by restarted workers
+    distributed_scheduler.add_job('recover_jobs', recover_jobs, interval_seconds=60)
+    # Reminders for events starting in the next bucket (services/reminders.py)
+    distributed_scheduler.add_job('event_reminders', send_event_reminders, interval_seconds=3600)
+    # Deliver closed notification digest windows (services/digest.py)
+    distributed_scheduler.add_job('flush_digests', flush_digests, interval_seconds=60)
+    # Copy sharded attendee/ticket counts onto event docs (services/sharded_counters.py)
+    distributed_scheduler.add_job('reconcile_counters', reconcile_counters, interval_seconds=60)
+    distributed_scheduler.init_app(scheduler)
+
     scheduler.init_app(app)
     scheduler.start()
     print("[Scheduler] Started background jobs.")
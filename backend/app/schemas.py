@@ -246,3 +246,20 @@ class PaymentVerify(BaseModel):
 class RefundRequest(BaseModel):
     payment_id: str = Field(..., min_length=1)
     reason: str = Field(default='', max_length=500)
+
+
+# ---------------------------------------------------------------------------
+# Ticket schemas
+# ---------------------------------------------------------------------------
+
+class TicketScan(BaseModel):
+    token: str = Field(..., min_length=1, max_length=512)
+    event_id: str = Field(..., min_length=1)
+
+class CheckinScan(BaseModel):
+    ticket_id: str = Field(..., min_length=1, max_length=100)
+    scanned_at: Optional[int] = Field(default=None, ge=0)  # device clock, epoch seconds
+
+class CheckinSync(BaseModel):
+    device_id: Optional[str] = Field(default=None, max_length=100)
+    checkins: List[CheckinScan] = Field(..., min_length=1, max_length=250)
@@ -0,0 +1,204 @@
+"""
+Cached Firebase ID-token verification.
+
+`login_required` runs on every authenticated request and most of that traffic
+(ticket list, notification polling) re-sends the same token until it expires.
+This module keeps:
+
+  * an LRU of decoded claims keyed by the SHA-256 of the token, each entry
+    expiring at the token's own `exp`, and
+  * Google's securetoken signing certs in memory, refreshed by a background
+    thread before their Cache-Control max-age runs out,
+
+so a verification is either a dict lookup or an offline signature check.
+Anything unusual (emulator, unknown key id, missing project id) falls back to
+`firebase_admin.auth.verify_id_token`, which stays the source of truth.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from firebase_admin import auth
+
+CERT_URL = ('https://www.googleapis.com/robot/v1/metadata/x509/'
+            'securetoken@system.gserviceaccount.com')
+ISSUER_PREFIX = 'https://securetoken.google.com/'
+
+TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+CLOCK_SKEW_SECONDS = 5
+
+
+class PublicCertCache:
+    """Holds the securetoken x509 certs and refreshes them in the background."""
+
+    def __init__(self, url=CERT_URL):
+        self.url = url
+        self._certs = {}
+        self._expires_at = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def refresh(self):
+        resp = requests.get(self.url, timeout=10)
+        resp.raise_for_status()
+
+        max_age = 3600
+        match = re.search(r'max-age=(\d+)', resp.headers.get('Cache-Control', ''))
+        if match:
+            max_age = int(match.group(1))
+
+        with self._lock:
+            self._certs = resp.json()
+            self._expires_at = time.time() + max_age
+        return max_age
+
+    def get(self):
+        """
+        Returns the current certs. Fetches synchronously on a cold start, or
+        if they expired because the background refresher is not keeping up.
+        """
+        if not self._certs:
+            self.refresh()
+        elif time.time() >= self._expires_at:
+            try:
+                self.refresh()
+            except Exception as e:
+                # Unknown key ids still fall back to the SDK
+                print(f"[Auth] Cert refresh failed: {e}")
+        return self._certs
+
+    def start(self):
+        """Starts the daemon refresher. Safe to call more than once."""
+        if self._thread and self._thread.is_alive():
+            return
+
+        def _loop():
+            while True:
+                try:
+                    max_age = self.refresh()
+                    # Refresh well before Google rotates the keys out of the response
+                    delay = max(60, max_age - 300)
+                except Exception as e:
+                    print(f"[Auth] Cert refresh failed: {e}")
+                    delay = 60
+                time.sleep(delay)
+
+        self._thread = threading.Thread(target=_loop, name='auth-cert-refresh', daemon=True)
+        self._thread.start()
+
+
+class TokenCache:
+    """Bounded LRU of decoded claims; entries die at the token's `exp`."""
+
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, exp = entry
+            if exp - CLOCK_SKEW_SECONDS <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def put(self, key, claims):
+        exp = claims.get('exp')
+        if not exp:
+            return
+        with self._lock:
+            self._entries[key] = (claims, exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TokenVerifier:
+    def __init__(self):
+        self.certs = PublicCertCache()
+        self.cache = TokenCache()
+
+    def start(self):
+        self.certs.start()
+
+    def _project_id(self):
+        import firebase_admin
+        try:
+            return firebase_admin.get_app().project_id
+        except Exception:
+            return None
+
+    def _verify_offline(self, token):
+        """
+        Mirrors the checks firebase_admin performs for ID tokens, but against
+        the in-memory certs. Returns None when we can't decide offline.
+        """
+        from google.auth import jwt
+
+        project_id = self._project_id()
+        if not project_id or os.getenv('FIREBASE_AUTH_EMULATOR_HOST'):
+            return None
+
+        header = jwt.decode_header(token)
+        certs = self.certs.get()
+        if header.get('kid') not in certs:
+            # Key rotated since our last refresh — let the SDK handle it
+            return None
+
+        claims = jwt.decode(token, certs=certs, audience=project_id,
+                            clock_skew_in_seconds=CLOCK_SKEW_SECONDS)
+        if claims.get('iss') != ISSUER_PREFIX + project_id:
+            raise ValueError('ID token has incorrect "iss" claim')
+        sub = claims.get('sub')
+        if not sub or not isinstance(sub, str) or len(sub) > 128:
+            raise ValueError('ID token has invalid "sub" claim')
+        claims['uid'] = sub
+        return claims
+
+    def verify(self, token):
+        key = self.cache.key(token)
+        claims = self.cache.get(key)
+        if claims is not None:
+            return dict(claims)
+
+        try:
+            claims = self._verify_offline(token)
+        except Exception:
+            claims = None
+        if claims is None:
+            # Authoritative path; raises on invalid/expired tokens
+            claims = auth.verify_id_token(token)
+
+        self.cache.put(key, claims)
+        return dict(claims)
+
+
+token_verifier = TokenVerifier()
+
+
+def verify_id_token(token):
+    """Drop-in replacement for auth.verify_id_token backed by the caches above."""
+    return token_verifier.verify(token)
@@ -0,0 +1,154 @@
+"""
+Chunked, resumable bulk updates.
+
+Used for "flip every matching document" operations (mark_all_read, status
+cascades) that can touch more than the 500 writes a single WriteBatch allows.
+The query is read in document-id order, one chunk at a time; each chunk is
+committed as its own WriteBatch on a shared, bounded thread pool while the
+next chunk is being read.
+
+When a call runs past its time budget it stops reading, waits for the chunks
+already in flight and returns a progress token. Passing that token back
+resumes after the last chunk that committed. Updates must be idempotent
+(re-applying a chunk after a failure is safe); ideally the query filters out
+documents already updated, like `read == False` does for mark_all_read.
+"""
+
+import os
+import json
+import time
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+BATCH_SIZE = 500  # Firestore WriteBatch limit
+BULK_WORKERS = int(os.getenv('BULK_WORKERS', 4))
+# How long a request-time call may run before handing back a progress token
+REQUEST_BUDGET_SECONDS = float(os.getenv('BULK_REQUEST_BUDGET', 5))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class BulkResult:
+    def __init__(self, updated, done, token=None, error=None):
+        self.updated = updated
+        self.done = done
+        self.token = token
+        self.error = error
+
+    def to_dict(self):
+        return {'updated': self.updated, 'done': self.done, 'token': self.token}
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=BULK_WORKERS, thread_name_prefix='bulk')
+        return _executor
+
+
+def encode_token(op, cursor, updated):
+    raw = json.dumps({'op': op, 'c': cursor, 'n': updated}).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_token(op, token):
+    """Returns (cursor, updated_so_far). Raises ValueError for a bad token."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except Exception:
+        raise ValueError('Malformed progress token')
+    if data.get('op') != op:
+        raise ValueError('Progress token belongs to a different operation')
+    return data.get('c'), int(data.get('n', 0))
+
+
+def _commit_chunk(db, snaps, updates, on_chunk):
+    batch = db.batch()
+    for snap in snaps:
+        batch.update(snap.reference, updates(snap) if callable(updates) else updates)
+    after_commit = on_chunk(batch, snaps) if on_chunk else None
+    batch.commit()
+    if callable(after_commit):
+        after_commit()
+    return len(snaps)
+
+
+def bulk_update(query, updates, op, token=None, budget=REQUEST_BUDGET_SECONDS,
+                chunk_size=BATCH_SIZE, on_chunk=None, fields=None, db=None):
+    """
+    Applies `updates` (a dict, or fn(snapshot) -> dict) to every document
+    the query matches.
+
+    op          names the operation; tokens are only accepted for the same op
+    token       progress token from a previous, unfinished call
+    budget      seconds before returning early with a token (None = run to the end)
+    chunk_size  documents per batch; lower it by the number of extra writes
+                on_chunk(batch, snapshots) adds to each batch
+    on_chunk    may return a function, which runs once the batch has committed
+                (for side effects such as emails that must follow the write)
+    fields      fields to read; by default only document names are read when
+                `updates` is a dict
+
+    Returns a BulkResult.
+    """
+    db = db or firestore.client()
+    cursor, updated = decode_token(op, token) if token else (None, 0)
+
+    if fields is not None:
+        query = query.select(fields)
+    elif not callable(updates):
+        query = query.select([FieldPath.document_id()])
+    query = query.order_by(FieldPath.document_id()).limit(chunk_size)
+
+    deadline = time.monotonic() + budget if budget else None
+    pages = []      # (last_id, future) in read order
+    in_flight = set()
+    exhausted = False
+    error = None
+    read_cursor = cursor
+
+    while True:
+        page_query = query.start_after({FieldPath.document_id(): read_cursor}) if read_cursor else query
+        try:
+            snaps = list(page_query.stream())
+        except Exception as e:
+            error = e
+            print(f"[Bulk] {op}: read failed after {read_cursor}: {e}")
+            break
+        if not snaps:
+            exhausted = True
+            break
+        read_cursor = snaps[-1].id
+        future = _pool().submit(_commit_chunk, db, snaps, updates, on_chunk)
+        pages.append((read_cursor, future))
+        in_flight.add(future)
+
+        if len(in_flight) >= BULK_WORKERS:
+            _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+        if len(snaps) < chunk_size:
+            exhausted = True
+            break
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+
+    wait(in_flight)
+
+    # Progress only advances over the prefix of chunks that all committed
+    for last_id, future in pages:
+        try:
+            updated += future.result()
+        except Exception as e:
+            error = error or e
+            print(f"[Bulk] {op}: chunk ending at {last_id} failed: {e}")
+            break
+        cursor = last_id
+
+    done = exhausted and error is None
+    if done:
+        return BulkResult(updated, True)
+    return BulkResult(updated, False, encode_token(op, cursor, updated), error)
@@ -0,0 +1,224 @@
+"""
+Cascading deletes.
+
+Deleting a Firestore document leaves its subcollections behind, and nothing
+else points at them: comments and bookings of deleted events, and the
+status_history of venue requests, stayed around forever, along with the
+index entries that referred to them. TreeDeleter walks everything under a
+document and deletes it in 500-op WriteBatches committed on a bounded
+thread pool, reporting the running count as batches complete.
+
+The trees:
+
+  event   events/{id} and all its subcollections, the membership index
+          entries of its bookings, counter_dirty and reminder markers
+  venue   venues/{id} plus its rejected and cancelled venue_requests (and
+          their status_history); delete_venue refuses while requests are open
+
+Deletes are idempotent, so a job that fails part-way is simply run again.
+Anything already orphaned is found by scripts/sweep_orphans.py.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from firebase_admin import firestore
+from google.cloud.firestore import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+from app.services.jobs import job_handler, enqueue, get_job
+
+BATCH_SIZE = 500  # Firestore WriteBatch limit
+PAGE_SIZE = 500
+DELETE_WORKERS = int(os.getenv('DELETE_WORKERS', 4))
+# Venue requests that can go with their venue; anything else blocks the delete
+# (open) or is kept for the requester's payment history (completed)
+DELETABLE_REQUEST_STATUSES = ('rejected', 'cancelled')
+OPEN_REQUEST_STATUSES = ('pending', 'approved', 'payment_pending', 'confirmed')
+# Subcollections known to have no subcollections of their own; others are listed
+LEAF_COLLECTIONS = {'comments', 'bookings', 'counter_shards', 'status_history', 'joined_events'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DELETE_WORKERS, thread_name_prefix='delete')
+        return _executor
+
+
+def pages(query, page_size=PAGE_SIZE):
+    """Pages of snapshots (document names only), in document-id order."""
+    query = query.select([FieldPath.document_id()]).order_by(FieldPath.document_id()).limit(page_size)
+    last = None
+    while True:
+        # Cursor on the snapshot itself, so collection-group queries page too
+        page_query = query.start_after(last) if last else query
+        page = list(page_query.stream())
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+
+class TreeDeleter:
+    """
+    Queues document deletes and commits them in full batches, at most
+    DELETE_WORKERS batches at a time. Call finish() to flush and wait.
+
+    related maps a subcollection name to fn(db, snapshot) -> refs that must
+    go with each of its documents (e.g. index entries stored elsewhere).
+    """
+
+    def __init__(self, db=None, on_progress=None, related=None):
+        self.db = db or firestore.client()
+        self.on_progress = on_progress
+        self.related = related or {}
+        self.deleted = 0
+        self._pending = []
+        self._in_flight = set()
+
+    def delete(self, ref):
+        self._pending.append(ref)
+        if len(self._pending) == BATCH_SIZE:
+            self._flush()
+
+    def delete_tree(self, ref, leaf=False):
+        """Queues every document under `ref`, then `ref` itself."""
+        if not leaf:
+            for collection in ref.collections():
+                self.delete_collection(collection)
+        self.delete(ref)
+
+    def delete_collection(self, collection):
+        related = self.related.get(collection.id)
+        leaf = collection.id in LEAF_COLLECTIONS
+        for page in pages(collection):
+            for snap in page:
+                if related:
+                    for ref in related(self.db, snap):
+                        self.delete(ref)
+                self.delete_tree(snap.reference, leaf=leaf)
+
+    def _commit(self, refs):
+        batch = self.db.batch()
+        for ref in refs:
+            batch.delete(ref)
+        batch.commit()
+        return len(refs)
+
+    def _flush(self):
+        refs, self._pending = self._pending, []
+        if refs:
+            self._in_flight.add(_pool().submit(self._commit, refs))
+        if len(self._in_flight) >= DELETE_WORKERS:
+            done, self._in_flight = wait(self._in_flight, return_when=FIRST_COMPLETED)
+            self._collect(done)
+
+    def _collect(self, done):
+        for future in done:
+            # A failed batch fails the whole run; deletes are safe to repeat
+            self.deleted += future.result()
+        if done and self.on_progress:
+            self.on_progress(self.deleted)
+
+    def finish(self):
+        self._flush()
+        done, _ = wait(self._in_flight)
+        self._in_flight = set()
+        self._collect(done)
+        return self.deleted
+
+
+def _booking_index_entries(db, snap):
+    from app.services.memberships import membership_ref
+    return [membership_ref(db, snap.id, snap.reference.parent.parent.id)]
+
+
+def delete_event_tree(event_id, db=None, on_progress=None):
+    """Deletes the event, its subcollections and its index entries. Returns the count."""
+    from app.services.sharded_counters import MAX_SHARDS
+
+    db = db or firestore.client()
+    deleter = TreeDeleter(db, on_progress, related={'bookings': _booking_index_entries})
+    event_ref = db.collection('events').document(event_id)
+    deleter.delete_tree(event_ref)
+
+    for i in range(MAX_SHARDS):
+        deleter.delete(db.collection('counter_dirty').document(f"{event_id}_{i}"))
+    markers = db.collection('reminder_markers').where(filter=FieldFilter('event_id', '==', event_id))
+    for page in pages(markers):
+        for snap in page:
+            deleter.delete(snap.reference)
+    return deleter.finish()
+
+
+def open_venue_requests(venue_id, db=None, limit=None):
+    """Booking requests of the venue that are still in progress (or paid for)."""
+    db = db or firestore.client()
+    query = db.collection('venue_requests')\
+        .where(filter=FieldFilter('venue_id', '==', venue_id))\
+        .where(filter=FieldFilter('status', 'in', list(OPEN_REQUEST_STATUSES)))
+    if limit:
+        query = query.limit(limit)
+    return [snap.id for snap in query.select([FieldPath.document_id()]).stream()]
+
+
+def delete_venue_tree(venue_id, db=None, on_progress=None):
+    """
+    Deletes the venue and its rejected / cancelled booking requests (with their
+    history). Returns the count. Open and completed requests are kept: they
+    belong to other users and may carry payment records.
+    """
+    db = db or firestore.client()
+    deleter = TreeDeleter(db, on_progress)
+    requests = db.collection('venue_requests')\
+        .where(filter=FieldFilter('venue_id', '==', venue_id))\
+        .where(filter=FieldFilter('status', 'in', list(DELETABLE_REQUEST_STATUSES)))
+    for page in pages(requests):
+        for snap in page:
+            deleter.delete_tree(snap.reference)
+    deleter.delete_tree(db.collection('venues').document(venue_id))
+    return deleter.finish()
+
+
+TREES = {
+    'event': delete_event_tree,
+    'venue': delete_venue_tree,
+}
+
+
+def job_id_for(kind, doc_id):
+    return f"cascade_{kind}_{doc_id}"
+
+
+def queue_cascade_delete(kind, doc_id, requested_by=None):
+    return enqueue('cascade_delete', {
+        'kind': kind,
+        'doc_id': doc_id,
+        'requested_by': requested_by,
+    }, job_id=job_id_for(kind, doc_id))
+
+
+def deletion_status(kind, doc_id):
+    job = get_job(job_id_for(kind, doc_id))
+    if job is None:
+        return None
+    return {
+        'jobId': job['id'],
+        'status': job.get('status'),
+        'progress': job.get('progress', {}),
+        'error': job.get('error'),
+        'requestedBy': (job.get('payload') or {}).get('requested_by'),
+    }
+
+
+@job_handler('cascade_delete')
+def run_cascade_delete(ctx):
+    p = ctx.payload
+    deleted = TREES[p['kind']](p['doc_id'], on_progress=lambda n: ctx.report(deleted=n))
+    return {'deleted': deleted}
@@ -0,0 +1,186 @@
+"""
+Offline check-in for door staff.
+
+Checking in one POST per attendee ties door throughput to network latency.
+Scanners can instead download a manifest of the event's tickets, validate
+scans locally, and upload check-ins in batches.
+
+Manifest (GET /api/tickets/events/<id>/manifest[?since=<version>]) is
+streamed as NDJSON:
+
+  {"event_id": ..., "version": 1760000000, "since": null, "columns": [...]}
+  ["tkt_...", "a", ["<token hash>", ...]]     one row per ticket
+  ...
+  {"end": true, "count": 1234}
+
+Status is a (active), u (used) or r (refunded). The hashes are
+ticket_tokens.token_hash of the ticket's QR token under every verifying key,
+so a scanner matches a code without holding the signing keys. A full manifest
+lists tickets that are not refunded. With ?since=<version from an earlier
+manifest> only the changes are sent: tickets issued since then, then status
+rows ([id, status], no hashes) from the check-in markers. Rows are applied in
+order, and the last line is only written when the stream is complete.
+Versions are server seconds, and deltas reread DELTA_OVERLAP seconds before
+`since` so a write that committed late is not missed (rows are idempotent).
+
+Sync (POST /api/tickets/events/<id>/sync) applies up to SYNC_MAX scans in one
+transaction. The tickets and their markers are read with get_all, and a
+marker plus a ticket update are written per check-in. Every scan that cannot
+apply is reported as a conflict with its reason. For a double scan, the
+report also says when, by whom and on which device the ticket was first
+checked in.
+"""
+
+import json
+import time
+from firebase_admin import firestore
+from google.cloud.firestore import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+from app.services import ticket_tokens
+from app.services.checkins import marker_ref, USED, REFUNDED
+
+PAGE_SIZE = 500
+# Two writes per check-in; a transaction holds at most 500
+SYNC_MAX = 250
+DELTA_OVERLAP = 10
+
+STATUS_CODES = {'active': 'a', USED: 'u', REFUNDED: 'r'}
+COLUMNS = ['ticket', 'status', 'hashes']
+TICKET_FIELDS = ['event_id', 'user_id', 'created_at', 'status']
+
+REQUIRED_INDEXES = [
+    {'collectionGroup': 'tickets', 'queryScope': 'COLLECTION', 'fields': [
+        {'fieldPath': 'event_id', 'order': 'ASCENDING'},
+        {'fieldPath': 'created_at', 'order': 'ASCENDING'},
+    ]},
+    {'collectionGroup': 'ticket_checkins', 'queryScope': 'COLLECTION', 'fields': [
+        {'fieldPath': 'event_id', 'order': 'ASCENDING'},
+        {'fieldPath': 'at', 'order': 'ASCENDING'},
+    ]},
+]
+
+
+def _paged(query, order=()):
+    """Streams every match in pages, ordered by `order` then document id."""
+    for field in order:
+        query = query.order_by(field)
+    query = query.order_by(FieldPath.document_id()).limit(PAGE_SIZE)
+    last = None
+    while True:
+        page = list((query.start_after(last) if last else query).stream())
+        yield from page
+        if len(page) < PAGE_SIZE:
+            return
+        last = page[-1]
+
+
+def _ticket_row(snap):
+    t = snap.to_dict()
+    return [snap.id, STATUS_CODES.get(t.get('status'), t.get('status')), ticket_tokens.hashes_for(snap.id, t)]
+
+
+def manifest_lines(event_id, since=None):
+    """NDJSON lines of the event's manifest, full or (with `since`) a delta."""
+    db = firestore.client()
+    version = int(time.time())
+    yield json.dumps({'event_id': event_id, 'version': version, 'since': since, 'columns': COLUMNS}) + '\n'
+
+    tickets = db.collection('tickets').where(filter=FieldFilter('event_id', '==', event_id))
+    count = 0
+    if since is None:
+        for snap in _paged(tickets.select(TICKET_FIELDS)):
+            if snap.to_dict().get('status') == REFUNDED:
+                continue
+            yield json.dumps(_ticket_row(snap)) + '\n'
+            count += 1
+    else:
+        after = since - DELTA_OVERLAP
+        issued = tickets.where(filter=FieldFilter('created_at', '>=', after)).select(TICKET_FIELDS)
+        for snap in _paged(issued, order=('created_at',)):
+            yield json.dumps(_ticket_row(snap)) + '\n'
+            count += 1
+        changed = db.collection('ticket_checkins')\
+            .where(filter=FieldFilter('event_id', '==', event_id))\
+            .where(filter=FieldFilter('at', '>=', after))\
+            .select(['state', 'at'])
+        for snap in _paged(changed, order=('at',)):
+            state = snap.to_dict().get('state')
+            yield json.dumps([snap.id, STATUS_CODES.get(state, state)]) + '\n'
+            count += 1
+
+    yield json.dumps({'end': True, 'count': count}) + '\n'
+
+
+def _conflict(ticket_id, reason, **details):
+    return {'ticket_id': ticket_id, 'reason': reason, **details}
+
+
+def sync_checkins(event_id, scans, by, device=None):
+    """
+    Applies a batch of offline scans ({ticket_id, scanned_at}) atomically.
+    Returns (applied ticket ids, conflicts).
+    """
+    db = firestore.client()
+    conflicts = []
+    todo = {}
+    for scan in scans:
+        if scan['ticket_id'] in todo:
+            conflicts.append(_conflict(scan['ticket_id'], 'duplicate'))
+        else:
+            todo[scan['ticket_id']] = scan
+    ticket_refs = [db.collection('tickets').document(tid) for tid in todo]
+    marker_refs = [marker_ref(db, tid) for tid in todo]
+
+    @firestore.transactional
+    def _txn(transaction):
+        tickets = {snap.id: snap for snap in transaction.get_all(ticket_refs)}
+        markers = {snap.id: snap for snap in transaction.get_all(marker_refs)}
+        now = int(time.time())
+        applied, rejected = [], []
+
+        for tid, scan in todo.items():
+            ticket = tickets.get(tid)
+            if ticket is None or not ticket.exists:
+                rejected.append(_conflict(tid, 'not_found'))
+                continue
+            t = ticket.to_dict()
+            if t.get('event_id') != event_id:
+                rejected.append(_conflict(tid, 'wrong_event'))
+                continue
+            marker = markers.get(tid)
+            if marker is not None and marker.exists:
+                m = marker.to_dict()
+                if m.get('state') == REFUNDED:
+                    rejected.append(_conflict(tid, 'refunded'))
+                else:
+                    rejected.append(_conflict(tid, 'already_checked_in', checked_in_at=m.get('scanned_at') or m.get('at'),
+                                              checked_in_by=m.get('by'), device=m.get('device')))
+                continue
+            status = t.get('status')
+            if status != 'active':
+                # Tickets changed before markers existed
+                reason = {USED: 'already_checked_in', REFUNDED: 'refunded'}.get(status, 'inactive')
+                rejected.append(_conflict(tid, reason, checked_in_at=t.get('checked_in_at')))
+                continue
+
+            # When the attendee actually came in, unless the device clock is ahead
+            scanned_at = min(int(scan.get('scanned_at') or now), now)
+            transaction.set(marker_ref(db, tid), {
+                'state': USED,
+                'event_id': event_id,
+                'user_id': t.get('user_id'),
+                'at': now,
+                'scanned_at': scanned_at,
+                'by': by,
+                'device': device,
+            })
+            transaction.update(ticket.reference, {
+                'status': USED,
+                'checked_in_at': scanned_at,
+                'checked_in_by': by,
+            })
+            applied.append(tid)
+        return applied, rejected
+
+    applied, rejected = _txn(db.transaction())
+    return applied, conflicts + rejected
@@ -0,0 +1,112 @@
+"""
+Ticket check-in state.
+
+Whether a ticket may still enter is kept in a marker document,
+
+  ticket_checkins/{ticket_id}   {state: used | refunded, event_id, user_id, at, by}
+
+which exists only once the ticket can no longer be used. A scan of a signed
+token (services/ticket_tokens.py) is verified without reads; checking in is
+then one transaction that reads the ticket and its marker (a single get_all)
+and, only if the ticket is still active, writes the used marker and the
+ticket's status. Two doors scanning the same ticket cannot both admit it, and
+a refunded ticket is never flipped to used.
+
+Refunds write a `refunded` marker next to the ticket update. Tickets that
+left `active` before markers existed are backfilled by
+scripts/backfill_checkin_markers.py. The event's host and status are cached
+per process (CHECKIN_EVENT_CACHE_TTL).
+"""
+
+import os
+import time
+from firebase_admin import firestore
+from app.services.cache import TTLCache
+
+USED = 'used'
+REFUNDED = 'refunded'
+
+_events = TTLCache(
+    maxsize=int(os.getenv('CHECKIN_EVENT_CACHE_SIZE', 1000)),
+    ttl=int(os.getenv('CHECKIN_EVENT_CACHE_TTL', 60)),
+)
+
+
+def marker_ref(db, ticket_id):
+    return db.collection('ticket_checkins').document(ticket_id)
+
+
+def record_refund(db, writer, ticket_id, event_id=None, user_id=None):
+    """Marks the ticket as unusable; `writer` is a batch or transaction."""
+    writer.set(marker_ref(db, ticket_id), {
+        'state': REFUNDED,
+        'event_id': event_id,
+        'user_id': user_id,
+        'at': int(time.time()),
+    })
+
+
+def record_checkin(db, writer, ticket_id, event_id, user_id, by):
+    """Writes the used marker unconditionally (for callers that already checked the ticket)."""
+    writer.set(marker_ref(db, ticket_id), {
+        'state': USED,
+        'event_id': event_id,
+        'user_id': user_id,
+        'at': int(time.time()),
+        'by': by,
+    })
+
+
+def event_gate(event_id):
+    """(hostId, status) of the event, or None if it does not exist. Cached."""
+    gate = _events.get(event_id)
+    if gate is None:
+        snap = firestore.client().collection('events').document(event_id)\
+            .get(field_paths=['hostId', 'status'])
+        if not snap.exists:
+            return None
+        data = snap.to_dict()
+        gate = (data.get('hostId'), data.get('status'))
+        _events.set(event_id, gate)
+    return gate
+
+
+def check_in(claims, by):
+    """
+    Checks in the ticket behind verified TicketClaims. Returns None on success,
+    or the state that prevented it: 'used', 'refunded', 'missing', or the
+    ticket's status if it is otherwise not active.
+    """
+    db = firestore.client()
+    ticket_ref = db.collection('tickets').document(claims.ticket_id)
+    marker = marker_ref(db, claims.ticket_id)
+
+    @firestore.transactional
+    def _txn(transaction):
+        snaps = {snap.reference.path: snap for snap in transaction.get_all([ticket_ref, marker])}
+        ticket, existing = snaps[ticket_ref.path], snaps[marker.path]
+        if not ticket.exists:
+            # The ticket document is gone (e.g. its event was deleted)
+            return 'missing'
+        if existing.exists:
+            return existing.to_dict().get('state', USED)
+        status = ticket.to_dict().get('status')
+        if status != 'active':
+            return status
+
+        now = int(time.time())
+        transaction.set(marker, {
+            'state': USED,
+            'event_id': claims.event_id,
+            'user_id': claims.holder,
+            'at': now,
+            'by': by,
+        })
+        transaction.update(ticket_ref, {
+            'status': USED,
+            'checked_in_at': now,
+            'checked_in_by': by,
+        })
+        return None
+
+    return _txn(db.transaction())
@@ -0,0 +1,315 @@
+"""
+Coalescing stage for high-volume notification types.
+
+A busy host used to get one notification per join, leave and comment. For
+the types in DIGEST_WINDOWS the item is instead folded into a digest
+document for (recipient, type[, event], time window): a blind merge write
+that adds the item's id to `items` (the count is its length, so restaging
+an item is a no-op) and remembers who acted. Fan-outs pass deterministic
+item ids, and those also leave a digest_items/{id} marker, so a retried
+job does not stage an item again after its digest was flushed; markers are
+pruned after MARKER_RETENTION_SECONDS. The scheduler flushes closed
+windows every minute into a single notification ("Asha, Ravi and 10 others
+joined Sunday Yoga") and, for types listed in DIGEST_EMAIL_TYPES, a single
+email. A digest is only deleted if it is unchanged since it was read; items
+that landed in between are delivered by the next pass.
+
+Windows are per type, in seconds, and can be overridden with
+DIGEST_WINDOWS="event_joined=600,new_comment=300"; a window of 0 turns
+coalescing off for that type.
+"""
+
+import os
+import time
+import uuid
+import hashlib
+from firebase_admin import firestore
+from google.cloud.firestore import FieldFilter
+from google.api_core.exceptions import FailedPrecondition
+
+DEFAULT_WINDOWS = {
+    'event_joined': 900,
+    'event_left': 900,
+    'new_comment': 600,
+    'wishlist_alert': 3600,
+}
+# Types digested per event; the rest are digested per recipient only
+PER_EVENT_TYPES = {'event_joined', 'event_left', 'new_comment'}
+# (title, message) for a digest of more than one item
+DIGEST_TEXT = {
+    'event_joined': ('New Attendees', '{actors} joined {event_title}'),
+    'event_left': ('Attendees Left', '{actors} left {event_title}'),
+    'new_comment': ('New Comments', '{actors} commented on {event_title}'),
+    'wishlist_alert': ('Wishlist Update', '{count} new events from hosts and venues on your wishlist'),
+}
+# Closed windows are flushed this long after closing, so late writes land first
+FLUSH_GRACE_SECONDS = 30
+FLUSH_PAGE_SIZE = 250
+BATCH_SIZE = 500
+GET_ALL_CHUNK_SIZE = 100
+SHOWN_ACTORS = 2
+# Fan-out retries happen within minutes; markers only need to outlive them
+MARKER_RETENTION_SECONDS = 7 * 24 * 3600
+
+
+def _load_windows():
+    windows = dict(DEFAULT_WINDOWS)
+    for item in os.getenv('DIGEST_WINDOWS', '').split(','):
+        if '=' not in item:
+            continue
+        key, value = item.split('=', 1)
+        try:
+            windows[key.strip()] = int(value)
+        except ValueError:
+            print(f"WARNING: Ignoring bad DIGEST_WINDOWS entry '{item}'")
+    return windows
+
+
+WINDOWS = _load_windows()
+DIGEST_EMAIL_TYPES = {t.strip() for t in os.getenv('DIGEST_EMAIL_TYPES', '').split(',') if t.strip()}
+
+
+def _digest_id(recipient_id, type, related_event_id, window_index):
+    scope = related_event_id if type in PER_EVENT_TYPES and related_event_id else '-'
+    return f"{recipient_id}_{type}_{scope}_{window_index}"
+
+
+def marker_ref(db, item_id):
+    return db.collection('digest_items').document(item_id)
+
+
+def item_count(d):
+    return len(d.get('items') or [])
+
+
+def _stage(db, batch_or_none, recipient_id, title, message, type, related_event_id, actor, event_title, now,
+           item_id=None):
+    window = WINDOWS[type]
+    window_index = int(now // window)
+    digest_id = _digest_id(recipient_id, type, related_event_id, window_index)
+    ref = db.collection('notification_digests').document(digest_id)
+    data = {
+        'recipientId': recipient_id,
+        'type': type,
+        'relatedEventId': related_event_id if type in PER_EVENT_TYPES else None,
+        'eventTitle': event_title,
+        'items': firestore.ArrayUnion([item_id or uuid.uuid4().hex]),
+        # Kept for single-item digests, which are delivered as the original
+        'title': title,
+        'message': message,
+        'lastEventId': related_event_id,
+        'flush_at': (window_index + 1) * window,
+        'updated_at': int(now),
+    }
+    if actor:
+        data['actors'] = firestore.ArrayUnion([actor])
+    if batch_or_none is None:
+        ref.set(data, merge=True)
+    else:
+        batch_or_none.set(ref, data, merge=True)
+    return digest_id
+
+
+def _already_staged(db, item_ids):
+    ids = sorted(set(item_ids))
+    staged = set()
+    for i in range(0, len(ids), GET_ALL_CHUNK_SIZE):
+        refs = [marker_ref(db, item_id) for item_id in ids[i:i + GET_ALL_CHUNK_SIZE]]
+        for snap in db.get_all(refs, field_paths=['staged_at']):
+            if snap.exists:
+                staged.add(snap.id)
+    return staged
+
+
+def is_coalesced(type):
+    return WINDOWS.get(type, 0) > 0
+
+
+def coalesce(recipient_id, title, message, type, related_event_id=None, actor=None, event_title=None):
+    """
+    Drop-in for create_notification for high-volume types: folds the item into
+    the current digest window, or sends it right away if the type isn't coalesced.
+    """
+    from app.blueprints.notifications.routes import create_notification
+    if not recipient_id:
+        return
+    if not is_coalesced(type):
+        create_notification(recipient_id, title, message, type, related_event_id)
+        return
+    _stage(firestore.client(), None, recipient_id, title, message, type,
+           related_event_id, actor, event_title, time.time())
+
+
+def coalesce_many(items):
+    """
+    Batched coalesce for fan-outs. items: dicts with the coalesce() arguments.
+    Returns the number of items staged.
+    """
+    from app.services.notification_writer import notification_writer
+    from app.blueprints.notifications.routes import build_notification
+
+    db = firestore.client()
+    now = time.time()
+    direct = []
+    staged = 0
+    # Items a retried fan-out already staged (possibly already flushed)
+    done = _already_staged(db, [item['doc_id'] for item in items
+                                if item.get('doc_id') and is_coalesced(item['type'])])
+    batch, pending = db.batch(), 0
+    for item in items:
+        if not item.get('recipient_id'):
+            continue
+        if not is_coalesced(item['type']):
+            direct.append((item.get('doc_id'), build_notification(
+                item['recipient_id'], item['title'], item['message'], item['type'], item.get('related_event_id'))))
+            continue
+        item_id = item.get('doc_id')
+        if item_id in done:
+            continue
+        digest_id = _stage(db, batch, item['recipient_id'], item['title'], item['message'], item['type'],
+                           item.get('related_event_id'), item.get('actor'), item.get('event_title'), now,
+                           item_id=item_id)
+        staged += 1
+        pending += 1
+        if item_id:
+            batch.set(marker_ref(db, item_id), {'digest_id': digest_id, 'staged_at': int(now)})
+            pending += 1
+        if pending >= BATCH_SIZE - 1:
+            batch.commit()
+            batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+    notification_writer.write_many(direct)
+    return staged + len(direct)
+
+
+def _describe_actors(actors, count):
+    actors = list(actors or [])
+    if not actors:
+        return f"{count} people"
+    shown = actors[:SHOWN_ACTORS]
+    others = count - len(shown)
+    if others <= 0:
+        return ' and '.join(shown)
+    return f"{', '.join(shown)} and {others} other{'s' if others > 1 else ''}"
+
+
+def render_digest(d):
+    """(title, message) for a flushed digest document."""
+    count = item_count(d)
+    if count <= 1:
+        return d.get('title'), d.get('message')
+    title, template = DIGEST_TEXT.get(d.get('type'), ('Updates', '{count} new updates'))
+    message = template.format(
+        actors=_describe_actors(d.get('actors'), count),
+        event_title=d.get('eventTitle') or 'your event',
+        count=count,
+    )
+    return title, message
+
+
+def _items_key(d):
+    return hashlib.sha1('|'.join(sorted(d.get('items') or [])).encode('utf-8')).hexdigest()[:12]
+
+
+def _delete_flushed(db, docs):
+    """
+    Deletes flushed digests unless they changed after being read. Changed ones
+    keep only the items not yet delivered and are flushed again by the next
+    page. Returns how many changed.
+    """
+    batch = db.batch()
+    for doc in docs:
+        batch.delete(doc.reference, option=db.write_option(last_update_time=doc.update_time))
+    try:
+        batch.commit()
+        return 0
+    except FailedPrecondition:
+        pass
+
+    late = 0
+    for doc in docs:
+        try:
+            doc.reference.delete(option=db.write_option(last_update_time=doc.update_time))
+        except FailedPrecondition:
+            items = doc.to_dict().get('items')
+            if items:
+                doc.reference.update({'items': firestore.ArrayRemove(items)})
+            late += 1
+    return late
+
+
+def _prune_markers(db, now):
+    query = db.collection('digest_items')\
+        .where(filter=FieldFilter('staged_at', '<', int(now - MARKER_RETENTION_SECONDS)))\
+        .limit(BATCH_SIZE)
+    docs = list(query.stream())
+    if docs:
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+    return len(docs)
+
+
+def flush_digests(now=None):
+    """Scheduler job: turns every closed digest window into one notification."""
+    from app.services.notification_writer import notification_writer
+    from app.blueprints.notifications.routes import build_notification
+    from app.services.email_service import EmailService
+    from app.services.user_cache import get_user_profiles
+
+    db = firestore.client()
+    now = now or time.time()
+    report = {'job': 'flush_digests', 'digests': 0, 'items': 0}
+
+    query = db.collection('notification_digests')\
+        .where(filter=FieldFilter('flush_at', '<=', now - FLUSH_GRACE_SECONDS))\
+        .order_by('flush_at')\
+        .limit(FLUSH_PAGE_SIZE)
+
+    while True:
+        docs = list(query.stream())
+        if not docs:
+            break
+
+        notifications = []
+        emails = []
+        for doc in docs:
+            d = doc.to_dict()
+            count = item_count(d)
+            if count == 0:
+                continue
+            title, message = render_digest(d)
+            event_id = d.get('relatedEventId') or (d.get('lastEventId') if count <= 1 else None)
+            # Deterministic per set of items: a flush retried after a crash
+            # doesn't duplicate, and items that arrive late get their own
+            notifications.append((f"digest_{doc.id}_{_items_key(d)}",
+                                  build_notification(d['recipientId'], title, message, d['type'], event_id)))
+            if d['type'] in DIGEST_EMAIL_TYPES:
+                emails.append((d['recipientId'], title, message))
+            report['items'] += count
+
+        notification_writer.write_many(notifications)
+
+        if emails:
+            profiles = get_user_profiles([uid for uid, _, _ in emails], fields=('displayName', 'email'))
+            for uid, title, message in emails:
+                profile = profiles.get(uid) or {}
+                EmailService.send_email(
+                    to_email=profile.get('email'),
+                    subject=title,
+                    template_name='activity_digest',
+                    context={'user_name': profile.get('displayName') or 'there', 'title': title, 'message': message}
+                )
+
+        report['digests'] += len(docs)
+        report['late'] = report.get('late', 0) + _delete_flushed(db, docs)
+
+        if len(docs) < FLUSH_PAGE_SIZE:
+            break
+
+    report['markers_pruned'] = _prune_markers(db, now)
+    if report['digests']:
+        print(f"[Digest] Flushed {report['digests']} digests covering {report['items']} notifications.")
+    return report
@@ -0,0 +1,322 @@
+"""
+Leader-elected background jobs for multi-worker deployments.
+
+Every gunicorn worker (and every pod) runs create_app and therefore an
+APScheduler instance. Without coordination each of them would run every job.
+This module keeps the APScheduler timers but only lets one process — the
+leader — actually run jobs:
+
+  * leader election: a lease document (scheduler_leases/leader) that the
+    holder renews every LEASE_TTL/3 seconds; when it stops renewing, another
+    worker takes over after LEASE_TTL,
+  * job locks: each run also takes a per-job lease, held by a token unique
+    to that run (so it is not reentrant, even within one process), and
+    rechecks that the job is due once it holds it; a slow run survives a
+    leadership handover and a racing tick without a second copy starting,
+  * catch-up: jobs run when `interval` has passed since their last recorded
+    run, checked every minute and right after a worker becomes leader, so a
+    run missed while nobody was up happens on the next tick (missed runs
+    coalesce into one),
+  * run history: every run is recorded with status, duration and the job's
+    report (scheduler_jobs/{job}/runs, the last HISTORY_LIMIT runs), before
+    its job lock is released.
+
+Stores: Firestore (default) or in-memory (SCHEDULER_STORE=memory) for tests
+and single-process local dev.
+"""
+
+import os
+import time
+import uuid
+import socket
+import threading
+from firebase_admin import firestore
+
+LEASE_TTL = int(os.getenv('SCHEDULER_LEASE_TTL', 30))
+TICK_SECONDS = 60
+HISTORY_LIMIT = 20
+LEADER_LEASE = 'leader'
+
+HOLDER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class SchedulerStore:
+    """Interface for lease, job-state and run-history storage."""
+
+    def acquire_lease(self, name, holder, ttl):
+        """Takes or renews the lease; True if `holder` owns it afterwards."""
+        raise NotImplementedError
+
+    def release_lease(self, name, holder):
+        raise NotImplementedError
+
+    def get_lease(self, name):
+        raise NotImplementedError
+
+    def last_run(self, job_id):
+        raise NotImplementedError
+
+    def record_run(self, job_id, run):
+        raise NotImplementedError
+
+    def history(self, job_id, limit=HISTORY_LIMIT):
+        raise NotImplementedError
+
+
+class InMemorySchedulerStore(SchedulerStore):
+    def __init__(self):
+        self._leases = {}
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def acquire_lease(self, name, holder, ttl):
+        now = time.time()
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease and lease['holder'] != holder and lease['expires_at'] > now:
+                return False
+            self._leases[name] = {'holder': holder, 'expires_at': now + ttl}
+            return True
+
+    def release_lease(self, name, holder):
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease and lease['holder'] == holder:
+                del self._leases[name]
+
+    def get_lease(self, name):
+        with self._lock:
+            lease = self._leases.get(name)
+            return dict(lease) if lease else None
+
+    def last_run(self, job_id):
+        with self._lock:
+            runs = self._runs.get(job_id)
+            return dict(runs[-1]) if runs else None
+
+    def record_run(self, job_id, run):
+        with self._lock:
+            runs = self._runs.setdefault(job_id, [])
+            runs.append(dict(run))
+            del runs[:-HISTORY_LIMIT]
+
+    def history(self, job_id, limit=HISTORY_LIMIT):
+        with self._lock:
+            return [dict(r) for r in reversed(self._runs.get(job_id, [])[-limit:])]
+
+
+class FirestoreSchedulerStore(SchedulerStore):
+    def __init__(self, db=None):
+        self._db = db
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = firestore.client()
+        return self._db
+
+    def acquire_lease(self, name, holder, ttl):
+        ref = self.db.collection('scheduler_leases').document(name)
+
+        @firestore.transactional
+        def take(transaction):
+            snap = ref.get(transaction=transaction)
+            now = time.time()
+            if snap.exists:
+                lease = snap.to_dict()
+                if lease.get('holder') != holder and lease.get('expires_at', 0) > now:
+                    return False
+            transaction.set(ref, {'holder': holder, 'expires_at': now + ttl, 'renewed_at': now})
+            return True
+
+        return take(self.db.transaction())
+
+    def release_lease(self, name, holder):
+        ref = self.db.collection('scheduler_leases').document(name)
+
+        @firestore.transactional
+        def drop(transaction):
+            snap = ref.get(transaction=transaction)
+            if snap.exists and snap.to_dict().get('holder') == holder:
+                transaction.delete(ref)
+
+        drop(self.db.transaction())
+
+    def get_lease(self, name):
+        snap = self.db.collection('scheduler_leases').document(name).get()
+        return snap.to_dict() if snap.exists else None
+
+    def last_run(self, job_id):
+        snap = self.db.collection('scheduler_jobs').document(job_id).get()
+        return snap.to_dict().get('last_run') if snap.exists else None
+
+    def record_run(self, job_id, run):
+        job_ref = self.db.collection('scheduler_jobs').document(job_id)
+
+        # Runs are a ring of HISTORY_LIMIT slots, so each run overwrites the oldest
+        @firestore.transactional
+        def record(transaction):
+            snap = job_ref.get(transaction=transaction)
+            seq = int(snap.to_dict().get('run_seq', 0)) if snap.exists else 0
+            transaction.set(job_ref, {'last_run': run, 'run_seq': seq + 1}, merge=True)
+            transaction.set(job_ref.collection('runs').document(str(seq % HISTORY_LIMIT)), run)
+
+        record(self.db.transaction())
+
+    def history(self, job_id, limit=HISTORY_LIMIT):
+        docs = self.db.collection('scheduler_jobs').document(job_id).collection('runs')\
+            .order_by('started_at', direction=firestore.Query.DESCENDING)\
+            .limit(limit).stream()
+        return [doc.to_dict() for doc in docs]
+
+
+def _make_store():
+    if os.getenv('SCHEDULER_STORE', 'firestore') == 'memory':
+        return InMemorySchedulerStore()
+    return FirestoreSchedulerStore()
+
+
+class _Job:
+    def __init__(self, job_id, func, interval, lock_ttl):
+        self.job_id = job_id
+        self.func = func
+        self.interval = interval
+        self.lock_ttl = lock_ttl
+
+
+class DistributedScheduler:
+    def __init__(self, store=None, holder=HOLDER_ID, lease_ttl=LEASE_TTL):
+        self.store = store or _make_store()
+        self.holder = holder
+        self.lease_ttl = lease_ttl
+        self._leader_until = 0
+        self._jobs = {}
+
+    @property
+    def is_leader(self):
+        # Leadership lapses locally when the lease does, even if a renewal was missed
+        return time.time() < self._leader_until
+
+    def add_job(self, job_id, func, interval_seconds, lock_ttl=None):
+        """
+        Registers func() to run every `interval_seconds` on the leader.
+        lock_ttl bounds how long one run may hold the job lock (default: the interval).
+        """
+        self._jobs[job_id] = _Job(job_id, func, interval_seconds, lock_ttl or interval_seconds)
+
+    def init_app(self, aps):
+        """Drives election and job ticks from this process's APScheduler."""
+        aps.add_job(id='scheduler_election', func=self.elect, trigger='interval',
+                    seconds=max(self.lease_ttl // 3, 1))
+        for job in self._jobs.values():
+            aps.add_job(id=f"{job.job_id}_tick", func=self.tick, args=(job.job_id,),
+                        trigger='interval', seconds=min(job.interval, TICK_SECONDS))
+
+    def elect(self):
+        was_leader = self.is_leader
+        attempted_at = time.time()
+        try:
+            won = self.store.acquire_lease(LEADER_LEASE, self.holder, self.lease_ttl)
+        except Exception as e:
+            # Can't prove we still hold the lease, so stop acting as leader
+            print(f"[Scheduler] Leader election failed: {e}")
+            won = False
+        self._leader_until = attempted_at + self.lease_ttl if won else 0
+
+        if self.is_leader and not was_leader:
+            print(f"[Scheduler] {self.holder} is now the leader.")
+            threading.Thread(target=self.catch_up, name='scheduler-catch-up', daemon=True).start()
+        elif was_leader and not self.is_leader:
+            print(f"[Scheduler] {self.holder} lost leadership.")
+        return self.is_leader
+
+    def catch_up(self):
+        for job_id in list(self._jobs):
+            self.tick(job_id)
+
+    def is_due(self, job_id, now=None):
+        job = self._jobs[job_id]
+        last = self.store.last_run(job_id)
+        if not last:
+            return True
+        return (now or time.time()) - last.get('started_at', 0) >= job.interval
+
+    def tick(self, job_id):
+        """Runs the job if this process leads and the job is due."""
+        if not self.is_leader:
+            return None
+        try:
+            if not self.is_due(job_id):
+                return None
+        except Exception as e:
+            print(f"[Scheduler] Could not read last run of {job_id}: {e}")
+            return None
+        return self.run_job(job_id, due_only=True)
+
+    def run_job(self, job_id, due_only=False):
+        """
+        Runs the job under its lock and records the run. None if the lock is
+        taken or, with due_only, if the job is no longer due once locked.
+        """
+        job = self._jobs[job_id]
+        lock = f"job:{job_id}"
+        # A fresh holder per run, so a second tick in this process cannot take the lock too
+        token = f"{self.holder}:{uuid.uuid4().hex[:8]}"
+        try:
+            if not self.store.acquire_lease(lock, token, job.lock_ttl):
+                return None
+        except Exception as e:
+            print(f"[Scheduler] Could not lock {job_id}: {e}")
+            return None
+
+        # The run that held the lock before us may have finished since tick() looked
+        try:
+            due = not due_only or self.is_due(job_id)
+        except Exception as e:
+            print(f"[Scheduler] Could not read last run of {job_id}: {e}")
+            due = False
+        if not due:
+            try:
+                self.store.release_lease(lock, token)
+            except Exception as e:
+                print(f"[Scheduler] Could not unlock {job_id}: {e}")
+            return None
+
+        run = {'job': job_id, 'holder': self.holder, 'started_at': time.time()}
+        try:
+            report = job.func()
+            run['status'] = 'ok'
+            if isinstance(report, dict):
+                run['report'] = report
+        except Exception as e:
+            print(f"[Scheduler Error] {job_id}: {e}")
+            run['status'] = 'error'
+            run['error'] = str(e)
+        finally:
+            run['finished_at'] = time.time()
+            run['duration_ms'] = round((run['finished_at'] - run['started_at']) * 1000, 1)
+            # Record before unlocking: whoever takes the lock next rechecks is_due and sees this run
+            try:
+                self.store.record_run(job_id, run)
+            except Exception as e:
+                print(f"[Scheduler] Could not record run of {job_id}: {e}")
+            try:
+                self.store.release_lease(lock, token)
+            except Exception as e:
+                print(f"[Scheduler] Could not unlock {job_id}: {e}")
+        return run
+
+    def status(self):
+        """Leader and per-job history, for the admin dashboard."""
+        return {
+            'holder': self.holder,
+            'is_leader': self.is_leader,
+            'leader': self.store.get_lease(LEADER_LEASE),
+            'jobs': {
+                job_id: {'interval_seconds': job.interval, 'runs': self.store.history(job_id)}
+                for job_id, job in self._jobs.items()
+            },
+        }
+
+
+distributed_scheduler = DistributedScheduler()
@@ -1,136 +1,295 @@
+"""
+Email delivery.
+
+send_email renders the template and puts the message on a bounded queue; a
+fixed pool of worker threads delivers it through a transport, so bulk paths
+(refund loops, reminders) never spawn a thread per email.
+
+  * transports: SMTP with one reused connection per worker (when SMTP_HOST
+    is set) or the console mock used in development,
+  * failed sends are retried with exponential backoff,
+  * a full queue makes send_email wait briefly and then give up (returns
+    False) instead of growing without bound,
+  * the queue is drained on interpreter exit,
+  * stats() reports queue depth, outcomes and delivery latency.
+
+Templates live in services/email_templates.py. scripts/fake_smtp_server.py
+runs a local SMTP sink for exercising the SMTP transport end to end.
+"""
+
 import os
-import threading
 import time
+import queue
+import atexit
+import smtplib
+import threading
+from email.message import EmailMessage
+from app.services import email_templates
 
-class EmailService:
-    """
-    Mock Email Service for MVP Phase 4.
-    In a real implementation, this would use an SMTP client like SendGrid or Mailgun.
-    """
-    
-    @staticmethod
-    def _render_template(template_name, context):
-        """
-        Renders a basic HTML template with the given context.
-        """
-        if template_name == 'payment_success':
-            return f"""
-            <html>
-                <body style="font-family: Arial, sans-serif; color: #333; padding: 20px;">
-                    <h2 style="color: #10b981;">Payment Successful!</h2>
-                    <p>Hi {context.get('user_name', 'there')},</p>
-                    <p>Your payment of {context.get('amount', 0)} for the event <strong>{context.get('event_name')}</strong> was successful.</p>
-                    <p>Transaction ID: {context.get('transaction_id')}</p>
-                    <p>Please log in to your dashboard to view your tickets.</p>
-                    <br/>
-                    <p>Best,<br/>The Huddle Team</p>
-                </body>
-            </html>
-            """
-        elif template_name == 'verification_approved':
-            return f"""
-            <html>
-                <body style="font-family: Arial, sans-serif; color: #333; padding: 20px;">
-                    <h2 style="color: #10b981;">Account Verified!</h2>
-                    <p>Hi {context.get('user_name', 'there')},</p>
-                    <p>Great news! Your account has been verified for <strong>{context.get('verification_type', 'Host')}</strong> features.</p>
-                    <p>You can now start listing and managing your events/venues on Huddle.</p>
-                    <br/>
-                    <p>Best,<br/>The Huddle Team</p>
-                </body>
-            </html>
-            """
-        elif template_name == 'verification_rejected':
-            return f"""
-            <html>
-                <body style="font-family: Arial, sans-serif; color: #333; padding: 20px;">
-                    <h2 style="color: #ef4444;">Verification Update</h2>
-                    <p>Hi {context.get('user_name', 'there')},</p>
-                    <p>Unfortunately, your request for <strong>{context.get('verification_type', 'Host')}</strong> verification could not be approved at this time.</p>
-                    <p>Reason: {context.get('reason', 'Provided details did not meet our criteria.')}</p>
-                    <p>You may update your information and try again later.</p>
-                    <br/>
-                    <p>Best,<br/>The Huddle Team</p>
-                </body>
-            </html>
-            """
-        elif template_name == 'booking_approved':
-            return f"""
-            <html>
-                <body style="font-family: Arial, sans-serif; color: #333; padding: 20px;">
-                    <h2 style="color: #10b981;">Venue Booking Approved!</h2>
-                    <p>Hi {context.get('user_name', 'there')},</p>
-                    <p>Your booking request for <strong>{context.get('venue_name')}</strong> on <strong>{context.get('date')}</strong> from {context.get('start_time')} to {context.get('end_time')} has been approved by the host!</p>
-                    <p>We hope you have a wonderful event.</p>
-                    <br/>
-                    <p>Best,<br/>The Huddle Team</p>
-                </body>
-            </html>
-            """
-        elif template_name == 'booking_rejected':
-            return f"""
-            <html>
-                <body style="font-family: Arial, sans-serif; color: #333; padding: 20px;">
-                    <h2 style="color: #ef4444;">Venue Booking Update</h2>
-                    <p>Hi {context.get('user_name', 'there')},</p>
-                    <p>Unfortunately, your booking request for <strong>{context.get('venue_name')}</strong> on <strong>{context.get('date')}</strong> was declined by the host.</p>
-                    <p>Please explore other venues on Huddle for your event.</p>
-                    <br/>
-                    <p>Best,<br/>The Huddle Team</p>
-                </body>
-            </html>
-            """
-        elif template_name == 'refund_processed':
-            return f"""
-            <html>
-                <body style="font-family: Arial, sans-serif; color: #333; padding: 20px;">
-                    <h2 style="color: #f59e0b;">Refund Processed</h2>
-                    <p>Hi {context.get('user_name', 'there')},</p>
-                    <p>Your refund for the event <strong>{context.get('event_name')}</strong> has been processed.</p>
-                    <p>Refund Amount: <strong>{context.get('amount', 'N/A')}</strong></p>
-                    <p>Payment Reference: {context.get('payment_id', 'N/A')}</p>
-                    <p>The refund will reflect in your account within 5-7 business days.</p>
-                    <br/>
-                    <p>Best,<br/>The Huddle Team</p>
-                </body>
-            </html>
-            """
-        return f"<p>{str(context)}</p>"
+EMAIL_WORKERS = int(os.getenv('EMAIL_WORKERS', 4))
+EMAIL_QUEUE_SIZE = int(os.getenv('EMAIL_QUEUE_SIZE', 1000))
+EMAIL_MAX_ATTEMPTS = 3
+ENQUEUE_TIMEOUT = 2.0
+DRAIN_TIMEOUT = float(os.getenv('EMAIL_DRAIN_TIMEOUT', 10))
+SENDER = os.getenv('EMAIL_SENDER', 'Huddle <no-reply@huddle.app>')
+
+
+class EmailTransport:
+    """Interface for delivering one rendered message."""
+
+    def send(self, to_email, subject, html_body):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ConsoleTransport(EmailTransport):
+    """Mock transport for MVP/dev: logs the email to the backend terminal."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def send(self, to_email, subject, html_body):
+        if self.latency:
+            time.sleep(self.latency)  # Simulate SMTP latency
 
-    @staticmethod
-    def _simulate_send(recipient_email, subject, html_content):
-        """
-        Simulates network latency and logs the email to the backend terminal.
-        """
-        time.sleep(1) # Simulate SMTP latency
-        
         separator = "=" * 60
         mock_log = f"""\n{separator}
 [MOCK EMAIL DISPATCHED]
-To:      {recipient_email}
+To:      {to_email}
 Subject: {subject}
 {separator}
-{html_content.strip()}
+{html_body.strip()}
 {separator}\n"""
-        
+
         print(mock_log)
 
+
+class SMTPTransport(EmailTransport):
+    """SMTP delivery; each worker thread keeps its own open connection."""
+
+    def __init__(self, host, port=587, username=None, password=None, use_tls=True, timeout=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self._local = threading.local()
+        self._conns = set()
+        self._conns_lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.use_tls:
+                conn.starttls()
+            if self.username:
+                conn.login(self.username, self.password)
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.add(conn)
+        return conn
+
+    def send(self, to_email, subject, html_body):
+        msg = EmailMessage()
+        msg['From'] = SENDER
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.set_content('This email requires an HTML-capable client.')
+        msg.add_alternative(html_body, subtype='html')
+        try:
+            self._connection().send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError, OSError):
+            # Stale pooled connection: drop it and let the retry reconnect
+            self._drop(getattr(self._local, 'conn', None))
+            self._local.conn = None
+            raise
+
+    def _drop(self, conn):
+        if conn is None:
+            return
+        with self._conns_lock:
+            self._conns.discard(conn)
+        try:
+            conn.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        with self._conns_lock:
+            conns = list(self._conns)
+        for conn in conns:
+            self._drop(conn)
+
+
+def _make_transport():
+    host = os.getenv('SMTP_HOST')
+    if host:
+        return SMTPTransport(
+            host,
+            port=int(os.getenv('SMTP_PORT', 587)),
+            username=os.getenv('SMTP_USERNAME'),
+            password=os.getenv('SMTP_PASSWORD'),
+            use_tls=os.getenv('SMTP_USE_TLS', 'true').lower() == 'true',
+        )
+    return ConsoleTransport()
+
+
+class EmailDispatcher:
+    def __init__(self, transport=None, workers=EMAIL_WORKERS, max_queue=EMAIL_QUEUE_SIZE):
+        self.transport = transport or _make_transport()
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._accepting = True
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'queued': 0,
+            'sent': 0,
+            'failed': 0,
+            'retries': 0,
+            'dropped': 0,
+            'latency_ms_last': 0.0,
+            'latency_ms_total': 0.0,
+        }
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"email-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            atexit.register(self.drain)
+
+    def submit(self, to_email, subject, html_body):
+        """Queues a message; False if it could not be accepted."""
+        if not self._accepting:
+            self._count('dropped')
+            return False
+        self.start()
+        try:
+            self._queue.put((to_email, subject, html_body, time.monotonic()), timeout=ENQUEUE_TIMEOUT)
+        except queue.Full:
+            self._count('dropped')
+            print(f"[Email] Queue full, dropped email to {to_email}: {subject}")
+            return False
+        self._count('queued')
+        return True
+
+    def _deliver(self, to_email, subject, html_body):
+        for attempt in range(1, EMAIL_MAX_ATTEMPTS + 1):
+            try:
+                self.transport.send(to_email, subject, html_body)
+                return True
+            except Exception as e:
+                if attempt == EMAIL_MAX_ATTEMPTS:
+                    print(f"[Email] Giving up on {to_email} after {attempt} attempts: {e}")
+                    return False
+                self._count('retries')
+                time.sleep(0.5 * 2 ** (attempt - 1))
+
+    def _run(self):
+        while True:
+            to_email, subject, html_body, queued_at = self._queue.get()
+            try:
+                ok = self._deliver(to_email, subject, html_body)
+                latency_ms = (time.monotonic() - queued_at) * 1000
+                with self._stats_lock:
+                    self._stats['sent' if ok else 'failed'] += 1
+                    self._stats['latency_ms_last'] = round(latency_ms, 2)
+                    self._stats['latency_ms_total'] += latency_ms
+            finally:
+                self._queue.task_done()
+
+    def drain(self, timeout=DRAIN_TIMEOUT):
+        """Stops accepting new mail and waits (up to timeout) for the queue to empty."""
+        self._accepting = False
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        left = self._queue.unfinished_tasks
+        if left:
+            print(f"[Email] Shutdown with {left} emails undelivered.")
+        self.transport.close()
+        return left == 0
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def stats(self):
+        with self._stats_lock:
+            data = dict(self._stats)
+        total_ms = data.pop('latency_ms_total')
+        done = data['sent'] + data['failed']
+        data['latency_ms_avg'] = round(total_ms / done, 2) if done else 0.0
+        data['queue_depth'] = self._queue.qsize()
+        data['queue_max'] = self._queue.maxsize
+        data['workers'] = self.workers
+        data['transport'] = type(self.transport).__name__
+        return data
+
+
+dispatcher = EmailDispatcher()
+
+
+class EmailService:
+    """
+    Email facade used by the blueprints. Rendering happens in the caller;
+    delivery on the dispatcher's worker pool.
+    """
+    
+    @staticmethod
+    def _render_template(template_name, context):
+        """
+        Renders a registered HTML template (see services/email_templates.py).
+        Raises TemplateError for unknown templates or missing context keys.
+        """
+        return email_templates.render(template_name, context)
+
     @classmethod
     def send_email(cls, to_email, subject, template_name, context=None):
         """
-        Public method to dispatch an email. Handles the rendering and async sending.
+        Public method to dispatch an email. Renders it and queues it for delivery.
+        Returns False if the email could not be rendered or queued.
         """
         if not context:
             context = {}
+        if not to_email:
+            return False
             
-        html_body = cls._render_template(template_name, context)
-        
-        # Fire and forget thread so we don't block the API response
-        thread = threading.Thread(
-            target=cls._simulate_send, 
-            args=(to_email, subject, html_body)
-        )
-        thread.daemon = True
-        thread.start()
-        
-        return True
+        try:
+            html_body = cls._render_template(template_name, context)
+        except email_templates.TemplateError as e:
+            print(f"[Email] Not sent to {to_email}: {e}")
+            return False
+        return dispatcher.submit(to_email, subject, html_body)
+
+    @classmethod
+    def send_bulk(cls, recipients, subject, template_name, shared_context=None):
+        """
+        Sends the same template to many recipients.
+        recipients: [(to_email, per_recipient_context)]. The shared context is
+        bound into the template once. Returns the number of emails queued.
+        """
+        recipients = [(to, ctx or {}) for to, ctx in recipients if to]
+        if not recipients:
+            return 0
+        try:
+            bodies = email_templates.render_batch(
+                template_name, [ctx for _, ctx in recipients], shared=shared_context
+            )
+        except email_templates.TemplateError as e:
+            print(f"[Email] Bulk send of '{template_name}' skipped: {e}")
+            return 0
+        return sum(1 for (to, _), body in zip(recipients, bodies) if dispatcher.submit(to, subject, body))
+
+    @staticmethod
+    def stats():
+        return dispatcher.stats()
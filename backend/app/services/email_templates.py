@@ -0,0 +1,180 @@
+"""
+Email template registry.
+
+Templates are declared once below and compiled at import: each body is split
+into literal chunks and placeholder slots, and every placeholder must be
+either a required context key or have a default — a typo fails at startup,
+not when the first email goes out. Rendering is a single join over the
+precompiled chunks; context values are HTML-escaped.
+
+For bulk sends, `render_batch` first binds the context shared by every
+recipient (event name, date, ...) into a smaller compiled template, then
+fills only the per-recipient slots for each message.
+"""
+
+import html
+from string import Formatter
+
+LAYOUT_START = """
+            <html>
+                <body style="font-family: Arial, sans-serif; color: #333; padding: 20px;">
+"""
+LAYOUT_END = """                    <br/>
+                    <p>Best,<br/>The Huddle Team</p>
+                </body>
+            </html>
+            """
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class CompiledTemplate:
+    def __init__(self, name, body, required=(), defaults=None):
+        self.name = name
+        self.required = frozenset(required)
+        self.defaults = dict(defaults or {})
+
+        # Literals and fields interleave: lit0 f0 lit1 f1 ... litN
+        self._literals = ['']
+        self._fields = []
+        for literal, field, _, _ in Formatter().parse(body):
+            # A {{ or }} escape ends a chunk without a field; it joins the current literal
+            self._literals[-1] += literal
+            if field is not None:
+                self._fields.append(field)
+                self._literals.append('')
+
+        undeclared = set(self._fields) - self.required - set(self.defaults)
+        if undeclared:
+            raise TemplateError(f"Template '{name}' uses undeclared keys: {sorted(undeclared)}")
+
+    @property
+    def fields(self):
+        return set(self._fields)
+
+    def missing(self, context):
+        return sorted(k for k in self.required if context.get(k) is None)
+
+    def render(self, context):
+        missing = self.missing(context)
+        if missing:
+            raise TemplateError(f"Template '{self.name}' missing context keys: {missing}")
+        parts = [self._literals[0]]
+        for field, literal in zip(self._fields, self._literals[1:]):
+            value = context.get(field)
+            if value is None:
+                value = self.defaults[field]
+            parts.append(html.escape(str(value)))
+            parts.append(literal)
+        return ''.join(parts)
+
+    def bind(self, shared):
+        """A new template with the `shared` values baked in."""
+        body = [self._literals[0].replace('{', '{{').replace('}', '}}')]
+        for field, literal in zip(self._fields, self._literals[1:]):
+            if field in shared and shared[field] is not None:
+                value = html.escape(str(shared[field]))
+                body.append(value.replace('{', '{{').replace('}', '}}'))
+            else:
+                body.append('{' + field + '}')
+            body.append(literal.replace('{', '{{').replace('}', '}}'))
+        remaining = self.fields - set(k for k, v in shared.items() if v is not None)
+        return CompiledTemplate(
+            self.name,
+            ''.join(body),
+            required=self.required & remaining,
+            defaults={k: v for k, v in self.defaults.items() if k in remaining},
+        )
+
+
+_registry = {}
+
+
+def register(name, body, required=(), defaults=None):
+    _registry[name] = CompiledTemplate(name, LAYOUT_START + body + LAYOUT_END, required, defaults)
+
+
+def get_template(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise TemplateError(f"Unknown email template '{name}'")
+
+
+def render(name, context):
+    return get_template(name).render(context or {})
+
+
+def render_batch(name, contexts, shared=None):
+    """Renders one message per context; `shared` values are bound only once."""
+    template = get_template(name)
+    if shared:
+        template = template.bind(shared)
+    return [template.render(context or {}) for context in contexts]
+
+
+def template_names():
+    return sorted(_registry)
+
+
+register('payment_success', """                    <h2 style="color: #10b981;">Payment Successful!</h2>
+                    <p>Hi {user_name},</p>
+                    <p>Your payment of {amount} for the event <strong>{event_name}</strong> was successful.</p>
+                    <p>Transaction ID: {transaction_id}</p>
+                    <p>Please log in to your dashboard to view your tickets.</p>
+""", required=('event_name', 'transaction_id'), defaults={'user_name': 'there', 'amount': 0})
+
+register('payment_receipt', """                    <h2 style="color: #10b981;">Payment Received</h2>
+                    <p>Hi {user_name},</p>
+                    <p>We received your payment of <strong>{amount}</strong> for <strong>{event_title}</strong>.</p>
+                    <p>Transaction ID: {transaction_id}</p>
+                    <p>Your booking is now confirmed.</p>
+""", required=('event_title', 'amount', 'transaction_id'), defaults={'user_name': 'there'})
+
+register('verification_approved', """                    <h2 style="color: #10b981;">Account Verified!</h2>
+                    <p>Hi {user_name},</p>
+                    <p>Great news! Your account has been verified for <strong>{verification_type}</strong> features.</p>
+                    <p>You can now start listing and managing your events/venues on Huddle.</p>
+""", defaults={'user_name': 'there', 'verification_type': 'Host'})
+
+register('verification_rejected', """                    <h2 style="color: #ef4444;">Verification Update</h2>
+                    <p>Hi {user_name},</p>
+                    <p>Unfortunately, your request for <strong>{verification_type}</strong> verification could not be approved at this time.</p>
+                    <p>Reason: {reason}</p>
+                    <p>You may update your information and try again later.</p>
+""", defaults={'user_name': 'there', 'verification_type': 'Host',
+               'reason': 'Provided details did not meet our criteria.'})
+
+register('booking_approved', """                    <h2 style="color: #10b981;">Venue Booking Approved!</h2>
+                    <p>Hi {user_name},</p>
+                    <p>Your booking request for <strong>{venue_name}</strong> on <strong>{date}</strong> from {start_time} to {end_time} has been approved by the host!</p>
+                    <p>We hope you have a wonderful event.</p>
+""", required=('venue_name', 'date', 'start_time', 'end_time'), defaults={'user_name': 'there'})
+
+register('booking_rejected', """                    <h2 style="color: #ef4444;">Venue Booking Update</h2>
+                    <p>Hi {user_name},</p>
+                    <p>Unfortunately, your booking request for <strong>{venue_name}</strong> on <strong>{date}</strong> was declined by the host.</p>
+                    <p>Please explore other venues on Huddle for your event.</p>
+""", required=('venue_name', 'date'), defaults={'user_name': 'there'})
+
+register('refund_processed', """                    <h2 style="color: #f59e0b;">Refund Processed</h2>
+                    <p>Hi {user_name},</p>
+                    <p>Your refund for the event <strong>{event_name}</strong> has been processed.</p>
+                    <p>Refund Amount: <strong>{amount}</strong></p>
+                    <p>Payment Reference: {payment_id}</p>
+                    <p>The refund will reflect in your account within 5-7 business days.</p>
+""", required=('event_name',), defaults={'user_name': 'there', 'amount': 'N/A', 'payment_id': 'N/A'})
+
+register('activity_digest', """                    <h2 style="color: #6366f1;">{title}</h2>
+                    <p>Hi {user_name},</p>
+                    <p>{message}</p>
+                    <p>Log in to Huddle to see the details.</p>
+""", required=('title', 'message'), defaults={'user_name': 'there'})
+
+register('event_reminder', """                    <h2 style="color: #6366f1;">Your Event is Tomorrow!</h2>
+                    <p>Hi {user_name},</p>
+                    <p>This is a reminder that <strong>{event_name}</strong> starts on <strong>{date}</strong> at {venue}.</p>
+                    <p>Your tickets are available in your dashboard.</p>
+""", required=('event_name', 'date'), defaults={'user_name': 'there', 'venue': 'the venue'})
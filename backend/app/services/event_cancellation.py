@@ -0,0 +1,205 @@
+"""
+Event cancellation cascade.
+
+delete_event used to refund, notify and email every ticket holder one by one
+inside the HTTP request (about seven round-trips per attendee). Now it only
+marks the event `status: cancelling` and enqueues an `event_cancellation`
+job; the request returns 202 with the job id, and progress can be read from
+GET /api/events/<id>/cancellation. If the job fails for good, deleting the
+event again requeues it.
+
+The job pages over the event's active tickets with bulk_update. For each
+chunk, one WriteBatch refunds the tickets (with their check-in markers) and
+their paid orders; orders are looked up with a single get_all. Once the
+batch has committed, the holders are notified with write_many and emailed
+with send_bulk. Chunks commit in parallel on the bulk pool. Because the ticket query only matches
+`active` tickets, a retried job resumes where the last one stopped.
+Notification ids are deterministic, so a retry does not notify anyone twice.
+When all tickets are done, the event is deleted along with its
+subcollections and index entries (see cascade_delete.py).
+"""
+
+import time
+import threading
+from firebase_admin import firestore
+from google.cloud.firestore import FieldFilter
+from app.services.jobs import job_handler, enqueue, get_job, retry
+from app.services.bulk_update import bulk_update, BATCH_SIZE
+from app.services.cascade_delete import delete_event_tree
+from app.services.checkins import record_refund
+
+CANCELLING = 'cancelling'
+# Per ticket: the ticket, its check-in marker and maybe its order
+CHUNK_SIZE = BATCH_SIZE // 3
+GET_ALL_CHUNK_SIZE = 100
+TICKET_FIELDS = ['user_id', 'order_id', 'payment_id']
+
+
+def job_id_for(event_id):
+    return f"cancel_event_{event_id}"
+
+
+def _enqueue(event_id, event, requested_by):
+    return enqueue('event_cancellation', {
+        'event_id': event_id,
+        'title': event.get('title'),
+        'date': event.get('date'),
+        'is_paid': bool(event.get('is_paid')),
+        'requested_by': requested_by,
+    }, job_id=job_id_for(event_id))
+
+
+def start_cancellation(event_ref, event, actor_uid):
+    """Marks the event as cancelling and queues the cascade. Returns the job id."""
+    event_ref.update({
+        'status': CANCELLING,
+        'cancellation_job': job_id_for(event_ref.id),
+        'cancel_requested_at': int(time.time()),
+        'cancel_requested_by': actor_uid,
+    })
+    return _enqueue(event_ref.id, event, actor_uid)
+
+
+def resume_cancellation(event_ref, event):
+    """
+    For an event already marked cancelling: requeues the cascade if its job
+    failed for good (or was never recorded). Returns (job id, restarted).
+    """
+    job_id = job_id_for(event_ref.id)
+    if get_job(job_id) is None:
+        return _enqueue(event_ref.id, event, event.get('cancel_requested_by')), True
+    # Refunded tickets drop out of the query, so the rerun picks up where it stopped
+    return job_id, retry(job_id)
+
+
+def cancellation_status(event_id):
+    """The job's status and progress, or None if the event was never cancelled."""
+    job = get_job(job_id_for(event_id))
+    if job is None:
+        return None
+    return {
+        'jobId': job['id'],
+        'status': job.get('status'),
+        'progress': job.get('progress', {}),
+        'error': job.get('error'),
+        'finishedAt': job.get('finished_at'),
+        'requestedBy': (job.get('payload') or {}).get('requested_by'),
+    }
+
+
+def _load_orders(db, order_ids):
+    orders = {}
+    ids = sorted(set(order_ids))
+    for i in range(0, len(ids), GET_ALL_CHUNK_SIZE):
+        refs = [db.collection('payment_orders').document(oid) for oid in ids[i:i + GET_ALL_CHUNK_SIZE]]
+        for snap in db.get_all(refs, field_paths=['status', 'amount', 'currency']):
+            if snap.exists:
+                orders[snap.id] = snap.to_dict()
+    return orders
+
+
+def _refund_tickets(db, ctx, event_id, title):
+    from app.blueprints.notifications.routes import build_notification
+    from app.services.notification_writer import notification_writer
+    from app.services.email_service import EmailService
+    from app.services.user_cache import get_user_profiles
+
+    # Carry counts over from an earlier attempt of the same job
+    totals = {k: int(ctx.progress.get(k, 0)) for k in ('refunded', 'orders_refunded', 'emails')}
+    lock = threading.Lock()
+
+    def on_chunk(batch, snaps):
+        now = int(time.time())
+        tickets = [(snap.id, snap.to_dict()) for snap in snaps]
+        for tid, t in tickets:
+            record_refund(db, batch, tid, event_id, t.get('user_id'))
+        order_ids = [t.get('order_id') for _, t in tickets if t.get('order_id') not in (None, '', 'none')]
+        orders = _load_orders(db, order_ids)
+        paid = [oid for oid, o in orders.items() if o.get('status') == 'paid']
+        for oid in paid:
+            batch.update(db.collection('payment_orders').document(oid), {
+                'status': 'refunded',
+                'refunded_at': now,
+                'refund_reason': 'event_cancelled'
+            })
+
+        def after_commit():
+            holders = [(tid, t) for tid, t in tickets if t.get('user_id')]
+            notification_writer.write_many([
+                (f"cancel_{event_id}_{tid}", build_notification(
+                    t['user_id'], 'Event Cancelled — Refund Issued',
+                    f'"{title}" has been cancelled. Your ticket has been refunded.',
+                    'refund', event_id))
+                for tid, t in holders
+            ])
+            profiles = get_user_profiles([t['user_id'] for _, t in holders], fields=('displayName', 'email'))
+            recipients = []
+            for _, t in holders:
+                profile = profiles.get(t['user_id']) or {}
+                order = orders.get(t.get('order_id')) or {}
+                recipients.append((profile.get('email'), {
+                    'user_name': profile.get('displayName') or 'User',
+                    'amount': f"{order.get('currency', 'INR')} {order.get('amount', 0)}",
+                    'payment_id': t.get('payment_id', 'N/A'),
+                }))
+            emails = EmailService.send_bulk(
+                recipients,
+                subject="Event Cancelled — Refund Processed",
+                template_name='refund_processed',
+                shared_context={'event_name': title or 'Event'},
+            )
+            with lock:
+                totals['refunded'] += len(tickets)
+                totals['orders_refunded'] += len(paid)
+                totals['emails'] += emails
+                ctx.report(phase='refunding', **totals)
+
+        return after_commit
+
+    query = db.collection('tickets')\
+        .where(filter=FieldFilter('event_id', '==', event_id))\
+        .where(filter=FieldFilter('status', '==', 'active'))
+    result = bulk_update(
+        query,
+        {'status': 'refunded', 'refunded_at': int(time.time()), 'refund_reason': 'event_cancelled'},
+        op=f"cancel_{event_id}",
+        budget=None,
+        chunk_size=CHUNK_SIZE,
+        on_chunk=on_chunk,
+        fields=TICKET_FIELDS,
+        db=db,
+    )
+    if not result.done:
+        # Refunded tickets drop out of the query, so the retry picks up the rest
+        raise RuntimeError(f"Refund cascade stopped after {result.updated} tickets: {result.error}")
+    return totals
+
+
+@job_handler('event_cancellation')
+def run_event_cancellation(ctx):
+    from app.services.search_index import unindex_event
+    from app.services.reminders import cancel_reminder
+    from app.services.response_cache import response_cache
+
+    p = ctx.payload
+    event_id = p['event_id']
+    db = firestore.client()
+    totals = {}
+    if p.get('is_paid'):
+        ctx.report(phase='refunding')
+        totals = _refund_tickets(db, ctx, event_id, p.get('title'))
+
+    ctx.report(phase='deleting', **totals)
+    totals['deleted'] = delete_event_tree(event_id, db, on_progress=lambda n: ctx.report(deleted=n))
+    response_cache.invalidate('events')
+    try:
+        unindex_event(event_id)
+    except Exception as e:
+        print(f"Failed to remove event {event_id} from search index: {e}")
+    try:
+        cancel_reminder(event_id, p.get('date'))
+    except Exception as e:
+        print(f"Failed to cancel reminder for event {event_id}: {e}")
+
+    ctx.report(phase='done')
+    return totals
@@ -0,0 +1,94 @@
+"""
+Wishlist fan-out: tells users who wishlisted a host or venue about a new event.
+
+create_event only enqueues a `wishlist_fanout` job; the work below runs on the
+job pool, so event creation latency doesn't depend on follower count.
+Wishlisters are paged through 500 at a time; each page is folded into the
+recipients' wishlist digests in one WriteBatch (or written as notifications
+directly when wishlist digests are turned off). Digest windows and the
+deterministic notification ids keep a retried job from alerting anyone twice.
+"""
+
+from firebase_admin import firestore
+from google.cloud.firestore import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+from app.services.jobs import job_handler, enqueue
+from app.services.digest import coalesce_many
+
+PAGE_SIZE = 500  # also the Firestore WriteBatch limit
+
+REQUIRED_INDEXES = [
+    {'collectionGroup': 'wishlist', 'queryScope': 'COLLECTION_GROUP', 'fields': [
+        {'fieldPath': 'type', 'order': 'ASCENDING'},
+        {'fieldPath': 'targetId', 'order': 'ASCENDING'},
+    ]},
+]
+
+
+def queue_wishlist_fanout(event_id, host_id, host_name, venue, title):
+    return enqueue('wishlist_fanout', {
+        'event_id': event_id,
+        'host_id': host_id,
+        'host_name': host_name,
+        'venue': venue,
+        'title': title,
+    }, job_id=f"wishlist_fanout_{event_id}")
+
+
+def _wishlist_pages(db, target_type, target_id):
+    query = db.collection_group('wishlist')\
+        .where(filter=FieldFilter('type', '==', target_type))\
+        .where(filter=FieldFilter('targetId', '==', target_id))\
+        .order_by(FieldPath.document_id())\
+        .limit(PAGE_SIZE)
+
+    last = None
+    while True:
+        page_query = query.start_after(last) if last is not None else query
+        page = list(page_query.stream())
+        if not page:
+            return
+        yield page
+        if len(page) < PAGE_SIZE:
+            return
+        last = page[-1]
+
+
+@job_handler('wishlist_fanout')
+def run_wishlist_fanout(ctx):
+    p = ctx.payload
+    event_id = p['event_id']
+    host_id = p['host_id']
+    db = firestore.client()
+
+    notified_users = set()
+    sent = 0
+
+    for target_type, target_id in (('host', host_id), ('place', p.get('venue'))):
+        if not target_id:
+            continue
+        if target_type == 'host':
+            msg = f"{p.get('host_name') or 'A Host'} hosted a new event: {p.get('title')}"
+        else:
+            msg = f"New event at {p.get('venue')}: {p.get('title')}"
+
+        for page in _wishlist_pages(db, target_type, target_id):
+            items = []
+            for w_doc in page:
+                recipient_id = w_doc.reference.parent.parent.id
+                if recipient_id == host_id or recipient_id in notified_users:
+                    continue
+                notified_users.add(recipient_id)
+                items.append({
+                    'recipient_id': recipient_id,
+                    'title': 'Wishlist Update',
+                    'message': msg,
+                    'type': 'wishlist_alert',
+                    'related_event_id': event_id,
+                    'doc_id': f"wishlist_{event_id}_{recipient_id}",
+                })
+            # Folded into each user's wishlist digest (services/digest.py)
+            sent += coalesce_many(items)
+            ctx.report(notified=sent)
+
+    return {'notified': sent}
@@ -0,0 +1,240 @@
+"""
+Background job queue (Firestore outbox + in-process worker pool).
+
+Request handlers call `enqueue(...)`, which records the job in the `jobs`
+collection and hands it to a local thread pool, so the HTTP response doesn't
+wait for the work. The outbox document is the source of truth:
+
+  * the job id doubles as the idempotency key — enqueueing the same id twice
+    is a no-op,
+  * a worker claims a job in a transaction (status + lease), so the local
+    pool and the recovery sweep never run it twice at once,
+  * failures are retried with exponential backoff up to MAX_ATTEMPTS,
+  * jobs left behind by a crashed/restarted process are picked up by
+    `recover_jobs`, which the scheduler runs every minute.
+
+Handlers register with `@job_handler('type')` and receive a JobContext.
+"""
+
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists
+from google.cloud.firestore import FieldFilter
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+MAX_ATTEMPTS = 5
+LEASE_SECONDS = 300
+# Local pool gets this long to claim a new job before the recovery sweep may
+START_GRACE_SECONDS = 60
+
+REQUIRED_INDEXES = [
+    {'collectionGroup': 'jobs', 'queryScope': 'COLLECTION', 'fields': [
+        {'fieldPath': 'status', 'order': 'ASCENDING'},
+        {'fieldPath': 'lease_until', 'order': 'ASCENDING'},
+    ]},
+]
+
+_handlers = {}
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def job_handler(job_type):
+    """Registers fn(ctx) as the handler for jobs of this type."""
+    def decorator(fn):
+        _handlers[job_type] = fn
+        return fn
+    return decorator
+
+
+class JobContext:
+    def __init__(self, job_id, ref, payload, progress):
+        self.job_id = job_id
+        self.ref = ref
+        self.payload = payload
+        self.progress = dict(progress or {})
+
+    def report(self, **progress):
+        """Persists progress (and extends the lease) while the job runs."""
+        self.progress.update(progress)
+        self.ref.update({
+            'progress': self.progress,
+            'lease_until': int(time.time()) + LEASE_SECONDS,
+            'updated_at': int(time.time()),
+        })
+
+
+def _db():
+    return firestore.client()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='jobs')
+        return _executor
+
+
+def _submit(job_id, delay=0):
+    if delay > 0:
+        timer = threading.Timer(delay, _submit, args=(job_id,))
+        timer.daemon = True
+        timer.start()
+        return
+    _pool().submit(run_job, job_id)
+
+
+def enqueue(job_type, payload, job_id=None):
+    """
+    Records a job and schedules it locally. Returns the job id.
+    Pass a deterministic job_id to make enqueueing idempotent.
+    """
+    job_id = job_id or f"{job_type}_{uuid.uuid4().hex}"
+    now = int(time.time())
+    try:
+        _db().collection('jobs').document(job_id).create({
+            'type': job_type,
+            'payload': payload,
+            'status': 'queued',
+            'attempts': 0,
+            'progress': {},
+            'created_at': now,
+            'updated_at': now,
+            'lease_until': now + START_GRACE_SECONDS,
+        })
+    except AlreadyExists:
+        return job_id
+
+    _submit(job_id)
+    return job_id
+
+
+@firestore.transactional
+def _reset_failed(transaction, job_ref):
+    snap = job_ref.get(transaction=transaction)
+    if not snap.exists or snap.to_dict().get('status') != 'failed':
+        return False
+    now = int(time.time())
+    transaction.update(job_ref, {
+        'status': 'queued',
+        'attempts': 0,
+        'updated_at': now,
+        'lease_until': now + START_GRACE_SECONDS,
+    })
+    return True
+
+
+def retry(job_id):
+    """
+    Queues a job that ran out of attempts again, keeping its progress.
+    Returns True if it was requeued, False if it was not in 'failed'.
+    """
+    db = _db()
+    if not _reset_failed(db.transaction(), db.collection('jobs').document(job_id)):
+        return False
+    _submit(job_id)
+    return True
+
+
+def get_job(job_id):
+    doc = _db().collection('jobs').document(job_id).get()
+    if not doc.exists:
+        return None
+    data = doc.to_dict()
+    data['id'] = doc.id
+    return data
+
+
+@firestore.transactional
+def _claim(transaction, job_ref):
+    snap = job_ref.get(transaction=transaction)
+    if not snap.exists:
+        return None
+    job = snap.to_dict()
+    now = int(time.time())
+    if job.get('status') == 'queued':
+        pass
+    elif job.get('status') == 'running' and job.get('lease_until', 0) < now:
+        pass  # previous worker died mid-run
+    else:
+        return None
+
+    transaction.update(job_ref, {
+        'status': 'running',
+        'attempts': job.get('attempts', 0) + 1,
+        'lease_until': now + LEASE_SECONDS,
+        'updated_at': now,
+    })
+    job['attempts'] = job.get('attempts', 0) + 1
+    return job
+
+
+def run_job(job_id):
+    db = _db()
+    job_ref = db.collection('jobs').document(job_id)
+    try:
+        job = _claim(db.transaction(), job_ref)
+    except Exception as e:
+        print(f"[Jobs] Failed to claim {job_id}: {e}")
+        return
+    if job is None:
+        return
+
+    handler = _handlers.get(job.get('type'))
+    if handler is None:
+        job_ref.update({'status': 'failed', 'error': f"No handler for {job.get('type')}",
+                        'updated_at': int(time.time())})
+        return
+
+    ctx = JobContext(job_id, job_ref, job.get('payload') or {}, job.get('progress'))
+    try:
+        result = handler(ctx)
+    except Exception as e:
+        attempts = job['attempts']
+        print(f"[Jobs] {job_id} attempt {attempts} failed: {e}")
+        if attempts >= MAX_ATTEMPTS:
+            job_ref.update({'status': 'failed', 'error': str(e), 'updated_at': int(time.time())})
+            return
+        delay = min(2 ** attempts * 5, 600)
+        job_ref.update({
+            'status': 'queued',
+            'error': str(e),
+            'lease_until': int(time.time()) + delay + START_GRACE_SECONDS,
+            'updated_at': int(time.time()),
+        })
+        _submit(job_id, delay=delay)
+        return
+
+    job_ref.update({
+        'status': 'done',
+        'progress': ctx.progress,
+        'result': result or {},
+        'error': None,
+        'finished_at': int(time.time()),
+        'updated_at': int(time.time()),
+    })
+
+
+def recover_jobs(limit=50):
+    """
+    Picks up queued jobs nobody claimed and running jobs whose lease expired
+    (e.g. the worker process was restarted). Runs from the scheduler.
+    """
+    now = int(time.time())
+    docs = _db().collection('jobs')\
+        .where(filter=FieldFilter('status', 'in', ['queued', 'running']))\
+        .where(filter=FieldFilter('lease_until', '<', now))\
+        .limit(limit).stream()
+
+    count = 0
+    for doc in docs:
+        _submit(doc.id)
+        count += 1
+    if count:
+        print(f"[Jobs] Recovered {count} pending jobs.")
+    return count
@@ -0,0 +1,106 @@
+"""
+Who is attending which event.
+
+Attendance used to be a `participants` array on the event document, shipped
+with every event response and growing toward the 1 MiB document limit. It is
+now stored as two documents per (event, user), written together:
+
+  events/{event_id}/bookings/{uid}         the booking itself (spots, guests);
+                                           listing an event's attendees pages
+                                           over this subcollection
+  users/{uid}/joined_events/{event_id}     membership index for "my events"
+
+Event documents only keep attendeeCount (see sharded_counters.py).
+"""
+
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+GET_ALL_CHUNK_SIZE = 100
+
+
+def _db():
+    return firestore.client()
+
+
+def booking_ref(event_ref, uid):
+    return event_ref.collection('bookings').document(uid)
+
+
+def membership_ref(db, uid, event_id):
+    return db.collection('users').document(uid).collection('joined_events').document(event_id)
+
+
+def add_member(db, writer, event_id, uid, event):
+    """Adds the index entry; `writer` is a batch or transaction."""
+    writer.set(membership_ref(db, uid, event_id), {
+        'eventId': event_id,
+        'date': event.get('date'),
+        'joinedAt': firestore.SERVER_TIMESTAMP,
+    })
+
+
+def remove_member(db, writer, event_ref, uid):
+    """Deletes the booking and its index entry; `writer` is a batch or transaction."""
+    writer.delete(booking_ref(event_ref, uid))
+    writer.delete(membership_ref(db, uid, event_ref.id))
+
+
+def leave(event_ref, uid):
+    """
+    Removes the user's booking; returns the spots it held, or None if the user
+    had no booking. Transactional, so a double-submitted leave frees spots once.
+    """
+    db = _db()
+    ref = booking_ref(event_ref, uid)
+
+    @firestore.transactional
+    def _txn(transaction):
+        snap = ref.get(transaction=transaction)
+        if not snap.exists:
+            return None
+        remove_member(db, transaction, event_ref, uid)
+        return int(snap.to_dict().get('totalSpots', 1))
+
+    return _txn(db.transaction())
+
+
+def member_page(event_ref, limit, after=None):
+    """(uids, has_more) for one page of the event's bookings, in uid order."""
+    query = event_ref.collection('bookings')\
+        .select([FieldPath.document_id()])\
+        .order_by(FieldPath.document_id())\
+        .limit(limit + 1)
+    if after:
+        query = query.start_after({FieldPath.document_id(): after})
+    uids = [doc.id for doc in query.stream()]
+    return uids[:limit], len(uids) > limit
+
+
+def iter_member_uids(event_ref, page_size=500):
+    after = None
+    while True:
+        uids, has_more = member_page(event_ref, page_size, after)
+        yield from uids
+        if not has_more:
+            return
+        after = uids[-1]
+
+
+def joined_events(uid, field_paths=None):
+    """
+    Event dicts (with 'id') the user has joined, via the membership index.
+    field_paths limits which event fields are read.
+    """
+    db = _db()
+    entries = db.collection('users').document(uid).collection('joined_events').stream()
+    refs = [db.collection('events').document(entry.id) for entry in entries]
+    events = []
+    for i in range(0, len(refs), GET_ALL_CHUNK_SIZE):
+        for snap in db.get_all(refs[i:i + GET_ALL_CHUNK_SIZE], field_paths=field_paths):
+            # Entries of deleted events are skipped, not returned
+            if snap.exists:
+                d = snap.to_dict()
+                d['id'] = snap.id
+                events.append(d)
+    return events
@@ -0,0 +1,303 @@
+"""
+Batched notification writer.
+
+create_notification used to cost one Firestore write RPC per call, and most
+callers call it in loops (refunds in delete_event, scheduler timeouts, the
+wishlist fan-out). The writer collects notifications and commits them in
+WriteBatches of up to 500, so cancelling a 300-ticket event is one commit.
+
+Where an added notification goes, in order:
+  1. an explicit `with notification_writer.batch():` block on this thread
+     (scheduler jobs, background workers) — flushed when the block exits,
+  2. the background queue, when NOTIFICATION_WRITER_MODE=background — a
+     flusher thread commits every FLUSH_INTERVAL seconds or BATCH_SIZE items,
+  3. the current request (default mode, `request`) — flushed in
+     teardown_request, after the view has returned,
+  4. otherwise it is written immediately.
+
+The background queue is bounded: when it is full, add() waits up to
+ENQUEUE_TIMEOUT and then writes the notification itself (backpressure lands
+on the producer instead of growing memory). stats() reports queue depth,
+commit counts and flush latency.
+
+Every commit also bumps the recipients' unread counters
+(notification_counters/{uid}) in the same batch, so the bell badge reads one
+document instead of a page of notifications. A counter only counts once it
+has been rebuilt from the notifications (`initialized`); until then, or if it
+ever goes negative, reads recount. scripts/backfill_unread_counters.py
+initializes every user's counter up front.
+"""
+
+import os
+import time
+import queue
+import atexit
+import threading
+from contextlib import contextmanager
+from flask import g, has_request_context
+from firebase_admin import firestore
+from google.cloud.firestore import FieldFilter
+
+BATCH_SIZE = 500  # Firestore WriteBatch limit
+MODE = os.getenv('NOTIFICATION_WRITER_MODE', 'request')
+MAX_QUEUE = int(os.getenv('NOTIFICATION_QUEUE_SIZE', 10000))
+FLUSH_INTERVAL = float(os.getenv('NOTIFICATION_FLUSH_INTERVAL', 1.0))
+ENQUEUE_TIMEOUT = 2.0
+COMMIT_RETRIES = 3
+COUNTERS_COLLECTION = 'notification_counters'
+
+REQUIRED_INDEXES = [
+    # Feed: recipient's notifications, newest first
+    {'collectionGroup': 'notifications', 'queryScope': 'COLLECTION', 'fields': [
+        {'fieldPath': 'recipientId', 'order': 'ASCENDING'},
+        {'fieldPath': 'createdAt', 'order': 'DESCENDING'},
+    ]},
+]
+
+
+def counter_ref(db, uid):
+    return db.collection(COUNTERS_COLLECTION).document(uid)
+
+
+def recount_unread(db, uid):
+    """Rebuilds a user's unread counter from the notifications themselves."""
+    query = db.collection('notifications')\
+        .where(filter=FieldFilter('recipientId', '==', uid))\
+        .where(filter=FieldFilter('read', '==', False))
+    unread = int(query.count().get()[0][0].value)
+    counter_ref(db, uid).set({'unread': unread, 'initialized': True})
+    return unread
+
+
+def get_unread_count(db, uid):
+    snap = counter_ref(db, uid).get()
+    data = snap.to_dict() if snap.exists else {}
+    unread = int(data.get('unread', 0))
+    # Counters first created by an increment (users from before counters
+    # existed) never saw the older unread notifications; rebuild those
+    if not data.get('initialized') or unread < 0:
+        return recount_unread(db, uid)
+    return unread
+
+
+class NotificationWriter:
+    def __init__(self, mode=MODE, max_queue=MAX_QUEUE, flush_interval=FLUSH_INTERVAL):
+        self.mode = mode
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._local = threading.local()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'commits': 0,
+            'failed': 0,
+            'backpressure_waits': 0,
+            'backpressure_sync_writes': 0,
+            'flush_ms_last': 0.0,
+            'flush_ms_total': 0.0,
+        }
+
+    # ---- setup -----------------------------------------------------------
+
+    def init_app(self, app):
+        app.teardown_request(self._flush_request)
+        if self.mode == 'background':
+            self.start()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='notification-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.drain)
+
+    # ---- producers -------------------------------------------------------
+
+    def add(self, notification, doc_id=None):
+        """Queues one notification dict (see build_notification)."""
+        item = (doc_id, notification)
+        self._count('enqueued')
+
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers:
+            buffers[-1].append(item)
+            return
+
+        if self.mode == 'background' and self._thread is not None:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                self._count('backpressure_waits')
+            try:
+                self._queue.put(item, timeout=ENQUEUE_TIMEOUT)
+                return
+            except queue.Full:
+                self._count('backpressure_sync_writes')
+                self.write_many([item])
+                return
+
+        if self.mode == 'request' and has_request_context():
+            if 'notification_buffer' not in g:
+                g.notification_buffer = []
+            g.notification_buffer.append(item)
+            return
+
+        self.write_many([item])
+
+    @contextmanager
+    def batch(self):
+        """Buffers every notification added on this thread until the block exits."""
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = []
+        buffers.append([])
+        try:
+            yield
+        finally:
+            items = buffers.pop()
+            if items:
+                self.write_many(items)
+
+    # ---- writing ---------------------------------------------------------
+
+    def write_many(self, items):
+        """
+        Commits (doc_id, notification) pairs in batches of up to BATCH_SIZE
+        operations, unread counter updates included. A doc_id makes the write
+        idempotent (already-written ids are skipped); None gets an auto id.
+        Returns the number of commits made.
+        """
+        if not items:
+            return 0
+        db = firestore.client()
+        notifications_ref = db.collection('notifications')
+        commits = 0
+        for chunk in self._chunks(self._skip_existing(db, notifications_ref, items)):
+            started = time.monotonic()
+            if not self._commit_chunk(db, notifications_ref, chunk):
+                continue
+            commits += 1
+            elapsed_ms = (time.monotonic() - started) * 1000
+            with self._stats_lock:
+                self._stats['written'] += len(chunk)
+                self._stats['commits'] += 1
+                self._stats['flush_ms_last'] = round(elapsed_ms, 2)
+                self._stats['flush_ms_total'] += elapsed_ms
+        return commits
+
+    @staticmethod
+    def _skip_existing(db, notifications_ref, items):
+        # Re-delivering a notification with a fixed id (retried jobs) must not
+        # reset its read flag or count it as unread twice
+        keyed = [notifications_ref.document(doc_id) for doc_id, _ in items if doc_id]
+        if not keyed:
+            return items
+        existing = set()
+        for i in range(0, len(keyed), BATCH_SIZE):
+            for snap in db.get_all(keyed[i:i + BATCH_SIZE], field_paths=['read']):
+                if snap.exists:
+                    existing.add(snap.id)
+        return [item for item in items if not item[0] or item[0] not in existing]
+
+    @staticmethod
+    def _chunks(items):
+        """Splits items so notifications plus counter updates fit in one batch."""
+        chunk, recipients = [], set()
+        for item in items:
+            new_recipient = item[1].get('recipientId') not in recipients
+            if len(chunk) + len(recipients) + 1 + new_recipient > BATCH_SIZE:
+                yield chunk
+                chunk, recipients = [], set()
+            chunk.append(item)
+            recipients.add(item[1].get('recipientId'))
+        if chunk:
+            yield chunk
+
+    def _commit_chunk(self, db, notifications_ref, chunk):
+        unread = {}
+        for _, data in chunk:
+            if not data.get('read'):
+                unread[data['recipientId']] = unread.get(data['recipientId'], 0) + 1
+
+        for attempt in range(1, COMMIT_RETRIES + 1):
+            batch = db.batch()
+            for doc_id, data in chunk:
+                ref = notifications_ref.document(doc_id) if doc_id else notifications_ref.document()
+                batch.set(ref, data)
+            for uid, count in unread.items():
+                batch.set(counter_ref(db, uid), {'unread': firestore.Increment(count)}, merge=True)
+            try:
+                batch.commit()
+                return True
+            except Exception as e:
+                if attempt == COMMIT_RETRIES:
+                    self._count('failed', len(chunk))
+                    print(f"[Notifications] Dropped {len(chunk)} notifications after {attempt} attempts: {e}")
+                    return False
+                time.sleep(0.2 * attempt)
+
+    def _flush_request(self, exc=None):
+        items = g.pop('notification_buffer', None)
+        if items:
+            try:
+                self.write_many(items)
+            except Exception as e:
+                print(f"[Notifications] Request flush failed: {e}")
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            items = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(items) < BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.write_many(items)
+            except Exception as e:
+                print(f"[Notifications] Background flush failed: {e}")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def drain(self):
+        """Writes whatever is still queued (called at interpreter exit)."""
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+                self._queue.task_done()
+            except queue.Empty:
+                break
+        if items:
+            self.write_many(items)
+
+    # ---- metrics ---------------------------------------------------------
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def stats(self):
+        with self._stats_lock:
+            data = dict(self._stats)
+        total_ms = data.pop('flush_ms_total')
+        data['flush_ms_avg'] = round(total_ms / data['commits'], 2) if data['commits'] else 0.0
+        data['mode'] = self.mode
+        data['queue_depth'] = self._queue.qsize()
+        data['queue_max'] = self._queue.maxsize
+        return data
+
+
+notification_writer = NotificationWriter()
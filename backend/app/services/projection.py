@@ -0,0 +1,80 @@
+"""
+Field projection for list endpoints.
+
+Cards only render a handful of fields, but list endpoints used to return
+whole documents (descriptions, every media URL, Base64 venue images). A list
+request can now ask for
+
+  ?view=card            a named set of fields (see EVENT_VIEWS / VENUE_VIEWS)
+  ?fields=title,date    an explicit set of top-level fields
+
+and the fields are applied as a Firestore field mask (`select()` on queries,
+`field_paths` on get_all), so only those fields are read, sent and
+JSON-encoded. Without either parameter the endpoint returns whole documents,
+as before. The document id is always included.
+"""
+
+import re
+
+FULL = 'full'
+MAX_FIELDS = 30
+
+EVENT_VIEWS = {
+    'card': ('title', 'date', 'city', 'hobby', 'venue', 'price', 'ticket_price', 'is_paid',
+             'currency', 'mediaUrls', 'attendeeCount', 'maxParticipants', 'hostId'),
+    FULL: None,
+}
+
+VENUE_VIEWS = {
+    'card': ('name', 'location', 'city', 'capacity', 'price_per_hour', 'images', 'owner_id'),
+    FULL: None,
+}
+
+_FIELD_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]{0,63}$')
+
+
+class ProjectionError(ValueError):
+    pass
+
+
+def parse_projection(args, views):
+    """
+    Reads `fields` / `view` from the request args. Returns a tuple of field
+    names, or None for whole documents. Raises ProjectionError.
+    """
+    fields = args.get('fields')
+    view = args.get('view')
+    if fields:
+        names = [f.strip() for f in fields.split(',') if f.strip()]
+        bad = [f for f in names if not _FIELD_NAME.match(f)]
+        if bad:
+            raise ProjectionError(f"Invalid field names: {', '.join(bad)}")
+        if len(names) > MAX_FIELDS:
+            raise ProjectionError(f"At most {MAX_FIELDS} fields can be requested")
+        # 'id' is the document id, not a stored field
+        return tuple(dict.fromkeys(f for f in names if f != 'id'))
+    if view:
+        if view not in views:
+            raise ProjectionError(f"Unknown view '{view}'. Available: {', '.join(sorted(views))}")
+        return views[view]
+    return None
+
+
+def field_mask(fields, extra=()):
+    """Fields to read: the requested ones plus any the handler needs itself."""
+    if fields is None:
+        return None
+    return sorted(set(fields) | set(extra))
+
+
+def select(query, fields, extra=()):
+    mask = field_mask(fields, extra)
+    return query if mask is None else query.select(mask)
+
+
+def project(doc_id, data, fields):
+    """The response dict: the requested fields (or all of them) plus 'id'."""
+    if fields is not None:
+        data = {k: data[k] for k in fields if k in data}
+    data['id'] = doc_id
+    return data
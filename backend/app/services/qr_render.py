@@ -0,0 +1,142 @@
+"""
+Ticket QR rendering.
+
+A ticket's QR code depends only on what it encodes and how it is drawn, yet
+GET /api/tickets/<id>/qr rebuilt it (ERROR_CORRECT_H, PNG-encoded with
+Pillow) on every request, and at the door hundreds of attendees reopen their
+tickets at once. Renders are now content-addressed: the key is a SHA-256 of
+(format, drawing options, payload), so an entry never goes stale and the key
+doubles as a strong ETag.
+
+  memory  per-process LRU of rendered bytes (QR_CACHE_SIZE entries)
+  disk    optional spill directory (QR_CACHE_DIR), shared by the workers on
+          a host and kept across restarts; files are written atomically
+
+What a ticket encodes is its signed token (services/ticket_tokens.py).
+Tickets are pre-rendered at issuance on a small background pool, so the
+first open is usually a cache hit. Formats: png, and svg (vector, no Pillow).
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.services.cache import TTLCache
+
+CACHE_SIZE = int(os.getenv('QR_CACHE_SIZE', 4096))
+CACHE_DIR = os.getenv('QR_CACHE_DIR')
+RENDER_WORKERS = int(os.getenv('QR_RENDER_WORKERS', 2))
+# Content-addressed entries never change; the TTL only bounds idle memory
+MEMORY_TTL = 24 * 3600
+
+BOX_SIZE = 10
+BORDER = 4
+
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+DEFAULT_FORMAT = 'png'
+
+# Safe to cache anywhere the response is: the bytes behind a key never change
+CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+_memory = TTLCache(maxsize=CACHE_SIZE, ttl=MEMORY_TTL)
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix='qr')
+        return _executor
+
+
+def cache_key(payload, fmt=DEFAULT_FORMAT):
+    """Content address of a render; also its ETag."""
+    spec = f"{fmt}|H|{BOX_SIZE}|{BORDER}|{payload}"
+    return hashlib.sha256(spec.encode('utf-8')).hexdigest()
+
+
+def _render(payload, fmt):
+    import qrcode
+    factory = None
+    if fmt == 'svg':
+        from qrcode.image.svg import SvgPathImage
+        factory = SvgPathImage
+
+    qr = qrcode.QRCode(
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        box_size=BOX_SIZE,
+        border=BORDER,
+        image_factory=factory,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+
+    out = io.BytesIO()
+    if fmt == 'svg':
+        qr.make_image().save(out)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(out, 'PNG')
+    return out.getvalue()
+
+
+def _disk_path(key, fmt):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.{fmt}")
+
+
+def _disk_get(key, fmt):
+    if not CACHE_DIR:
+        return None
+    try:
+        with open(_disk_path(key, fmt), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        print(f"QR disk cache read failed: {e}")
+        return None
+
+
+def _disk_put(key, fmt, data):
+    if not CACHE_DIR:
+        return
+    path = _disk_path(key, fmt)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"QR disk cache write failed: {e}")
+
+
+def get_qr(payload, fmt=DEFAULT_FORMAT):
+    """(bytes, etag) for the QR code of `payload`, rendering it on a miss."""
+    key = cache_key(payload, fmt)
+    data = _memory.get(key)
+    if data is None:
+        data = _disk_get(key, fmt)
+        if data is None:
+            data = _render(payload, fmt)
+            _disk_put(key, fmt, data)
+        _memory.set(key, data)
+    return data, key
+
+
+def _prerender(payload, fmt):
+    try:
+        get_qr(payload, fmt)
+    except Exception as e:
+        print(f"QR pre-render failed: {e}")
+
+
+def prerender(payload, fmt=DEFAULT_FORMAT):
+    """Renders in the background so the first request is a cache hit."""
+    _pool().submit(_prerender, payload, fmt)
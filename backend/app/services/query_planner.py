@@ -0,0 +1,208 @@
+"""
+Query planning for the public list endpoints.
+
+Firestore can only apply range (inequality) filters on the field a query is
+ordered by first. The planner pushes every filter it can into the query as a
+`where(...)` and leaves the rest as "residual" filters for Python. A fully
+pushed-down plan reads exactly `limit + 1` documents; a plan with residual
+filters reads at most MAX_SCAN documents per page and hands back a cursor to
+continue from.
+
+`required_indexes()` lists the composite indexes these plans need and is used
+by scripts/generate_indexes.py to write firestore.indexes.json.
+"""
+
+from itertools import combinations
+from datetime import datetime, timedelta
+from firebase_admin import firestore
+from google.cloud.firestore import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+
+# Upper bound on documents read per page when some filters stay in Python
+MAX_SCAN = 300
+
+# Highest code point Firestore sorts strings by; used for prefix ranges
+PREFIX_END = '\uf8ff'
+
+EVENT_EQUALITY_FIELDS = ('city', 'hobby', 'is_paid')
+EVENT_SORT_FIELDS = {'date': 'date', 'price': 'ticket_price', 'popularity': 'attendeeCount'}
+
+VENUE_EQUALITY_FIELDS = ('city',)
+VENUE_SORT_FIELDS = {'created_at': 'created_at', 'price': 'price_per_hour', 'capacity': 'capacity'}
+
+
+class QueryPlan:
+    """What the planner decided; reported back to the caller for logging/headers."""
+
+    def __init__(self, order_field):
+        self.order_field = order_field
+        self.pushed = []     # filter names applied in Firestore
+        self.residual = []   # filter names left for Python
+
+    @property
+    def bounded(self):
+        return not self.residual
+
+    def describe(self):
+        parts = [f"order={self.order_field}"]
+        if self.pushed:
+            parts.append('db=' + ','.join(self.pushed))
+        if self.residual:
+            parts.append('python=' + ','.join(self.residual))
+        return ';'.join(parts)
+
+
+def date_range(date_filter, now=None):
+    """
+    Translates the `date_filter` param into (lower, upper) bounds on the ISO
+    `date` string, each bound being (op, value) or None.
+    Returns None when there is nothing to filter.
+    """
+    now = now or datetime.utcnow()
+    if date_filter == 'upcoming':
+        return ('>=', now.isoformat()), None
+    if date_filter == 'past':
+        return None, ('<', now.isoformat())
+    if date_filter == 'today':
+        day = now.date().isoformat()
+        return ('>=', day), ('<', day + PREFIX_END)
+    if date_filter == 'this_week':
+        return ('>=', now.isoformat()), ('<', (now + timedelta(days=7)).isoformat())
+    if date_filter and len(date_filter) == 10:
+        return ('>=', date_filter), ('<', date_filter + PREFIX_END)
+    return None
+
+
+def in_date_range(value, dates):
+    """Python equivalent of the range filters built from date_range()."""
+    value = value or ''
+    for bound in dates or ():
+        if not bound:
+            continue
+        op, limit = bound
+        if op == '>=' and not value >= limit:
+            return False
+        if op == '<' and not value < limit:
+            return False
+    return True
+
+
+def parse_float(value):
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_int(value):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def plan_events_query(query, city=None, hobby=None, is_paid=None, dates=None,
+                      max_price=None, sort_by='date', direction='ASCENDING'):
+    """
+    Applies equality filters, ordering and whichever range filters the order
+    allows. `dates` comes from date_range(), `max_price` from parse_float().
+    Returns (query, plan); the caller still adds the cursor/limit.
+    """
+    if city:
+        query = query.where(filter=FieldFilter('city', '==', city))
+    if hobby:
+        query = query.where(filter=FieldFilter('hobby', '==', hobby))
+    if is_paid is not None:
+        query = query.where(filter=FieldFilter('is_paid', '==', is_paid))
+
+    order_field = EVENT_SORT_FIELDS.get(sort_by, 'date')
+    plan = QueryPlan(order_field)
+
+    if dates:
+        if order_field == 'date':
+            for bound in dates:
+                if bound:
+                    query = query.where(filter=FieldFilter('date', bound[0], bound[1]))
+            plan.pushed.append('date')
+        else:
+            plan.residual.append('date')
+
+    if max_price is not None:
+        if order_field == 'ticket_price':
+            query = query.where(filter=FieldFilter('ticket_price', '<=', max_price))
+            plan.pushed.append('max_price')
+        else:
+            plan.residual.append('max_price')
+
+    fs_direction = getattr(firestore.Query, direction)
+    query = query.order_by(order_field, direction=fs_direction)
+    # Order by document ID for stable cursor pagination
+    query = query.order_by(FieldPath.document_id(), direction=fs_direction)
+    return query, plan
+
+
+def plan_venues_query(query, city=None, min_capacity=None, min_price=None, max_price=None,
+                      q=None, sort_by='created_at', direction='DESCENDING'):
+    """
+    Same idea as plan_events_query for venues. Capacity and price ranges are
+    pushed down only when the venue list is sorted by that field; `q` can
+    never be. Callers answer plans with residual filters from the in-memory
+    VenueIndex instead of scanning the collection.
+    """
+    if city:
+        query = query.where(filter=FieldFilter('city', '==', city))
+
+    order_field = VENUE_SORT_FIELDS.get(sort_by, 'created_at')
+    plan = QueryPlan(order_field)
+
+    if min_capacity is not None:
+        if order_field == 'capacity':
+            query = query.where(filter=FieldFilter('capacity', '>=', min_capacity))
+            plan.pushed.append('min_capacity')
+        else:
+            plan.residual.append('min_capacity')
+
+    for name, op, value in (('min_price', '>=', min_price), ('max_price', '<=', max_price)):
+        if value is None:
+            continue
+        if order_field == 'price_per_hour':
+            query = query.where(filter=FieldFilter('price_per_hour', op, value))
+            plan.pushed.append(name)
+        else:
+            plan.residual.append(name)
+
+    if q:
+        plan.residual.append('q')
+
+    fs_direction = getattr(firestore.Query, direction)
+    query = query.order_by(order_field, direction=fs_direction)
+    query = query.order_by(FieldPath.document_id(), direction=fs_direction)
+    return query, plan
+
+
+def _composite(collection, equality, order_field, direction):
+    fields = [{'fieldPath': f, 'order': 'ASCENDING'} for f in equality]
+    fields.append({'fieldPath': order_field, 'order': direction})
+    return {'collectionGroup': collection, 'queryScope': 'COLLECTION', 'fields': fields}
+
+
+def _indexes_for(collection, equality_fields, order_fields):
+    indexes = []
+    for size in range(1, len(equality_fields) + 1):
+        for combo in combinations(equality_fields, size):
+            for order_field in order_fields:
+                for direction in ('ASCENDING', 'DESCENDING'):
+                    indexes.append(_composite(collection, combo, order_field, direction))
+    return indexes
+
+
+def required_indexes():
+    """Composite indexes for every plan the list endpoints can produce."""
+    return (
+        _indexes_for('events', EVENT_EQUALITY_FIELDS, sorted(set(EVENT_SORT_FIELDS.values())))
+        + _indexes_for('venues', VENUE_EQUALITY_FIELDS, sorted(set(VENUE_SORT_FIELDS.values())))
+    )
@@ -0,0 +1,206 @@
+"""
+Event reminders, sent REMINDER_LEAD_HOURS before an event starts.
+
+Events are filed into hourly buckets by start time when they are created or
+rescheduled (reminder_buckets/{YYYY-MM-DDTHH}/events/{event_id}). The hourly
+scheduler job reads only the buckets that have come due since its last run,
+so its cost follows the number of events starting in that hour, never the
+size of the `events` collection.
+
+Delivery is idempotent: a marker per (event, user) is written before the
+notification and email go out, notifications use deterministic ids, and a
+bucket entry is stamped once its event is done, so re-runs and catch-up runs
+don't remind anyone twice.
+"""
+
+import datetime
+from firebase_admin import firestore
+from google.cloud.firestore import FieldFilter
+
+REMINDER_LEAD_HOURS = 24
+BUCKET_FORMAT = '%Y-%m-%dT%H'
+# Upper bound on buckets one run catches up on after downtime
+MAX_BUCKETS_PER_RUN = 48
+BATCH_SIZE = 500
+GET_ALL_CHUNK_SIZE = 100
+
+
+def _db():
+    return firestore.client()
+
+
+def parse_event_date(value):
+    """Event `date` strings are ISO (naive = UTC). Returns a naive UTC datetime or None."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def bucket_for(event_date):
+    parsed = parse_event_date(event_date)
+    return parsed.strftime(BUCKET_FORMAT) if parsed else None
+
+
+def _bucket_entry(bucket, event_id):
+    return _db().collection('reminder_buckets').document(bucket).collection('events').document(event_id)
+
+
+def schedule_reminder(event_id, event, previous_date=None):
+    """Files the event under its start hour; moves it if the date changed."""
+    old_bucket = bucket_for(previous_date) if previous_date else None
+    new_bucket = bucket_for(event.get('date'))
+    if old_bucket and old_bucket != new_bucket:
+        _bucket_entry(old_bucket, event_id).delete()
+    if new_bucket:
+        _bucket_entry(new_bucket, event_id).set({
+            'title': event.get('title'),
+            'date': event.get('date'),
+        })
+
+
+def cancel_reminder(event_id, event_date):
+    bucket = bucket_for(event_date)
+    if bucket:
+        _bucket_entry(bucket, event_id).delete()
+
+
+def _recipients(db, event_id, event):
+    from app.services.memberships import iter_member_uids
+
+    recipients = set(iter_member_uids(db.collection('events').document(event_id)))
+    tickets = db.collection('tickets')\
+        .where(filter=FieldFilter('event_id', '==', event_id))\
+        .where(filter=FieldFilter('status', '==', 'active'))\
+        .select(['user_id'])\
+        .stream()
+    for t in tickets:
+        holder = t.to_dict().get('user_id')
+        if holder:
+            recipients.add(holder)
+    return recipients
+
+
+def _claim_recipients(db, event_id, recipients):
+    """Writes (event, user) markers for users not reminded yet; returns those users."""
+    markers = db.collection('reminder_markers')
+    uids = sorted(recipients)
+    already = set()
+    for i in range(0, len(uids), GET_ALL_CHUNK_SIZE):
+        refs = [markers.document(f"{event_id}_{uid}") for uid in uids[i:i + GET_ALL_CHUNK_SIZE]]
+        for snap in db.get_all(refs, field_paths=['sent_at']):
+            if snap.exists:
+                already.add(snap.id[len(event_id) + 1:])
+
+    todo = [uid for uid in uids if uid not in already]
+    now = datetime.datetime.utcnow().isoformat()
+    for i in range(0, len(todo), BATCH_SIZE):
+        batch = db.batch()
+        for uid in todo[i:i + BATCH_SIZE]:
+            batch.set(markers.document(f"{event_id}_{uid}"), {
+                'event_id': event_id, 'user_id': uid, 'sent_at': now
+            })
+        batch.commit()
+    return todo
+
+
+def _remind_event(db, event_id, event):
+    from app.blueprints.notifications.routes import build_notification
+    from app.services.notification_writer import notification_writer
+    from app.services.email_service import EmailService
+    from app.services.user_cache import get_user_profiles
+
+    recipients = _recipients(db, event_id, event)
+    recipients.discard(event.get('hostId'))
+    todo = _claim_recipients(db, event_id, recipients)
+    if not todo:
+        return 0
+
+    title = event.get('title')
+    notification_writer.write_many([
+        (f"reminder_{event_id}_{uid}",
+         build_notification(uid, 'Event Reminder', f'"{title}" starts in {REMINDER_LEAD_HOURS} hours.',
+                            'event_reminder', event_id))
+        for uid in todo
+    ])
+
+    profiles = get_user_profiles(todo, fields=('displayName', 'email'))
+    recipients = []
+    for uid in todo:
+        profile = profiles.get(uid) or {}
+        recipients.append((profile.get('email'), {'user_name': profile.get('displayName') or 'there'}))
+    EmailService.send_bulk(
+        recipients,
+        subject=f"Reminder: {title} is tomorrow",
+        template_name='event_reminder',
+        shared_context={'event_name': title, 'date': event.get('date'), 'venue': event.get('venue')},
+    )
+    return len(todo)
+
+
+def _due_buckets(db, now):
+    """Buckets from the one after the last processed up to now + lead time."""
+    target = (now + datetime.timedelta(hours=REMINDER_LEAD_HOURS)).replace(minute=0, second=0, microsecond=0)
+    state = db.collection('reminder_state').document('cursor').get()
+    last = state.to_dict().get('last_bucket') if state.exists else None
+
+    if last:
+        start = datetime.datetime.strptime(last, BUCKET_FORMAT) + datetime.timedelta(hours=1)
+        start = max(start, target - datetime.timedelta(hours=MAX_BUCKETS_PER_RUN - 1))
+    else:
+        start = target
+
+    buckets = []
+    current = start
+    while current <= target:
+        buckets.append(current.strftime(BUCKET_FORMAT))
+        current += datetime.timedelta(hours=1)
+    return buckets
+
+
+def send_event_reminders(now=None):
+    """Scheduler job: reminds attendees of events starting in the due buckets."""
+    db = _db()
+    now = now or datetime.datetime.utcnow()
+    report = {'job': 'event_reminders', 'buckets': 0, 'events': 0, 'reminded': 0, 'failed': 0}
+
+    for bucket in _due_buckets(db, now):
+        entries = [e for e in db.collection('reminder_buckets').document(bucket)
+                   .collection('events').stream() if not e.to_dict().get('sent_at')]
+        refs = [db.collection('events').document(e.id) for e in entries]
+        events = {}
+        for i in range(0, len(refs), GET_ALL_CHUNK_SIZE):
+            for snap in db.get_all(refs[i:i + GET_ALL_CHUNK_SIZE]):
+                if snap.exists:
+                    events[snap.id] = snap.to_dict()
+
+        bucket_ok = True
+        for entry in entries:
+            event = events.get(entry.id)
+            # Deleted or rescheduled since it was filed here
+            if event is None or bucket_for(event.get('date')) != bucket:
+                entry.reference.delete()
+                continue
+            try:
+                report['reminded'] += _remind_event(db, entry.id, event)
+                report['events'] += 1
+                entry.reference.update({'sent_at': datetime.datetime.utcnow().isoformat()})
+            except Exception as e:
+                bucket_ok = False
+                report['failed'] += 1
+                print(f"[Reminders] Failed for event {entry.id}: {e}")
+
+        if not bucket_ok:
+            # Retry this bucket next run; markers keep delivered users from repeats
+            break
+        db.collection('reminder_state').document('cursor').set({'last_bucket': bucket})
+        report['buckets'] += 1
+
+    if report['events'] or report['failed']:
+        print(f"[Reminders] Sent {report['reminded']} reminders for {report['events']} events.")
+    return report
@@ -0,0 +1,143 @@
+"""
+Response cache for the public listing endpoints (Roadmap Phase 6).
+
+`GET /api/events` and `GET /api/venues` serve the same first pages to every
+visitor. Responses are cached per normalized query string with a TTL, carry a
+strong ETag (so repeat polls get a 304), and are invalidated by bumping a
+per-namespace generation whenever a write changes what those lists show.
+
+Backends:
+  local (default)  per-process LRU (TTLCache)
+  redis            shared across workers when RESPONSE_CACHE_REDIS_URL is set
+                   and the `redis` package is installed
+"""
+
+import hashlib
+import json
+import os
+from functools import wraps
+from flask import request, make_response
+from app.services.cache import TTLCache
+
+DEFAULT_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 30))
+
+# Headers worth replaying from the original response
+REPLAY_HEADERS = ('X-Query-Plan',)
+
+
+class LocalCacheBackend:
+    def __init__(self, maxsize=2048):
+        self._entries = TTLCache(maxsize=maxsize, ttl=DEFAULT_TTL)
+        self._generations = {}
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, value, ttl):
+        self._entries.set(key, value, ttl=ttl)
+
+    def generation(self, namespace):
+        return self._generations.get(namespace, 0)
+
+    def bump(self, namespace):
+        self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+
+class RedisCacheBackend:
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._redis.get(key)
+        return json.loads(raw) if raw else None
+
+    def set(self, key, value, ttl):
+        self._redis.set(key, json.dumps(value), ex=ttl)
+
+    def generation(self, namespace):
+        return int(self._redis.get(f"respcache:gen:{namespace}") or 0)
+
+    def bump(self, namespace):
+        self._redis.incr(f"respcache:gen:{namespace}")
+
+
+def _make_backend():
+    url = os.getenv('RESPONSE_CACHE_REDIS_URL')
+    if url:
+        try:
+            return RedisCacheBackend(url)
+        except Exception as e:
+            print(f"WARNING: Redis response cache unavailable ({e}). Using in-process cache.")
+    return LocalCacheBackend()
+
+
+class ResponseCache:
+    def __init__(self, backend=None):
+        self.backend = backend or _make_backend()
+
+    @staticmethod
+    def _normalized_args():
+        # Same filters in any order / with empty params hit the same entry
+        items = sorted((k, v) for k, v in request.args.items(multi=True) if v != '')
+        return '&'.join(f"{k}={v}" for k, v in items)
+
+    def cached(self, namespace, ttl=DEFAULT_TTL):
+        """
+        Caches successful responses of a view that doesn't vary by user.
+        Apply below the route decorator.
+        """
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                try:
+                    generation = self.backend.generation(namespace)
+                    key = f"respcache:{namespace}:{generation}:{request.path}?{self._normalized_args()}"
+                    entry = self.backend.get(key)
+                except Exception as e:
+                    print(f"Response cache read failed: {e}")
+                    return f(*args, **kwargs)
+
+                if entry is None:
+                    response = make_response(f(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    body = response.get_data(as_text=True)
+                    entry = {
+                        'body': body,
+                        'etag': hashlib.sha1(body.encode('utf-8')).hexdigest(),
+                        'mimetype': response.mimetype,
+                        'headers': {h: response.headers[h] for h in REPLAY_HEADERS if h in response.headers},
+                    }
+                    try:
+                        self.backend.set(key, entry, ttl)
+                    except Exception as e:
+                        print(f"Response cache write failed: {e}")
+                    cache_status = 'MISS'
+                else:
+                    cache_status = 'HIT'
+
+                if request.if_none_match.contains(entry['etag']):
+                    response = make_response('', 304)
+                else:
+                    response = make_response(entry['body'], 200)
+                    response.mimetype = entry['mimetype']
+                    response.headers.update(entry['headers'])
+
+                response.set_etag(entry['etag'])
+                # Clients revalidate every time (cheap 304); the server-side TTL bounds staleness
+                response.headers['Cache-Control'] = 'public, no-cache'
+                response.headers['X-Cache'] = cache_status
+                return response
+            return decorated_function
+        return decorator
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            try:
+                self.backend.bump(namespace)
+            except Exception as e:
+                print(f"Response cache invalidation failed for {namespace}: {e}")
+
+
+response_cache = ResponseCache()
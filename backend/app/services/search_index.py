@@ -0,0 +1,312 @@
+"""
+Inverted search index for events.
+
+Events are tokenized (title, hobby and description) into weighted terms. Each
+term keeps a posting per event that also carries the few fields list_events
+filters on. A search counts each query term's postings, pages through every
+posting of the rarest term, and looks the other terms up by id for just those
+candidates; then it reads the one page of events it returns. The matches are
+cached briefly, so paging through a search costs one lookup.
+
+Backends are pluggable via SEARCH_BACKEND:
+  firestore (default)  search_index/{term}/postings/{event_id}
+                       search_docs/{event_id}  (terms last written, for diffs)
+  memory               process-local dicts, for tests and local dev
+"""
+
+import os
+import re
+import threading
+from google.cloud.firestore_v1.field_path import FieldPath
+from app.services.cache import TTLCache
+
+MAX_TERMS_PER_DOC = 300
+MIN_PREFIX_LEN = 3
+BATCH_SIZE = 500
+GET_ALL_CHUNK_SIZE = 100
+POSTINGS_PAGE_SIZE = 500
+
+# Matches per term set, so the pages of one search share a single lookup.
+# Writes in this process clear it; other workers see them after the TTL.
+_query_cache = TTLCache(
+    maxsize=int(os.getenv('SEARCH_CACHE_SIZE', 500)),
+    ttl=int(os.getenv('SEARCH_CACHE_TTL', 30)),
+)
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in',
+    'is', 'it', 'of', 'on', 'or', 'the', 'to', 'with', 'we', 'our', 'your',
+}
+
+# Fields copied into every posting so filters never need the event doc
+META_FIELDS = ('city', 'hobby', 'is_paid', 'date', 'ticket_price')
+# Fields whose change requires re-indexing on update
+INDEXED_FIELDS = ('title', 'description', 'hobby') + META_FIELDS
+
+_TOKEN_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+
+def tokenize(text):
+    """Lowercase word tokens, minus stopwords and single characters."""
+    return [t for t in _TOKEN_RE.findall(str(text or '').lower())
+            if len(t) > 1 and t not in STOPWORDS]
+
+
+def build_terms(event):
+    """
+    Returns {term: weight}. Title and hobby words also get their prefixes
+    indexed so partial queries ("yog") still match ("yoga").
+    """
+    terms = {}
+
+    def add(term, weight):
+        if weight > terms.get(term, 0):
+            terms[term] = weight
+
+    for field, weight in (('title', 3.0), ('hobby', 2.0)):
+        for token in tokenize(event.get(field)):
+            add(token, weight)
+            for i in range(MIN_PREFIX_LEN, len(token)):
+                add(token[:i], weight / 2)
+
+    for token in tokenize(event.get('description')):
+        add(token, 1.0)
+
+    if len(terms) > MAX_TERMS_PER_DOC:
+        ranked = sorted(terms.items(), key=lambda kv: (-kv[1], kv[0]))
+        terms = dict(ranked[:MAX_TERMS_PER_DOC])
+    return terms
+
+
+def build_meta(event):
+    return {f: event.get(f) for f in META_FIELDS}
+
+
+class SearchBackend:
+    """Interface every index backend implements."""
+
+    def index_document(self, doc_id, terms, meta):
+        raise NotImplementedError
+
+    def remove_document(self, doc_id):
+        raise NotImplementedError
+
+    def query(self, terms):
+        """Returns [(doc_id, score, meta)] for docs containing every term."""
+        raise NotImplementedError
+
+
+class InMemorySearchBackend(SearchBackend):
+    def __init__(self):
+        self._postings = {}   # term -> {doc_id: weight}
+        self._docs = {}       # doc_id -> (terms, meta)
+        self._lock = threading.Lock()
+
+    def index_document(self, doc_id, terms, meta):
+        with self._lock:
+            self._remove(doc_id)
+            for term, weight in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = weight
+            self._docs[doc_id] = (dict(terms), dict(meta))
+
+    def remove_document(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        old = self._docs.pop(doc_id, None)
+        if not old:
+            return
+        for term in old[0]:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+
+    def query(self, terms):
+        with self._lock:
+            postings = [self._postings.get(t, {}) for t in terms]
+            if not postings or not all(postings):
+                return []
+            postings.sort(key=len)
+            results = []
+            for doc_id, weight in postings[0].items():
+                score = weight
+                for other in postings[1:]:
+                    if doc_id not in other:
+                        break
+                    score += other[doc_id]
+                else:
+                    results.append((doc_id, score, dict(self._docs[doc_id][1])))
+            return results
+
+
+class FirestoreSearchBackend(SearchBackend):
+    def __init__(self, db=None):
+        self._db = db
+
+    @property
+    def db(self):
+        if self._db is None:
+            from firebase_admin import firestore
+            self._db = firestore.client()
+        return self._db
+
+    def _posting_ref(self, term, doc_id):
+        return self.db.collection('search_index').document(term)\
+            .collection('postings').document(doc_id)
+
+    def _commit(self, ops):
+        for i in range(0, len(ops), BATCH_SIZE):
+            batch = self.db.batch()
+            for op in ops[i:i + BATCH_SIZE]:
+                op(batch)
+            batch.commit()
+
+    def index_document(self, doc_id, terms, meta):
+        docs_ref = self.db.collection('search_docs').document(doc_id)
+        snap = docs_ref.get()
+        old_terms = set(snap.to_dict().get('terms', [])) if snap.exists else set()
+
+        ops = []
+        for term in old_terms - set(terms):
+            ref = self._posting_ref(term, doc_id)
+            ops.append(lambda b, ref=ref: b.delete(ref))
+        for term, weight in terms.items():
+            ref = self._posting_ref(term, doc_id)
+            posting = dict(meta, score=weight)
+            ops.append(lambda b, ref=ref, posting=posting: b.set(ref, posting))
+        ops.append(lambda b: b.set(docs_ref, {'terms': sorted(terms)}))
+        self._commit(ops)
+        _query_cache.clear()
+
+    def remove_document(self, doc_id):
+        docs_ref = self.db.collection('search_docs').document(doc_id)
+        snap = docs_ref.get()
+        if not snap.exists:
+            return
+        ops = []
+        for term in snap.to_dict().get('terms', []):
+            ref = self._posting_ref(term, doc_id)
+            ops.append(lambda b, ref=ref: b.delete(ref))
+        ops.append(lambda b: b.delete(docs_ref))
+        self._commit(ops)
+        _query_cache.clear()
+
+    def _postings(self, term):
+        return self.db.collection('search_index').document(term).collection('postings')
+
+    def query(self, terms):
+        if not terms:
+            return []
+        key = tuple(sorted(terms))
+        cached = _query_cache.get(key)
+        if cached is not None:
+            return list(cached)
+
+        # Rarest term first: only its postings are paged through, the other
+        # terms are looked up by id for those candidates alone
+        counts = {t: int(self._postings(t).count().get()[0][0].value) for t in terms}
+        ordered = sorted(terms, key=lambda t: counts[t])
+        results = []
+        if counts[ordered[0]]:
+            for page in self._pages(ordered[0]):
+                results.extend(self._intersect(page, ordered[1:]))
+        _query_cache.set(key, results)
+        return list(results)
+
+    def _pages(self, term):
+        """Every posting of `term`, in pages ordered by document id."""
+        query = self._postings(term).order_by(FieldPath.document_id()).limit(POSTINGS_PAGE_SIZE)
+        last = None
+        while True:
+            page = list((query.start_after(last) if last else query).stream())
+            if page:
+                yield page
+            if len(page) < POSTINGS_PAGE_SIZE:
+                return
+            last = page[-1]
+
+    def _intersect(self, page, others):
+        """(doc_id, score, meta) for the postings in `page` that every other term also has."""
+        candidates = {}
+        for doc in page:
+            posting = doc.to_dict()
+            candidates[doc.id] = (posting.get('score', 0), {f: posting.get(f) for f in META_FIELDS})
+
+        for term in others:
+            ids = sorted(candidates)
+            found = {}
+            for i in range(0, len(ids), GET_ALL_CHUNK_SIZE):
+                refs = [self._posting_ref(term, doc_id) for doc_id in ids[i:i + GET_ALL_CHUNK_SIZE]]
+                for snap in self.db.get_all(refs, field_paths=['score']):
+                    if snap.exists:
+                        found[snap.id] = snap.to_dict().get('score', 0)
+            candidates = {doc_id: (score + found[doc_id], meta)
+                          for doc_id, (score, meta) in candidates.items() if doc_id in found}
+            if not candidates:
+                break
+        return [(doc_id, score, meta) for doc_id, (score, meta) in candidates.items()]
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        if os.getenv('SEARCH_BACKEND', 'firestore') == 'memory':
+            _backend = InMemorySearchBackend()
+        else:
+            _backend = FirestoreSearchBackend()
+    return _backend
+
+
+def set_search_backend(backend):
+    """Swap the backend (tests use InMemorySearchBackend)."""
+    global _backend
+    _backend = backend
+
+
+def index_event(event_id, event):
+    get_search_backend().index_document(event_id, build_terms(event), build_meta(event))
+
+
+def unindex_event(event_id):
+    get_search_backend().remove_document(event_id)
+
+
+def search_events(q, predicate=None, sort_key=None, reverse=False, limit=20, last_doc_id=None):
+    """
+    Ranked search over the event index.
+
+    predicate(meta) filters postings without reading events; results are
+    ordered by relevance, then by sort_key(meta) for ties. Pagination uses
+    the id of the last event on the previous page, like the other lists.
+    Returns (event_ids, has_more, last_id).
+    """
+    terms = list(dict.fromkeys(tokenize(q)))
+    if not terms:
+        return [], False, None
+
+    matches = get_search_backend().query(terms)
+    if predicate is not None:
+        matches = [m for m in matches if predicate(m[2])]
+
+    def secondary(m):
+        value = sort_key(m[2]) if sort_key else ''
+        return (value, m[0])
+
+    # Stable two-pass sort: secondary order first, then relevance (desc)
+    matches.sort(key=secondary, reverse=reverse)
+    matches.sort(key=lambda m: m[1], reverse=True)
+    ranked = [m[0] for m in matches]
+
+    start = 0
+    if last_doc_id and last_doc_id in ranked:
+        start = ranked.index(last_doc_id) + 1
+
+    page = ranked[start:start + limit]
+    has_more = start + limit < len(ranked)
+    return page, has_more, (page[-1] if page else None)
@@ -0,0 +1,338 @@
+"""
+Sharded attendee / ticket counters for events.
+
+Joining and buying a ticket used to read-modify-write the event document in
+a transaction, so every join on a popular event contended on one document.
+Counts now live in N shard documents (events/{id}/counter_shards/{i}), and
+the event's capacity is split between them up front (reserved allocation):
+each shard holds its own slice of maxParticipants / max_tickets as `caps`.
+
+  * reserve: a transaction reads ONE random shard and takes the spots from
+    its free slice; concurrent joins land on different shards. Only when the
+    probed shards are all short (the event is close to full) does a slower
+    transaction read every shard and move free capacity over to one of them,
+    or report the event as full.
+  * release: a blind Increment(-n) on any shard; capacity is only ever
+    checked against the sum over shards, so which shard frees it is irrelevant.
+  * reads: get_counts sums the shards and caches the total for a few seconds.
+  * reconcile: every write drops a marker in counter_dirty; the scheduler
+    copies the totals of marked events onto the event document, which is what
+    lists, sorting by popularity and analytics read.
+
+Shard count scales with capacity (one shard per MIN_SHARD_CAPACITY spots, up
+to COUNTER_SHARDS). Events created before this get their shards on first use.
+"""
+
+import os
+import time
+import random
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+from app.services.cache import TTLCache
+
+COUNTERS = ('attendeeCount', 'tickets_sold')
+MAX_SHARDS = int(os.getenv('COUNTER_SHARDS', 16))
+MIN_SHARD_CAPACITY = 25
+# Shards tried one at a time before falling back to a rebalance
+PROBES = 3
+RECONCILE_PAGE_SIZE = 300
+
+_counts = TTLCache(
+    maxsize=int(os.getenv('COUNTER_CACHE_SIZE', 2000)),
+    ttl=int(os.getenv('COUNTER_CACHE_TTL', 3)),
+)
+
+
+class CapacityError(ValueError):
+    pass
+
+
+def _db():
+    return firestore.client()
+
+
+def limits(event):
+    """Capacity per counter; None means unlimited."""
+    attendees = int(event.get('maxParticipants') or 0)
+    tickets = int(event.get('max_tickets') or attendees)
+    return {'attendeeCount': attendees, 'tickets_sold': tickets or None}
+
+
+def shard_count(event):
+    capacity = max((v for v in limits(event).values() if v is not None), default=0)
+    return max(1, min(MAX_SHARDS, capacity // MIN_SHARD_CAPACITY))
+
+
+def _split(total, n):
+    return [total // n + (1 if i < total % n else 0) for i in range(n)]
+
+
+def _shard_ref(event_ref, index):
+    return event_ref.collection('counter_shards').document(str(index))
+
+
+def _marker_ref(db, event_id, index):
+    # One marker per shard, so marking never funnels writes into one document
+    return db.collection('counter_dirty').document(f"{event_id}_{index}")
+
+
+def _mark(db, writer, event_id, index):
+    writer.set(_marker_ref(db, event_id, index), {'event_id': event_id, 'at': int(time.time())})
+
+
+def _initial_shards(event):
+    """Shard documents for the event's current counts and limits."""
+    n = shard_count(event)
+    caps = {c: _split(limit, n) for c, limit in limits(event).items() if limit is not None}
+    counts = {c: _split(int(event.get(c) or 0), n) for c in COUNTERS}
+    shards = []
+    for i in range(n):
+        shard = {c: counts[c][i] for c in COUNTERS}
+        shard['caps'] = {c: caps[c][i] for c in caps}
+        shards.append(shard)
+    return shards
+
+
+def init_shards(event_ref, event):
+    """Creates the shards of a new event. Returns the shard count."""
+    db = _db()
+    shards = _initial_shards(event)
+    batch = db.batch()
+    for i, shard in enumerate(shards):
+        batch.set(_shard_ref(event_ref, i), shard)
+    batch.update(event_ref, {'counterShards': len(shards)})
+    batch.commit()
+    return len(shards)
+
+
+def ensure_shards(event_ref, event):
+    """Shard count of the event, creating shards for events that predate them."""
+    if event.get('counterShards'):
+        return int(event['counterShards'])
+    db = _db()
+
+    @firestore.transactional
+    def _txn(transaction):
+        snap = event_ref.get(transaction=transaction)
+        if not snap.exists:
+            raise CapacityError('Event not found')
+        current = snap.to_dict()
+        if current.get('counterShards'):
+            return int(current['counterShards'])
+        # Old events may lack attendeeCount; participants was the source then
+        current.setdefault('attendeeCount', len(current.get('participants', [])))
+        shards = _initial_shards(current)
+        for i, shard in enumerate(shards):
+            transaction.set(_shard_ref(event_ref, i), shard)
+        transaction.update(event_ref, {'counterShards': len(shards)})
+        return len(shards)
+
+    return _txn(db.transaction())
+
+
+def _free(shard, counter):
+    cap = shard.get('caps', {}).get(counter)
+    if cap is None:
+        return None
+    return cap - int(shard.get(counter, 0))
+
+
+def _fits(shard, deltas, check):
+    return all(_free(shard, c) is None or _free(shard, c) >= deltas[c] for c in check)
+
+
+def _apply(shard, deltas):
+    return {c: int(shard.get(c, 0)) + amount for c, amount in deltas.items()}
+
+
+def reserve(event_ref, event, deltas, check=None, write=None):
+    """
+    Adds `deltas` ({counter: amount}) to the event's counts if the capacity
+    of every counter in `check` (default: all of them) allows it.
+
+    write(transaction) runs in the same transaction once room is found, for
+    the document that goes with the reservation (booking, ticket). It must do
+    its reads before its writes and may raise to abort.
+
+    Raises CapacityError when the event is full.
+    """
+    db = _db()
+    n = ensure_shards(event_ref, event)
+    check = tuple(deltas if check is None else check)
+
+    @firestore.transactional
+    def _probe(transaction, index):
+        ref = _shard_ref(event_ref, index)
+        snap = ref.get(transaction=transaction)
+        if not snap.exists:
+            return False
+        shard = snap.to_dict()
+        if not _fits(shard, deltas, check):
+            return False
+        if write:
+            write(transaction)
+        transaction.set(ref, _apply(shard, deltas), merge=True)
+        _mark(db, transaction, event_ref.id, index)
+        return True
+
+    for index in random.sample(range(n), min(PROBES, n)):
+        if _probe(db.transaction(), index):
+            return index
+    return _rebalance(db, event_ref, n, deltas, check, write)
+
+
+def _read_shards(db, refs, transaction):
+    """Shard dicts in shard order ({} for a missing shard)."""
+    snaps = {snap.id: snap for snap in db.get_all(refs, transaction=transaction)}
+    return [snaps[ref.id].to_dict() if ref.id in snaps and snaps[ref.id].exists else {} for ref in refs]
+
+
+def _rebalance(db, event_ref, n, deltas, check, write):
+    """Reads every shard; moves free capacity to one shard and reserves there."""
+    refs = [_shard_ref(event_ref, i) for i in range(n)]
+
+    @firestore.transactional
+    def _txn(transaction):
+        shards = _read_shards(db, refs, transaction)
+        limited = [c for c in check if any(_free(s, c) is not None for s in shards)]
+        for c in limited:
+            if sum(_free(s, c) or 0 for s in shards) < deltas[c]:
+                raise CapacityError('Not enough capacity left')
+
+        target = max(range(n), key=lambda i: sum(_free(shards[i], c) or 0 for c in limited))
+        caps = dict(shards[target].get('caps', {}))
+        moved = {}
+        for c in limited:
+            need = deltas[c] - (_free(shards[target], c) or 0)
+            for i in range(n):
+                if need <= 0:
+                    break
+                free = _free(shards[i], c) or 0
+                if i == target or free <= 0:
+                    continue
+                take = min(free, need)
+                moved.setdefault(i, {})[f"caps.{c}"] = shards[i]['caps'][c] - take
+                caps[c] = caps.get(c, 0) + take
+                need -= take
+
+        if write:
+            write(transaction)
+        for i, caps_left in moved.items():
+            transaction.update(refs[i], caps_left)
+            _mark(db, transaction, event_ref.id, i)
+        update = _apply(shards[target], deltas)
+        update['caps'] = caps
+        transaction.set(refs[target], update, merge=True)
+        _mark(db, transaction, event_ref.id, target)
+        return target
+
+    return _txn(db.transaction())
+
+
+def release(event_ref, event, deltas):
+    """Gives `deltas` back. A blind write to a random shard; no transaction."""
+    db = _db()
+    n = ensure_shards(event_ref, event)
+    index = random.randrange(n)
+    batch = db.batch()
+    batch.update(_shard_ref(event_ref, index), {c: firestore.Increment(-amount) for c, amount in deltas.items()})
+    _mark(db, batch, event_ref.id, index)
+    batch.commit()
+
+
+def resize(event_ref, event):
+    """
+    Re-splits capacity after maxParticipants / max_tickets changed. Raises
+    CapacityError if a new limit is below the current count.
+    """
+    db = _db()
+    n = ensure_shards(event_ref, event)
+    refs = [_shard_ref(event_ref, i) for i in range(n)]
+    new_limits = limits(event)
+
+    @firestore.transactional
+    def _txn(transaction):
+        shards = _read_shards(db, refs, transaction)
+        used = {c: [int(s.get(c, 0)) for s in shards] for c in new_limits}
+        for c, limit in new_limits.items():
+            if limit is not None and limit < sum(used[c]):
+                raise CapacityError(f'Cannot reduce capacity below the current count ({sum(used[c])})')
+        # Each shard keeps what it has used; the rest of the limit is split evenly
+        free = {c: _split(limit - sum(used[c]), n) for c, limit in new_limits.items() if limit is not None}
+        for i, ref in enumerate(refs):
+            transaction.set(ref, {'caps': {c: used[c][i] + free[c][i] for c in free}}, merge=True)
+        _mark(db, transaction, event_ref.id, 0)
+
+    _txn(db.transaction())
+    _counts.delete(event_ref.id)
+
+
+def aggregate(event_ref, n):
+    refs = [_shard_ref(event_ref, i) for i in range(n)]
+    totals = dict.fromkeys(COUNTERS, 0)
+    for snap in _db().get_all(refs, field_paths=list(COUNTERS)):
+        if snap.exists:
+            d = snap.to_dict()
+            for c in COUNTERS:
+                totals[c] += int(d.get(c, 0))
+    return totals
+
+
+def get_counts(event_id, event):
+    """Live totals for the event page; cached for COUNTER_CACHE_TTL seconds."""
+    n = event.get('counterShards')
+    if not n:
+        return {c: event.get(c, 0) for c in COUNTERS}
+    totals = _counts.get(event_id)
+    if totals is None:
+        totals = aggregate(_db().collection('events').document(event_id), int(n))
+        _counts.set(event_id, totals)
+    return totals
+
+
+def reconcile_counters():
+    """Scheduler job: copies shard totals onto events written since the last run."""
+    db = _db()
+    report = {'job': 'reconcile_counters', 'events': 0, 'failed': 0}
+    query = db.collection('counter_dirty').order_by(FieldPath.document_id()).limit(RECONCILE_PAGE_SIZE)
+    cursor = None
+
+    while True:
+        page = query.start_after({FieldPath.document_id(): cursor}) if cursor else query
+        markers = list(page.stream())
+        if not markers:
+            break
+        cursor = markers[-1].id
+
+        by_event = {}
+        for marker in markers:
+            by_event.setdefault(marker.to_dict().get('event_id'), []).append(marker)
+
+        for event_id, event_markers in by_event.items():
+            event_ref = db.collection('events').document(event_id)
+            try:
+                snap = event_ref.get(field_paths=['counterShards'])
+                if snap.exists and snap.to_dict().get('counterShards'):
+                    totals = aggregate(event_ref, int(snap.to_dict()['counterShards']))
+                    event_ref.update(totals)
+                    _counts.set(event_id, totals)
+                    report['events'] += 1
+            except Exception as e:
+                report['failed'] += 1
+                print(f"[Counters] Reconcile failed for event {event_id}: {e}")
+                continue
+            batch = db.batch()
+            for marker in event_markers:
+                batch.delete(marker.reference, option=db.write_option(last_update_time=marker.update_time))
+            try:
+                batch.commit()
+            except Exception:
+                # A marker was rewritten since we read it: reconciled again next run
+                pass
+
+        if len(markers) < RECONCILE_PAGE_SIZE:
+            break
+
+    if report['events'] or report['failed']:
+        print(f"[Counters] Reconciled {report['events']} events.")
+    return report
@@ -0,0 +1,127 @@
+"""
+Signed ticket tokens.
+
+Ticket QR codes used to encode `ticket:{id}`, so a scan proved nothing until
+the ticket and its event had been read from Firestore. They now encode a
+token that carries its own claims and an HMAC:
+
+  HT1.<kid>.<body>.<tag>
+    body  base64url("ticket_id|event_id|holder_uid|issued_at")
+    tag   first 16 bytes of HMAC-SHA256(keys[kid], "HT1.<kid>.<body>"), base64url
+
+A scanner can reject a forged, tampered or wrong-event ticket with no reads
+at all; only recording the check-in touches the ticket (see
+services/checkins.py).
+
+Keys come from TICKET_SIGNING_KEYS ("kid:secret,kid:secret") and are read on
+first use; without them signing and verifying raise RuntimeError unless
+TICKET_SIGNING_DEV_MODE=true. New tokens are
+signed with TICKET_SIGNING_KEY_ID (default: the first key); all listed keys
+verify. To rotate, add the new key, make it active, and remove the old one
+once no ticket signed with it needs to scan. Tokens are deterministic for a
+(ticket, key), so the QR render cache keeps working, and a holder who
+reopens a ticket after a rotation gets a token signed with the new key.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+VERSION = 'HT1'
+DEV_MODE = os.getenv('TICKET_SIGNING_DEV_MODE', 'false').lower() == 'true'
+TAG_BYTES = 16
+
+TicketClaims = namedtuple('TicketClaims', 'ticket_id event_id holder issued_at key_id')
+
+
+class TokenError(ValueError):
+    """Raised by verify(); `reason` is one of malformed, unknown_key, bad_signature, wrong_event."""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+@lru_cache(maxsize=None)
+def _load_keys():
+    """(keys by id, active key id); raises RuntimeError if misconfigured."""
+    keys = {}
+    for item in os.getenv('TICKET_SIGNING_KEYS', '').split(','):
+        kid, _, secret = item.strip().partition(':')
+        if kid and secret and kid.isalnum():
+            keys[kid] = secret.encode('utf-8')
+    if not keys:
+        # A known key lets anyone forge tickets, so it is opt-in for local development only
+        if not DEV_MODE:
+            raise RuntimeError("TICKET_SIGNING_KEYS is not set (set TICKET_SIGNING_DEV_MODE=true for local development)")
+        print("WARNING: TICKET_SIGNING_DEV_MODE is on. Signing tickets with a development key.")
+        keys = {'dev': b'huddle-development-ticket-key'}
+    active = os.getenv('TICKET_SIGNING_KEY_ID') or next(iter(keys))
+    if active not in keys:
+        raise RuntimeError(f"TICKET_SIGNING_KEY_ID '{active}' is not in TICKET_SIGNING_KEYS")
+    return keys, active
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _tag(key, signed):
+    return _b64(hmac.new(key, signed.encode('ascii'), hashlib.sha256).digest()[:TAG_BYTES])
+
+
+def sign(ticket_id, event_id, holder, issued_at, key_id=None):
+    keys, active = _load_keys()
+    key_id = key_id or active
+    body = _b64(f"{ticket_id}|{event_id}|{holder}|{int(issued_at or 0)}".encode('utf-8'))
+    signed = f"{VERSION}.{key_id}.{body}"
+    return f"{signed}.{_tag(keys[key_id], signed)}"
+
+
+def token_for(ticket_id, ticket):
+    """The token for a ticket document (needs event_id, user_id, created_at)."""
+    return sign(ticket_id, ticket['event_id'], ticket['user_id'], ticket.get('created_at'))
+
+
+def token_hash(token):
+    """Short digest of a token, for lists that must not contain the tokens themselves."""
+    return _b64(hashlib.sha256(token.encode('ascii')).digest()[:12])
+
+
+def hashes_for(ticket_id, ticket):
+    """token_hash of the ticket's token under every verifying key (old QR codes still match)."""
+    return [token_hash(sign(ticket_id, ticket['event_id'], ticket['user_id'], ticket.get('created_at'), key_id=kid))
+            for kid in _load_keys()[0]]
+
+
+def verify(token, event_id=None):
+    """
+    Checks the signature (and, if given, that the ticket is for `event_id`)
+    without touching the database. Returns TicketClaims; raises TokenError.
+    """
+    parts = token.split('.') if isinstance(token, str) else []
+    if len(parts) != 4 or parts[0] != VERSION:
+        raise TokenError('malformed', 'Not a ticket code')
+    _, key_id, body, tag = parts
+    key = _load_keys()[0].get(key_id)
+    if key is None:
+        raise TokenError('unknown_key', 'Ticket signed with an unknown or retired key')
+    if not hmac.compare_digest(tag, _tag(key, f"{VERSION}.{key_id}.{body}")):
+        raise TokenError('bad_signature', 'Ticket signature is invalid')
+
+    try:
+        ticket_id, claimed_event, holder, issued_at = _unb64(body).decode('utf-8').split('|')
+        claims = TicketClaims(ticket_id, claimed_event, holder, int(issued_at), key_id)
+    except ValueError:
+        raise TokenError('malformed', 'Ticket code is corrupt')
+
+    if event_id is not None and claims.event_id != event_id:
+        raise TokenError('wrong_event', 'Ticket is for a different event')
+    return claims
@@ -0,0 +1,123 @@
+"""
+Shared loader for `users/{uid}` documents.
+
+Within a request every lookup goes through `g`, so `require_role` and the
+route handler behind it read the user document once. Across requests a short
+TTL cache keeps the public profile fields (displayName, photoURL, role) that
+comments, event pages etc. render. Writers call `invalidate_user` after they
+change a user document.
+"""
+
+import os
+from flask import g, has_app_context
+from firebase_admin import firestore
+from app.services.cache import TTLCache
+
+PROFILE_FIELDS = ('displayName', 'photoURL', 'role')
+
+# Set USER_PROFILE_CACHE_TTL=0 to disable the cross-request cache
+_profiles = TTLCache(
+    maxsize=int(os.getenv('USER_PROFILE_CACHE_SIZE', 5000)),
+    ttl=int(os.getenv('USER_PROFILE_CACHE_TTL', 30)),
+)
+
+
+def _request_docs():
+    if not has_app_context():
+        return None
+    if 'user_docs' not in g:
+        g.user_docs = {}
+    return g.user_docs
+
+
+def _remember_profile(uid, data):
+    _profiles.set(uid, {k: data.get(k) for k in PROFILE_FIELDS})
+
+
+def get_user_doc(uid):
+    """
+    Returns the user document as a dict, or None if it doesn't exist.
+    Memoized for the lifetime of the current request.
+    """
+    if not uid:
+        return None
+
+    docs = _request_docs()
+    if docs is not None and uid in docs:
+        return docs[uid]
+
+    snap = firestore.client().collection('users').document(uid).get()
+    data = snap.to_dict() if snap.exists else None
+
+    if docs is not None:
+        docs[uid] = data
+    if data is not None:
+        _remember_profile(uid, data)
+    return data
+
+
+def get_user_profile(uid):
+    """
+    Returns {displayName, photoURL, role} for display purposes, or None.
+    May be up to USER_PROFILE_CACHE_TTL seconds stale — don't use it for
+    authorization decisions, use get_user_doc instead.
+    """
+    if not uid:
+        return None
+
+    docs = _request_docs()
+    if docs is not None and docs.get(uid) is not None:
+        return {k: docs[uid].get(k) for k in PROFILE_FIELDS}
+
+    profile = _profiles.get(uid)
+    if profile is not None:
+        return profile
+
+    data = get_user_doc(uid)
+    if data is None:
+        return None
+    return {k: data.get(k) for k in PROFILE_FIELDS}
+
+
+def invalidate_user(uid):
+    """Drops any cached copy of users/{uid} after a write."""
+    _profiles.delete(uid)
+    docs = _request_docs()
+    if docs is not None:
+        docs.pop(uid, None)
+        if g.get('user') and g.user.get('uid') == uid:
+            g.pop('user_doc', None)
+
+
+GET_ALL_CHUNK_SIZE = 100
+
+
+def get_user_profiles(uids, fields=('displayName', 'photoURL')):
+    """
+    Batched hydration: returns {uid: {field: value}} for the given uids using
+    chunked db.get_all calls with a field mask, so N users cost N/100 round
+    trips instead of N. Missing users are left out of the result.
+    """
+    fields = tuple(fields)
+    result = {}
+    pending = []
+
+    for uid in dict.fromkeys(u for u in uids if u):
+        cached = _profiles.get(uid)
+        if cached is not None and all(f in cached for f in fields):
+            result[uid] = {f: cached.get(f) for f in fields}
+        else:
+            pending.append(uid)
+
+    if not pending:
+        return result
+
+    db = firestore.client()
+    users_ref = db.collection('users')
+    for i in range(0, len(pending), GET_ALL_CHUNK_SIZE):
+        refs = [users_ref.document(uid) for uid in pending[i:i + GET_ALL_CHUNK_SIZE]]
+        for snap in db.get_all(refs, field_paths=list(fields)):
+            if snap.exists:
+                data = snap.to_dict()
+                result[snap.id] = {f: data.get(f) for f in fields}
+    return result
@@ -0,0 +1,149 @@
+"""
+In-memory secondary index for venue browsing.
+
+Firestore can't combine a capacity range, a price range and a substring match
+in one query, so get_venues answers those combinations here instead. The
+index keeps, per city (and for all cities), venue ids sorted by capacity and
+by price_per_hour; range filters become two bisects and a set intersection.
+
+It is built from a field-masked read of the venues collection. Venue writes
+(create/update/delete_venue) call invalidate(), which bumps a shared
+generation document,
+
+  index_generations/venues   {generation}
+
+Every VENUE_INDEX_TTL seconds a worker reads that one document and rescans
+the venues only if the generation moved, so an idle catalogue costs one read
+per interval and other gunicorn workers see a write within the interval.
+"""
+
+import os
+import time
+import threading
+from bisect import bisect_left, bisect_right
+from firebase_admin import firestore
+
+INDEX_FIELDS = ['city', 'capacity', 'price_per_hour', 'created_at', 'name', 'location']
+GENERATION_COLLECTION = 'index_generations'
+ALL_CITIES = None
+
+_SORT_KEYS = {
+    'capacity': lambda r: r['capacity'],
+    'price_per_hour': lambda r: r['price_per_hour'],
+    'created_at': lambda r: r['created_at'],
+}
+
+
+def _number(value, cast):
+    try:
+        return cast(value or 0)
+    except (TypeError, ValueError):
+        return cast(0)
+
+
+class _Bucket:
+    def __init__(self):
+        self.records = {}
+        self.by_capacity = []
+        self.by_price = []
+
+    def add(self, venue_id, record):
+        self.records[venue_id] = record
+        self.by_capacity.append((record['capacity'], venue_id))
+        self.by_price.append((record['price_per_hour'], venue_id))
+
+    def seal(self):
+        self.by_capacity.sort()
+        self.by_price.sort()
+
+
+class VenueIndex:
+    def __init__(self, ttl=None, name='venues'):
+        self.ttl = ttl if ttl is not None else int(os.getenv('VENUE_INDEX_TTL', 15))
+        self.name = name
+        self._buckets = None
+        self._generation = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def _generation_ref(self):
+        return firestore.client().collection(GENERATION_COLLECTION).document(self.name)
+
+    def invalidate(self):
+        """Marks the index stale here and, through the generation doc, in every worker."""
+        self._checked_at = 0
+        self._generation = None
+        try:
+            self._generation_ref().set({'generation': firestore.Increment(1)}, merge=True)
+        except Exception as e:
+            # This worker still rebuilds; the others catch up on their next bump
+            print(f"Venue index generation bump failed: {e}")
+
+    def load(self, docs):
+        """Builds the index from (venue_id, dict) pairs and swaps it in."""
+        buckets = {ALL_CITIES: _Bucket()}
+        for venue_id, d in docs:
+            record = {
+                'city': d.get('city'),
+                'capacity': _number(d.get('capacity'), int),
+                'price_per_hour': _number(d.get('price_per_hour'), float),
+                'created_at': str(d.get('created_at') or ''),
+                'text': (str(d.get('name') or '') + ' ' + str(d.get('location') or '')).lower(),
+            }
+            buckets[ALL_CITIES].add(venue_id, record)
+            buckets.setdefault(record['city'], _Bucket()).add(venue_id, record)
+        for bucket in buckets.values():
+            bucket.seal()
+        self._buckets = buckets
+        self._checked_at = time.time()
+
+    def _ensure_fresh(self):
+        if self._buckets is not None and time.time() - self._checked_at < self.ttl:
+            return
+        with self._lock:
+            if self._buckets is not None and time.time() - self._checked_at < self.ttl:
+                return
+            snap = self._generation_ref().get()
+            generation = (snap.to_dict() or {}).get('generation', 0) if snap.exists else 0
+            if self._buckets is not None and generation == self._generation:
+                self._checked_at = time.time()
+                return
+            # Read before the scan, so a write racing it is picked up by the next check
+            query = firestore.client().collection('venues').select(INDEX_FIELDS)
+            self.load((doc.id, doc.to_dict()) for doc in query.stream())
+            self._generation = generation
+
+    def query(self, city=None, min_capacity=None, min_price=None, max_price=None, q=None,
+              order_field='created_at', descending=True):
+        """Returns every matching venue id in the requested order."""
+        self._ensure_fresh()
+        bucket = self._buckets.get(city if city else ALL_CITIES)
+        if bucket is None:
+            return []
+
+        candidates = None
+        if min_capacity is not None:
+            i = bisect_left(bucket.by_capacity, (min_capacity, ''))
+            candidates = {vid for _, vid in bucket.by_capacity[i:]}
+
+        if min_price is not None or max_price is not None:
+            lo = bisect_left(bucket.by_price, (min_price, '')) if min_price is not None else 0
+            hi = (bisect_right(bucket.by_price, (max_price, '\uffff'))
+                  if max_price is not None else len(bucket.by_price))
+            in_price = {vid for _, vid in bucket.by_price[lo:hi]}
+            candidates = in_price if candidates is None else candidates & in_price
+
+        if candidates is None:
+            candidates = bucket.records.keys()
+
+        if q:
+            term = q.lower()
+            candidates = [vid for vid in candidates if term in bucket.records[vid]['text']]
+
+        sort_key = _SORT_KEYS.get(order_field, _SORT_KEYS['created_at'])
+        # Same ordering as Firestore: sort field, then document id
+        return sorted(candidates, key=lambda vid: (sort_key(bucket.records[vid]), vid),
+                      reverse=descending)
+
+
+venue_index = VenueIndex()
@@ -0,0 +1,104 @@
+"""
+Backfill Script: Write check-in markers for tickets that are no longer active.
+
+Signed-token scans (POST /api/tickets/scan) and offline sync look at
+ticket_checkins/{ticket_id} to tell whether a ticket was already used or
+refunded. Tickets checked in or refunded before those markers existed have
+none, so this writes one per 'used' / 'refunded' ticket.
+
+Safe to run multiple times (idempotent — existing markers are kept).
+
+Usage:
+  cd backend
+  python -m scripts.backfill_checkin_markers
+"""
+
+import os
+import sys
+import json
+
+# Add parent dir so `app` package is importable
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from google.cloud.firestore import FieldFilter
+from dotenv import load_dotenv
+
+# --- Firebase Init (same logic as app/__init__.py) ---
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+if not firebase_admin._apps:
+    firebase_creds_json = os.getenv('FIREBASE_CREDENTIALS')
+    key_path = os.getenv('SVC_ACC_PATH', 'service-account.json')
+
+    if firebase_creds_json:
+        cred = credentials.Certificate(json.loads(firebase_creds_json))
+        firebase_admin.initialize_app(cred)
+    elif os.path.exists(key_path):
+        cred = credentials.Certificate(key_path)
+        firebase_admin.initialize_app(cred)
+    else:
+        firebase_admin.initialize_app()
+
+db = firestore.client()
+
+from app.services.checkins import marker_ref, USED, REFUNDED
+
+CHUNK_SIZE = 250
+
+
+def _write_markers(tickets):
+    """Writes markers for (snapshot, state) pairs that have none. Returns (written, skipped)."""
+    refs = [marker_ref(db, snap.id) for snap, _ in tickets]
+    existing = {snap.id for snap in db.get_all(refs, field_paths=['state']) if snap.exists}
+    batch = db.batch()
+    written = 0
+    for snap, state in tickets:
+        if snap.id in existing:
+            continue
+        t = snap.to_dict()
+        marker = {
+            'state': state,
+            'event_id': t.get('event_id'),
+            'user_id': t.get('user_id'),
+            'at': t.get('checked_in_at') if state == USED else t.get('refunded_at'),
+            'backfilled': True,
+        }
+        if state == USED:
+            marker['by'] = t.get('checked_in_by')
+        batch.set(marker_ref(db, snap.id), marker)
+        written += 1
+    if written:
+        batch.commit()
+    return written, len(tickets) - written
+
+
+def backfill():
+    written = 0
+    skipped = 0
+    for state in (USED, REFUNDED):
+        docs = db.collection('tickets')\
+            .where(filter=FieldFilter('status', '==', state))\
+            .select(['event_id', 'user_id', 'checked_in_at', 'checked_in_by', 'refunded_at'])\
+            .stream()
+        chunk = []
+        for doc in docs:
+            chunk.append((doc, state))
+            if len(chunk) == CHUNK_SIZE:
+                w, s = _write_markers(chunk)
+                written += w
+                skipped += s
+                chunk = []
+        if chunk:
+            w, s = _write_markers(chunk)
+            written += w
+            skipped += s
+        print(f"  ✔ {state} tickets processed")
+
+    print(f"\nDone. Markers written: {written}, Skipped (already marked): {skipped}")
+
+
+if __name__ == '__main__':
+    print("=== Backfill: check-in markers for used / refunded tickets ===\n")
+    backfill()
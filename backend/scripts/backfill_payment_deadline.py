@@ -0,0 +1,87 @@
+"""
+Backfill Script: Add 'payment_deadline' to pending venue bookings.
+
+The unpaid-booking sweeper (app/scheduler.py) only looks at bookings with a
+payment_deadline, which approve_booking now sets. Bookings approved before
+that need the field derived from 'approved_at'.
+
+Safe to run multiple times (idempotent — existing deadlines are kept).
+
+Usage:
+  cd backend
+  python -m scripts.backfill_payment_deadline
+"""
+
+import os
+import sys
+import json
+import datetime
+
+# Add parent dir so `app` package is importable
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from google.cloud.firestore import FieldFilter
+from dotenv import load_dotenv
+
+# --- Firebase Init (same logic as app/__init__.py) ---
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+if not firebase_admin._apps:
+    firebase_creds_json = os.getenv('FIREBASE_CREDENTIALS')
+    key_path = os.getenv('SVC_ACC_PATH', 'service-account.json')
+
+    if firebase_creds_json:
+        cred = credentials.Certificate(json.loads(firebase_creds_json))
+        firebase_admin.initialize_app(cred)
+    elif os.path.exists(key_path):
+        cred = credentials.Certificate(key_path)
+        firebase_admin.initialize_app(cred)
+    else:
+        firebase_admin.initialize_app()
+
+db = firestore.client()
+
+from app.scheduler import payment_deadline
+
+
+def backfill():
+    updated = 0
+    skipped = 0
+    batch = db.batch()
+    pending = 0
+
+    docs = db.collection('venue_requests')\
+        .where(filter=FieldFilter('status', '==', 'payment_pending'))\
+        .stream()
+
+    for doc in docs:
+        data = doc.to_dict()
+        if data.get('payment_deadline') or not data.get('approved_at'):
+            skipped += 1
+            continue
+        try:
+            approved_at = datetime.datetime.fromisoformat(data['approved_at'])
+        except ValueError:
+            print(f"  ✘ Skipped {doc.id}: unreadable approved_at {data['approved_at']!r}")
+            skipped += 1
+            continue
+
+        batch.update(doc.reference, {'payment_deadline': payment_deadline(approved_at)})
+        pending += 1
+        updated += 1
+        if pending == 500:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+
+    if pending:
+        batch.commit()
+
+    print(f"\nDone. Updated: {updated}, Skipped: {skipped}")
+
+
+if __name__ == '__main__':
+    print("=== Backfill: payment_deadline on pending bookings ===\n")
+    backfill()
@@ -0,0 +1,72 @@
+"""
+Backfill Script: Initialize notification unread counters.
+
+The bell badge reads notification_counters/{uid}, which writes and
+mark-read keep up to date with increments. A counter created by one of those
+increments never counted the user's older unread notifications, so this
+rebuilds every user's counter from the notifications themselves and marks it
+initialized.
+
+Safe to run multiple times (idempotent — counters are recounted).
+
+Usage:
+  cd backend
+  python -m scripts.backfill_unread_counters
+"""
+
+import os
+import sys
+import json
+
+# Add parent dir so `app` package is importable
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from dotenv import load_dotenv
+
+# --- Firebase Init (same logic as app/__init__.py) ---
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+if not firebase_admin._apps:
+    firebase_creds_json = os.getenv('FIREBASE_CREDENTIALS')
+    key_path = os.getenv('SVC_ACC_PATH', 'service-account.json')
+
+    if firebase_creds_json:
+        cred = credentials.Certificate(json.loads(firebase_creds_json))
+        firebase_admin.initialize_app(cred)
+    elif os.path.exists(key_path):
+        cred = credentials.Certificate(key_path)
+        firebase_admin.initialize_app(cred)
+    else:
+        firebase_admin.initialize_app()
+
+db = firestore.client()
+
+from google.cloud.firestore_v1.field_path import FieldPath
+from app.services.notification_writer import recount_unread
+
+
+def backfill():
+    users = 0
+    unread_total = 0
+    failed = 0
+
+    for doc in db.collection('users').select([FieldPath.document_id()]).stream():
+        try:
+            unread = recount_unread(db, doc.id)
+        except Exception as e:
+            print(f"  ✘ Failed {doc.id}: {e}")
+            failed += 1
+            continue
+        users += 1
+        unread_total += unread
+        if unread:
+            print(f"  ✔ {doc.id}: {unread} unread")
+
+    print(f"\nDone. Users: {users}, Unread notifications: {unread_total}, Failed: {failed}")
+
+
+if __name__ == '__main__':
+    print("=== Backfill: notification unread counters ===\n")
+    backfill()
@@ -0,0 +1,65 @@
+"""
+Micro-benchmark: email template render cost per message.
+
+Compares rendering each message from scratch against render_batch, which
+binds the shared context once and fills only per-recipient values, after
+checking that both produce the same bodies. No Firebase or network access
+needed.
+
+Usage:
+  cd backend
+  python -m scripts.bench_email_templates [messages]
+"""
+
+import os
+import sys
+import time
+
+# Add parent dir so `app` package is importable
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services import email_templates
+
+
+SHARED = {'event_name': 'Sunday Morning Yoga in the Park', 'date': '2025-06-01T08:00', 'venue': 'Cubbon Park'}
+
+
+def bench(label, fn, messages):
+    fn(min(messages, 100))  # warm-up
+    started = time.perf_counter()
+    fn(messages)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<28} {elapsed * 1e6 / messages:8.2f} µs/msg   ({elapsed * 1000:.1f} ms total)")
+
+
+def check():
+    """render_batch must produce exactly what render does, braces in values included."""
+    shared = dict(SHARED, event_name='Yoga {beginners} }{ {{x}}')
+    contexts = [{'user_name': 'Bob'}, {'user_name': '{user_name}'}]
+    batched = email_templates.render_batch('event_reminder', contexts, shared=shared)
+    for ctx, body in zip(contexts, batched):
+        if body != email_templates.render('event_reminder', dict(shared, **ctx)):
+            print(f"  ✘ render_batch differs from render for {ctx}")
+            sys.exit(1)
+    print("  ✔ render_batch matches render\n")
+
+
+def run(messages):
+    contexts = [{'user_name': f'User {i}'} for i in range(messages)]
+
+    def single(n):
+        for ctx in contexts[:n]:
+            email_templates.render('event_reminder', dict(SHARED, **ctx))
+
+    def batch(n):
+        email_templates.render_batch('event_reminder', contexts[:n], shared=SHARED)
+
+    print(f"Rendering {messages} 'event_reminder' messages\n")
+    bench('render() per message', single, messages)
+    bench('render_batch() shared bind', batch, messages)
+
+
+if __name__ == '__main__':
+    print("=== Email template micro-benchmark ===\n")
+    check()
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
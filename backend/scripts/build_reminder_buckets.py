@@ -0,0 +1,72 @@
+"""
+Backfill Script: File upcoming events into reminder buckets.
+
+Events created before reminders existed have no reminder_buckets entry, so
+the hourly reminder job would never see them. This reads upcoming events
+once (an indexed range on `date`) and files each under its start hour.
+
+Safe to run multiple times (idempotent — entries are overwritten).
+
+Usage:
+  cd backend
+  python -m scripts.build_reminder_buckets
+"""
+
+import os
+import sys
+import json
+import datetime
+
+# Add parent dir so `app` package is importable
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from google.cloud.firestore import FieldFilter
+from dotenv import load_dotenv
+
+# --- Firebase Init (same logic as app/__init__.py) ---
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+if not firebase_admin._apps:
+    firebase_creds_json = os.getenv('FIREBASE_CREDENTIALS')
+    key_path = os.getenv('SVC_ACC_PATH', 'service-account.json')
+
+    if firebase_creds_json:
+        cred = credentials.Certificate(json.loads(firebase_creds_json))
+        firebase_admin.initialize_app(cred)
+    elif os.path.exists(key_path):
+        cred = credentials.Certificate(key_path)
+        firebase_admin.initialize_app(cred)
+    else:
+        firebase_admin.initialize_app()
+
+db = firestore.client()
+
+from app.services.reminders import schedule_reminder
+
+
+def build_buckets():
+    filed = 0
+    failed = 0
+
+    now = datetime.datetime.utcnow().isoformat()
+    docs = db.collection('events')\
+        .where(filter=FieldFilter('date', '>=', now))\
+        .select(['title', 'date'])\
+        .stream()
+
+    for doc in docs:
+        try:
+            schedule_reminder(doc.id, doc.to_dict())
+            filed += 1
+        except Exception as e:
+            failed += 1
+            print(f"  ✘ Failed {doc.id}: {e}")
+
+    print(f"\nDone. Filed: {filed}, Failed: {failed}")
+
+
+if __name__ == '__main__':
+    print("=== Reminders: Filing upcoming events into buckets ===\n")
+    build_buckets()
@@ -0,0 +1,64 @@
+"""
+Backfill Script: Build the event search index (search_index / search_docs).
+
+Events created before the index existed are invisible to `GET /api/events?q=`
+until indexed. This walks the events collection once and (re-)indexes each
+event.
+
+Safe to run multiple times (idempotent — re-indexing replaces postings).
+
+Usage:
+  cd backend
+  python -m scripts.build_search_index
+"""
+
+import os
+import sys
+import json
+
+# Add parent dir so `app` package is importable
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from dotenv import load_dotenv
+
+# --- Firebase Init (same logic as app/__init__.py) ---
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+if not firebase_admin._apps:
+    firebase_creds_json = os.getenv('FIREBASE_CREDENTIALS')
+    key_path = os.getenv('SVC_ACC_PATH', 'service-account.json')
+
+    if firebase_creds_json:
+        cred = credentials.Certificate(json.loads(firebase_creds_json))
+        firebase_admin.initialize_app(cred)
+    elif os.path.exists(key_path):
+        cred = credentials.Certificate(key_path)
+        firebase_admin.initialize_app(cred)
+    else:
+        firebase_admin.initialize_app()
+
+db = firestore.client()
+
+from app.services.search_index import index_event
+
+
+def build_index():
+    indexed = 0
+    failed = 0
+
+    for doc in db.collection('events').stream():
+        try:
+            index_event(doc.id, doc.to_dict())
+            indexed += 1
+        except Exception as e:
+            failed += 1
+            print(f"  ✘ Failed {doc.id}: {e}")
+
+    print(f"\nDone. Indexed: {indexed}, Failed: {failed}")
+
+
+if __name__ == '__main__':
+    print("=== Search Index: Indexing events ===\n")
+    build_index()
@@ -0,0 +1,105 @@
+"""
+Local fake SMTP server for development and tests.
+
+Accepts mail from the SMTP transport in app/services/email_service.py and
+keeps it in memory instead of delivering it (no STARTTLS/AUTH). Run it and
+point the backend at it:
+
+Usage:
+  cd backend
+  python -m scripts.fake_smtp_server            # listens on localhost:1025
+  SMTP_HOST=localhost SMTP_PORT=1025 SMTP_USE_TLS=false python run.py
+
+Tests can start it in-process instead:
+  server = FakeSMTPServer(port=0).start()
+  ... send through SMTPTransport('localhost', server.port, use_tls=False) ...
+  server.messages  # [{'from', 'to', 'data'}]
+  server.stop()
+"""
+
+import socketserver
+import threading
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode('utf-8'))
+
+    def handle(self):
+        self.reply('220 fake-smtp ready')
+        envelope = {'from': None, 'to': []}
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode('utf-8', 'replace').rstrip('\r\n')
+            verb = line.split(' ', 1)[0].upper()
+
+            if verb == 'EHLO':
+                self.reply('250-fake-smtp')
+                self.reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self.reply('250 fake-smtp')
+            elif verb == 'MAIL':
+                envelope = {'from': line.split(':', 1)[1].strip(), 'to': []}
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                envelope['to'].append(line.split(':', 1)[1].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data_line = self.rfile.readline().decode('utf-8', 'replace')
+                    if data_line in ('.\r\n', '.\n', ''):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith('..') else data_line)
+                self.server.record(dict(envelope, data=''.join(lines)))
+                self.reply('250 OK: queued')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='localhost', port=1025, verbose=False):
+        super().__init__((host, port), _SMTPHandler)
+        self.messages = []
+        self.verbose = verbose
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def record(self, message):
+        with self._lock:
+            self.messages.append(message)
+        if self.verbose:
+            print(f"  ✉ {message['from']} -> {', '.join(message['to'])} ({len(message['data'])} bytes)")
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == '__main__':
+    print("=== Fake SMTP server on localhost:1025 (Ctrl+C to stop) ===\n")
+    server = FakeSMTPServer(verbose=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,40 @@
+"""
+Writes backend/firestore.indexes.json from the query planner.
+
+The list endpoints build their Firestore queries through
+app/services/query_planner.py, and other services declare a REQUIRED_INDEXES
+list next to their queries; this dumps all of them so they can be deployed
+with:
+
+  firebase deploy --only firestore:indexes
+
+Usage:
+  cd backend
+  python -m scripts.generate_indexes
+"""
+
+import os
+import sys
+import json
+
+# Add parent dir so `app` package is importable
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.query_planner import required_indexes
+from app.services import jobs, fanout, notification_writer, checkin_manifest
+from app import scheduler
+
+# Modules that declare the indexes their own queries need
+INDEX_MODULES = [jobs, fanout, notification_writer, checkin_manifest, scheduler]
+
+OUTPUT = os.path.join(os.path.dirname(__file__), '..', 'firestore.indexes.json')
+
+
+if __name__ == '__main__':
+    indexes = required_indexes()
+    for module in INDEX_MODULES:
+        indexes += module.REQUIRED_INDEXES
+    with open(OUTPUT, 'w') as f:
+        json.dump({'indexes': indexes, 'fieldOverrides': []}, f, indent=2)
+        f.write('\n')
+    print(f"Wrote {len(indexes)} composite indexes to {os.path.abspath(OUTPUT)}")
@@ -0,0 +1,136 @@
+"""
+Migration Script: Move event 'participants' arrays into bookings.
+
+Changes applied, per event:
+  1. Creates events/{id}/bookings/{uid} for every uid in 'participants' that
+     has no booking yet (1 spot, no guests)
+  2. Writes the membership index users/{uid}/joined_events/{event_id} for
+     every booking of the event
+  3. Removes the 'participants' field from the event document
+
+The array is only removed after its bookings and index entries are
+committed, so an interrupted run can simply be restarted.
+
+Safe to run multiple times (idempotent).
+
+Usage:
+  cd backend
+  python -m scripts.migrate_participants
+"""
+
+import os
+import sys
+import json
+
+# Add parent dir so `app` package is importable
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from dotenv import load_dotenv
+
+# --- Firebase Init (same logic as app/__init__.py) ---
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+if not firebase_admin._apps:
+    firebase_creds_json = os.getenv('FIREBASE_CREDENTIALS')
+    key_path = os.getenv('SVC_ACC_PATH', 'service-account.json')
+
+    if firebase_creds_json:
+        cred = credentials.Certificate(json.loads(firebase_creds_json))
+        firebase_admin.initialize_app(cred)
+    elif os.path.exists(key_path):
+        cred = credentials.Certificate(key_path)
+        firebase_admin.initialize_app(cred)
+    else:
+        firebase_admin.initialize_app()
+
+db = firestore.client()
+
+from app.services.memberships import booking_ref, membership_ref
+
+BATCH_SIZE = 500
+
+
+class _Writer:
+    """WriteBatch that commits itself every BATCH_SIZE writes."""
+
+    def __init__(self):
+        self.batch = db.batch()
+        self.pending = 0
+
+    def set(self, ref, data, merge=False):
+        self.batch.set(ref, data, merge=merge)
+        self._count()
+
+    def _count(self):
+        self.pending += 1
+        if self.pending == BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.batch.commit()
+        self.batch = db.batch()
+        self.pending = 0
+
+
+def migrate_event(doc):
+    data = doc.to_dict()
+    participants = data.get('participants') or []
+    writer = _Writer()
+
+    existing = {b.id: b.to_dict() for b in doc.reference.collection('bookings').stream()}
+    created = 0
+    for uid in participants:
+        if uid in existing:
+            continue
+        booking = {
+            'userId': uid,
+            'guestCount': 0,
+            'guests': [],
+            'totalSpots': 1,
+            'createdAt': firestore.SERVER_TIMESTAMP,
+            'migratedFromParticipants': True
+        }
+        writer.set(booking_ref(doc.reference, uid), booking)
+        existing[uid] = booking
+        created += 1
+
+    for uid, booking in existing.items():
+        joined_at = booking.get('createdAt') or firestore.SERVER_TIMESTAMP
+        writer.set(membership_ref(db, uid, doc.id), {
+            'eventId': doc.id,
+            'date': data.get('date'),
+            'joinedAt': joined_at,
+        })
+    writer.flush()
+
+    if 'participants' in data:
+        doc.reference.update({'participants': firestore.DELETE_FIELD})
+    return created, len(existing)
+
+
+def migrate_events():
+    events = 0
+    bookings_created = 0
+    indexed = 0
+
+    for doc in db.collection('events').stream():
+        try:
+            created, members = migrate_event(doc)
+        except Exception as e:
+            print(f"  ✘ Failed {doc.id}: {e}")
+            continue
+        events += 1
+        bookings_created += created
+        indexed += members
+        if created or members:
+            print(f"  ✔ {doc.id}: {created} bookings created, {members} members indexed")
+
+    print(f"\nDone. Events: {events}, Bookings created: {bookings_created}, Memberships indexed: {indexed}")
+
+
+if __name__ == '__main__':
+    print("=== Participants Migration: arrays → bookings + membership index ===\n")
+    migrate_events()
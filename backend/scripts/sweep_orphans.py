@@ -0,0 +1,160 @@
+"""
+One-off sweep: delete data left behind by events and venues deleted before
+cascading deletes existed.
+
+Finds and deletes:
+  1. comments / bookings / counter_shards of events that no longer exist
+     (with the rest of the event's tree and index entries)
+  2. users/{uid}/joined_events entries pointing at missing events
+  3. rejected / cancelled venue_requests (and their status_history) of venues
+     that no longer exist; open and completed ones are left for review
+  4. status_history of venue requests that no longer exist
+
+Parents are checked with get_all in chunks of 100, and everything is deleted
+through services/cascade_delete.py (500-op batches, bounded concurrency).
+
+Safe to run multiple times (idempotent). Pass --dry-run to only report.
+
+Usage:
+  cd backend
+  python -m scripts.sweep_orphans [--dry-run]
+"""
+
+import os
+import sys
+import json
+
+# Add parent dir so `app` package is importable
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from dotenv import load_dotenv
+
+# --- Firebase Init (same logic as app/__init__.py) ---
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+if not firebase_admin._apps:
+    firebase_creds_json = os.getenv('FIREBASE_CREDENTIALS')
+    key_path = os.getenv('SVC_ACC_PATH', 'service-account.json')
+
+    if firebase_creds_json:
+        cred = credentials.Certificate(json.loads(firebase_creds_json))
+        firebase_admin.initialize_app(cred)
+    elif os.path.exists(key_path):
+        cred = credentials.Certificate(key_path)
+        firebase_admin.initialize_app(cred)
+    else:
+        firebase_admin.initialize_app()
+
+db = firestore.client()
+
+from app.services.cascade_delete import TreeDeleter, pages, delete_event_tree, delete_venue_tree
+
+DRY_RUN = '--dry-run' in sys.argv
+GET_ALL_CHUNK_SIZE = 100
+EVENT_SUBCOLLECTIONS = ('comments', 'bookings', 'counter_shards')
+# One small field per parent collection, so existence checks read next to nothing
+PROBE_FIELDS = {'events': 'hostId', 'venues': 'owner_id', 'venue_requests': 'venue_id'}
+
+
+def missing(collection, ids):
+    """The ids in `ids` with no document in `collection`."""
+    ids = sorted(set(ids))
+    gone = set()
+    for i in range(0, len(ids), GET_ALL_CHUNK_SIZE):
+        refs = [db.collection(collection).document(doc_id) for doc_id in ids[i:i + GET_ALL_CHUNK_SIZE]]
+        for snap in db.get_all(refs, field_paths=[PROBE_FIELDS[collection]]):
+            if not snap.exists:
+                gone.add(snap.id)
+    return gone
+
+
+def sweep_events():
+    parents = set()
+    for name in EVENT_SUBCOLLECTIONS:
+        for page in pages(db.collection_group(name)):
+            parents.update(snap.reference.parent.parent.id for snap in page
+                           if snap.reference.parent.parent.parent.id == 'events')
+    deleted = 0
+    for event_id in sorted(missing('events', parents)):
+        if DRY_RUN:
+            print(f"  • event {event_id}: orphaned subcollections")
+            continue
+        try:
+            n = delete_event_tree(event_id, db)
+        except Exception as e:
+            print(f"  ✘ event {event_id}: {e}")
+            continue
+        deleted += n
+        print(f"  ✔ event {event_id}: {n} documents deleted")
+    return deleted
+
+
+def sweep_memberships():
+    entries = {}
+    for page in pages(db.collection_group('joined_events')):
+        for snap in page:
+            entries.setdefault(snap.id, []).append(snap.reference)
+    orphans = [ref for event_id in missing('events', entries) for ref in entries[event_id]]
+    if DRY_RUN:
+        print(f"  • {len(orphans)} membership entries of missing events")
+        return 0
+    deleter = TreeDeleter(db)
+    for ref in orphans:
+        deleter.delete(ref)
+    deleted = deleter.finish()
+    print(f"  ✔ {deleted} membership entries deleted")
+    return deleted
+
+
+def sweep_venue_requests():
+    venue_ids = set()
+    for snap in db.collection('venue_requests').select(['venue_id']).stream():
+        venue_id = snap.to_dict().get('venue_id')
+        if venue_id:
+            venue_ids.add(venue_id)
+    deleted = 0
+    for venue_id in sorted(missing('venues', venue_ids)):
+        if DRY_RUN:
+            print(f"  • venue {venue_id}: orphaned booking requests")
+            continue
+        try:
+            n = delete_venue_tree(venue_id, db)
+        except Exception as e:
+            print(f"  ✘ venue {venue_id}: {e}")
+            continue
+        deleted += n
+        print(f"  ✔ venue {venue_id}: {n} documents deleted")
+    return deleted
+
+
+def sweep_status_history():
+    request_ids = set()
+    for page in pages(db.collection_group('status_history')):
+        request_ids.update(snap.reference.parent.parent.id for snap in page
+                           if snap.reference.parent.parent.parent.id == 'venue_requests')
+    gone = sorted(missing('venue_requests', request_ids))
+    if DRY_RUN:
+        print(f"  • {len(gone)} deleted venue requests with status_history left")
+        return 0
+    deleter = TreeDeleter(db)
+    for request_id in gone:
+        deleter.delete_collection(db.collection('venue_requests').document(request_id).collection('status_history'))
+    deleted = deleter.finish()
+    print(f"  ✔ {deleted} status_history entries deleted")
+    return deleted
+
+
+if __name__ == '__main__':
+    print(f"=== Orphan Sweep{' (dry run)' if DRY_RUN else ''}: deleted events & venues ===\n")
+    total = 0
+    print("Events:")
+    total += sweep_events()
+    print("Memberships:")
+    total += sweep_memberships()
+    print("Venue requests:")
+    total += sweep_venue_requests()
+    print("Status history:")
+    total += sweep_status_history()
+    print(f"\nDone. Documents deleted: {total}")
@@ -29,17 +29,20 @@ export const api = {
     // User
     getProfile: () => client.get('/users/me'),
     updateProfile: (data) => client.put('/users/me', data),
-    getHostedEvents: () => client.get('/users/me/events/hosted'),
-    getJoinedEvents: () => client.get('/users/me/events/joined'),
+    // Lists only carry the fields cards render (see backend services/projection.py)
+    getHostedEvents: () => client.get('/users/me/events/hosted', { params: { view: 'card' } }),
+    getJoinedEvents: () => client.get('/users/me/events/joined', { params: { view: 'card' } }),
 
     // Events
-    getEvents: (filters, lastDocId) => client.get('/events', { params: { ...filters, last_doc_id: lastDocId } }),
+    getEvents: (filters, lastDocId) => client.get('/events', { params: { view: 'card', ...filters, last_doc_id: lastDocId } }),
     getEvent: (id) => client.get(`/events/${id}`),
     createEvent: (data) => client.post('/events', data),
     updateEvent: (id, data) => client.put(`/events/${id}`, data),
     deleteEvent: (id) => client.delete(`/events/${id}`),
+    getCancellationStatus: (id) => client.get(`/events/${id}/cancellation`),
     joinEvent: (id, data) => client.post(`/events/${id}/join`, data),
     leaveEvent: (id) => client.post(`/events/${id}/leave`),
+    getMembership: (id) => client.get(`/events/${id}/membership`),
     syncUser: (data) => client.post('/users/sync', data),
     subscribe: (data) => client.post('/users/me/subscribe', data),
     requestVerification: (url, type = 'host') => client.post('/users/me/verify_request', { documentUrl: url, type }),
@@ -58,21 +61,29 @@ export const api = {
     deleteComment: (eventId, commentId) => client.delete(`/events/${eventId}/comments/${commentId}`),
 
     // Participants
-    getParticipants: (eventId) => client.get(`/events/${eventId}/participants`),
+    getParticipants: (eventId, lastDocId) => client.get(`/events/${eventId}/participants`, { params: { last_doc_id: lastDocId } }),
     removeParticipant: (eventId, userId) => client.delete(`/events/${eventId}/participants/${userId}`),
 
     // Notifications
     getNotifications: (lastDocId) => client.get('/notifications', { params: { last_doc_id: lastDocId } }),
+    getUnreadCount: () => client.get('/notifications/unread-count'),
     markNotificationRead: (id) => client.put(`/notifications/${id}/read`),
-    markAllNotificationsRead: () => client.put('/notifications/read-all'),
+    markAllNotificationsRead: async () => {
+        // Large backlogs come back in parts (202 + token) until done
+        let res = await client.put('/notifications/read-all');
+        while (res.status === 202 && res.data.token) {
+            res = await client.put('/notifications/read-all', { token: res.data.token });
+        }
+        return res;
+    },
 
     // Venues
     createVenue: (data) => client.post('/venues', data),
     updateVenue: (id, data) => client.put(`/venues/${id}`, data),
     deleteVenue: (id) => client.delete(`/venues/${id}`),
     getVenueDetails: (id) => client.get(`/venues/${id}`),
-    getVenues: (filters, lastDocId) => client.get('/venues', { params: { ...filters, last_doc_id: lastDocId } }),
-    getMyVenues: () => client.get('/venues/my'),
+    getVenues: (filters, lastDocId) => client.get('/venues', { params: { view: 'card', ...filters, last_doc_id: lastDocId } }),
+    getMyVenues: () => client.get('/venues/my', { params: { view: 'card' } }),
     getVenueDetails: (id) => client.get(`/venues/${id}`),
     requestVenueBooking: (id, data) => client.post(`/venues/${id}/book`, data),
     getIncomingBookings: (status) => client.get('/venues/requests/incoming', { params: { status } }),
@@ -95,6 +106,15 @@ export const api = {
     getMyTickets: () => client.get('/tickets/my'),
     getTicket: (id) => client.get(`/tickets/${id}`),
     checkinTicket: (ticketId) => client.post(`/tickets/${ticketId}/checkin`),
+    scanTicket: (token, eventId) => client.post('/tickets/scan', { token, event_id: eventId }),
+    getCheckinManifest: (eventId, since) => client.get(`/tickets/events/${eventId}/manifest`, {
+        params: since ? { since } : {},
+        responseType: 'text'
+    }),
+    syncCheckins: (eventId, checkins, deviceId) => client.post(`/tickets/events/${eventId}/sync`, {
+        checkins,
+        device_id: deviceId
+    }),
 
     // Refunds
     refundPayment: (paymentId, data) => client.post(`/payments/${paymentId}/refund`, data),
@@ -19,10 +19,9 @@ export default function Layout() {
         if (!currentUser) return;
 
         const fetchUnread = () => {
-            api.getNotifications()
+            api.getUnreadCount()
                 .then(res => {
-                    const unread = res.data.some(n => !n.read);
-                    setHasUnread(unread);
+                    setHasUnread(res.data.unread > 0);
                 })
                 .catch(err => console.error("Failed to fetch notifications", err));
         };
@@ -97,7 +97,8 @@ export default function DashboardPage() {
                 try {
                     await api.deleteEvent(id);
                     setHosted(prev => prev.filter(e => e.id !== id));
-                    showDialog({ title: 'Success', message: 'Event deleted successfully', type: 'success' });
+                    // Refunds and notifications continue in the background
+                    showDialog({ title: 'Success', message: 'Event cancelled. Attendees are being refunded and notified.', type: 'success' });
                 } catch (err) {
                     showDialog({ title: 'Error', message: 'Failed to delete event: ' + err.message, type: 'error' });
                 }
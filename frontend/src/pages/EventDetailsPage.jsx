@@ -27,6 +27,9 @@ export default function EventDetailsPage() {
     const [showAttendeesModal, setShowAttendeesModal] = useState(false);
     const [showBookingModal, setShowBookingModal] = useState(false);
     const [attendees, setAttendees] = useState([]);
+    const [hasMoreAttendees, setHasMoreAttendees] = useState(false);
+    const [lastAttendeeId, setLastAttendeeId] = useState(null);
+    const [isParticipant, setIsParticipant] = useState(false);
 
     // Booking information was duplicated, cleaning up
 
@@ -35,11 +38,26 @@ export default function EventDetailsPage() {
     useEffect(() => {
         if (showAttendeesModal) {
             api.getParticipants(id)
-                .then(res => setAttendees(res.data))
+                .then(res => {
+                    setAttendees(res.data.data);
+                    setHasMoreAttendees(res.data.hasMore);
+                    setLastAttendeeId(res.data.lastDocId);
+                })
                 .catch(err => console.error(err));
         }
     }, [showAttendeesModal, id]);
 
+    const fetchMoreAttendees = async () => {
+        try {
+            const res = await api.getParticipants(id, lastAttendeeId);
+            setAttendees(prev => [...prev, ...res.data.data]);
+            setHasMoreAttendees(res.data.hasMore);
+            setLastAttendeeId(res.data.lastDocId);
+        } catch (err) {
+            console.error("Failed to load more attendees:", err);
+        }
+    };
+
     const handleKickUser = async (userId) => {
         showDialog({
             title: 'Remove User',
@@ -58,6 +76,13 @@ export default function EventDetailsPage() {
         });
     };
 
+    const refreshMembership = () => {
+        if (!currentUser) return;
+        api.getMembership(id)
+            .then(res => setIsParticipant(res.data.joined))
+            .catch(err => console.error(err));
+    };
+
     const refreshEntry = () => {
         api.getEvent(id).then(res => setEvent(prev => ({ ...prev, ...res.data })));
         api.getComments(id).then(res => {
@@ -77,6 +102,11 @@ export default function EventDetailsPage() {
         return () => clearInterval(intervalId);
     }, [id]);
 
+    // Membership only changes through this page's own join/leave actions
+    useEffect(() => {
+        refreshMembership();
+    }, [id, currentUser]);
+
     const fetchMoreComments = async () => {
         setLoadingMoreComments(true);
         try {
@@ -115,6 +145,7 @@ export default function EventDetailsPage() {
             setBookingData({ count: 1, guests: [] });
             setBookingStep(1);
             refreshEntry();
+            refreshMembership();
             showDialog({ title: 'Success', message: 'Joined successfully!', type: 'success' });
         } catch (err) {
             showDialog({ title: 'Error', message: err.response?.data?.error || 'Failed to join', type: 'error' });
@@ -134,6 +165,7 @@ export default function EventDetailsPage() {
         try {
             await api.leaveEvent(id);
             refreshEntry();
+            refreshMembership();
         } catch (err) {
             showDialog({ title: 'Error', message: err.response?.data?.error || 'Failed to leave', type: 'error' });
         }
@@ -221,9 +253,7 @@ export default function EventDetailsPage() {
         });
     };
 
-    const isParticipant = event.participants?.includes(currentUser?.uid);
-    // Use attendeeCount if available, else length
-    const currentCount = event.attendeeCount !== undefined ? event.attendeeCount : event.participants?.length || 0;
+    const currentCount = event.attendeeCount || 0;
     const isFull = currentCount >= event.maxParticipants;
     const isHost = currentUser && event.hostId === currentUser.uid;
 
@@ -702,6 +732,11 @@ export default function EventDetailsPage() {
                                         )}
                                     </div>
                                 ))}
+                                {hasMoreAttendees && (
+                                    <button className="btn-secondary" onClick={fetchMoreAttendees}>
+                                        Load More
+                                    </button>
+                                )}
                             </div>
                         )}
                     </div>